@@ -0,0 +1,82 @@
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import (
+    generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+)
+
+
+class PasswordHasher(object):
+    '''
+    Hashes and checks passwords on a bounded pool of worker threads with the
+    method and work factor set in the app config. A request thread waits for
+    its hash, but at most PASSWORD_HASH_WORKERS hashes run at once in a
+    process, so a burst of logins cannot take every core from the requests
+    that do not hash. Passwords are hashed inline when the pool size is 0.
+    '''
+
+    def __init__(self, app=None):
+        self.method = "pbkdf2:sha256:{0}".format(DEFAULT_PBKDF2_ITERATIONS)
+        self.salt_length = 8
+        self.workers = 2
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = normalize_hash_method(app.config.get('PASSWORD_HASH_METHOD', self.method))
+        self.salt_length = app.config.get('PASSWORD_SALT_LENGTH', self.salt_length)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.shutdown()
+
+    def hash(self, password):
+        """Returns the hash of a password"""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def check(self, pwhash, password):
+        """Returns True when the password matches the hash"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Returns True when the hash was made with another method or salt length"""
+        if not pwhash or pwhash.count("$") != 2:
+            return True
+        method, salt, _ = pwhash.split("$")
+        return normalize_hash_method(method) != self.method or \
+               len(salt) != self.salt_length
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+            self._executor_pid = None
+
+    def _get_executor(self):
+        # a forked worker process does not inherit the pool's threads
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        return self._get_executor().submit(func, *args).result()
+
+
+def normalize_hash_method(method):
+    """Normalize hash method
+    Method adds werkzeug's default iterations to a pbkdf2 method without them
+    """
+    if method.startswith("pbkdf2:") and method.count(":") == 1:
+        return "{0}:{1}".format(method, DEFAULT_PBKDF2_ITERATIONS)
+    return method
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,241 @@
+import os
+import time
+import sqlite3
+import threading
+
+from collections import defaultdict
+from functools import wraps
+
+from flask import request, current_app
+
+try:
+    from ..helper.error_message import moov_errors
+    from ..models import normalize_email
+except ImportError:
+    from moov_backend.api.helper.error_message import moov_errors
+    from moov_backend.api.models import normalize_email
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+class MemoryBucketStore(object):
+    '''
+    Token buckets kept in the memory of a single process
+    '''
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            allowed, tokens = take_token(tokens, updated_at, capacity, rate, now)
+            self._buckets[key] = (tokens, now)
+            return allowed, tokens
+
+    def prune(self, now, max_age):
+        with self._lock:
+            for key, (_, updated_at) in list(self._buckets.items()):
+                if now - updated_at > max_age:
+                    del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBucketStore(object):
+    '''
+    Token buckets kept in a SQLite file, so every worker process on a host
+    shares the same limits. A bucket is read and updated in one write
+    transaction, which SQLite serializes across processes
+    '''
+
+    def __init__(self, path, timeout=5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        # connections are per thread and are not reused after a fork
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            # buckets are cheap to lose, so writes are not synced to disk
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            connection.execute("CREATE TABLE IF NOT EXISTS rate_limit_bucket ("
+                               "key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                               "updated_at REAL NOT NULL)")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def take(self, key, capacity, rate, now):
+        connection = self._connection()
+        began = False
+        try:
+            # waits up to the connection timeout for the other writers
+            connection.execute("BEGIN IMMEDIATE")
+            began = True
+            row = connection.execute("SELECT tokens, updated_at FROM rate_limit_bucket "
+                                     "WHERE key = ?", (key,)).fetchone()
+            tokens, updated_at = row if row else (capacity, now)
+            allowed, tokens = take_token(tokens, updated_at, capacity, rate, now)
+            connection.execute("INSERT OR REPLACE INTO rate_limit_bucket "
+                               "(key, tokens, updated_at) VALUES (?, ?, ?)",
+                               (key, tokens, now))
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            if began:
+                connection.execute("ROLLBACK")
+            raise
+        return allowed, tokens
+
+    def prune(self, now, max_age):
+        self._connection().execute("DELETE FROM rate_limit_bucket WHERE updated_at < ?",
+                                   (now - max_age,))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM rate_limit_bucket")
+
+
+def take_token(tokens, updated_at, capacity, rate, now):
+    """Take token
+    Method refills a bucket for the time since it was last updated and takes
+    a token from it, returns whether a token was taken and the tokens left
+    """
+    tokens = min(float(capacity), tokens + (now - updated_at) * rate)
+    if tokens >= 1:
+        return True, tokens - 1
+    return False, tokens
+
+
+class RateLimiter(object):
+    '''
+    Token bucket rate limits for the unauthenticated endpoints. Each limit
+    is set in the RATE_LIMITS config as a number of requests per number of
+    seconds, per client IP and per email in the request. Buckets live in
+    the process unless RATE_LIMIT_STORAGE names a SQLite file shared by
+    the workers. Allowed and rejected requests are counted per limit.
+    A request is let through when the store fails (e.g. the SQLite file
+    stays locked past its timeout): the limits slow down guessing, and
+    failing closed would turn a store error into an outage of login,
+    signup and forgot password.
+    '''
+
+    # how many takes between removing buckets that have refilled
+    PRUNE_INTERVAL = 1000
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.limits = {}
+        self.trusted_proxies = 0
+        self.store = MemoryBucketStore()
+        self._counters = defaultdict(lambda: {"allowed": 0, "rejected": 0})
+        self._lock = threading.Lock()
+        self._takes = 0
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', self.enabled)
+        self.limits = app.config.get('RATE_LIMITS', self.limits)
+        self.trusted_proxies = app.config.get('RATE_LIMIT_TRUSTED_PROXIES', self.trusted_proxies)
+        storage = app.config.get('RATE_LIMIT_STORAGE')
+        # the buckets in a shared store outlive the process, they are not
+        # cleared here since every manage.py command initializes the app
+        self.store = SQLiteBucketStore(storage) if storage else MemoryBucketStore()
+
+    def reset(self):
+        self.store.clear()
+        with self._lock:
+            self._counters.clear()
+
+    def get_counters(self):
+        """Returns the allowed and rejected requests of each limit"""
+        with self._lock:
+            return dict((name, dict(counts)) for name, counts in self._counters.items())
+
+    def get_client_ip(self):
+        # the last trusted proxy appends the address that connected to it
+        route = request.access_route
+        if self.trusted_proxies and len(route) >= self.trusted_proxies:
+            return route[-self.trusted_proxies]
+        return request.remote_addr
+
+    def hit(self, name, keys):
+        """Takes a token from the bucket of every key, returns the seconds
+        to wait before retrying when one of them is empty, otherwise None
+        """
+        now = time.time()
+        retry_after = None
+        for key_type, key in keys:
+            limit = self.limits.get(name, {}).get(key_type)
+            if not limit or not key:
+                continue
+            requests, seconds = limit
+            rate = float(requests) / seconds
+            try:
+                allowed, tokens = self.store.take(
+                    u"{0}:{1}:{2}".format(name, key_type, key), requests, rate, now)
+            except sqlite3.Error as error:
+                current_app.logger.error("Rate limit {0} was not checked, the request "
+                                         "is let through: {1!r}".format(name, error))
+                continue
+            if not allowed:
+                retry_after = max(retry_after or 0, (1 - tokens) / rate)
+
+        with self._lock:
+            self._counters[name]["rejected" if retry_after else "allowed"] += 1
+            self._takes += 1
+            prune = self._takes % self.PRUNE_INTERVAL == 0
+        if prune:
+            try:
+                self.store.prune(now, max([seconds for limits in self.limits.values()
+                                           for _, seconds in limits.values()] or [0]))
+            except sqlite3.Error as error:
+                current_app.logger.error("Rate limit buckets were not pruned: {0!r}".format(error))
+        return retry_after
+
+
+rate_limiter = RateLimiter()
+
+
+def rate_limit(name):
+    """ This method rejects a request when the client IP or the email in
+    the request payload has used up the limit called name in RATE_LIMITS.
+    It runs before the view, so a rejected request does no database or
+    password hashing work.
+    """
+
+    def real_rate_limit(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not rate_limiter.enabled:
+                return f(*args, **kwargs)
+
+            json_input = request.get_json(silent=True)
+            email = json_input.get("email") if isinstance(json_input, dict) else None
+            email = normalize_email(email) if isinstance(email, string_types) else None
+
+            retry_after = rate_limiter.hit(name, [
+                ("ip", rate_limiter.get_client_ip()),
+                ("email", email)
+            ])
+            if retry_after:
+                retry_after = int(retry_after) + 1
+                message, status_code = moov_errors("Too many requests, try again in {0} "
+                                                   "seconds".format(retry_after), 429)
+                return message, status_code, {"Retry-After": str(retry_after)}
+
+            return f(*args, **kwargs)
+
+        return decorated
+
+    return real_rate_limit
@@ -1,7 +1,19 @@
+import os
+import time
+import hashlib
+import threading
+
+from collections import OrderedDict
 from functools import wraps
 
 from flask import g, request, jsonify
 from flask_jwt import jwt
+from sqlalchemy.orm import joinedload
+
+try:
+    from ..models import User
+except ImportError:
+    from moov_backend.api.models import User
 
 
 # define a user class
@@ -15,6 +27,89 @@ class CurrentUser(object):
                 "id - {} \n"
                 "stamp - {} >").format(self.id, self.stamp)
 
+
+class TokenCache(object):
+    '''
+    A bounded LRU cache of recently verified tokens, keyed by the token's
+    digest, so a repeat token skips the signature check. Entries of tokens
+    carrying an "exp" claim are dropped once they expire.
+    '''
+
+    def __init__(self, app=None, max_size=1024):
+        self.max_size = max_size
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_size = app.config.get('TOKEN_CACHE_SIZE', self.max_size)
+        self.clear()
+
+    def get(self, digest):
+        with self._lock:
+            cached = self._tokens.pop(digest, None)
+            if cached is None:
+                return None
+            current_user, expires_at = cached
+            if expires_at is not None and expires_at <= time.time():
+                return None
+            # re-insert as the most recently used
+            self._tokens[digest] = cached
+            return current_user
+
+    def set(self, digest, current_user, expires_at=None):
+        if not self.max_size:
+            return
+        with self._lock:
+            self._tokens.pop(digest, None)
+            self._tokens[digest] = (current_user, expires_at)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+
+
+token_cache = TokenCache()
+
+
+def token_error(message, status_code):
+    response = jsonify({
+        "status": "fail",
+        "data": {
+            "message": message
+        }
+    })
+    response.status_code = status_code
+    return response
+
+def verify_token(authorization_token):
+    """Verify token
+    Method returns the CurrentUser of a token signed with TOKEN_KEY, from
+    the token cache when it was verified recently. Raises jwt.InvalidTokenError
+    """
+    digest = hashlib.sha256(authorization_token.encode("utf-8")).hexdigest()
+    current_user = token_cache.get(digest)
+    if current_user is not None:
+        return current_user
+
+    payload = jwt.decode(authorization_token, os.getenv("TOKEN_KEY"),
+                         algorithms=["HS256"])
+
+    # confirm that payload has required keys
+    if not {"id", "stamp"}.issubset(str(key) for key in payload.keys()):
+        raise jwt.InvalidTokenError("Token payload is missing id or stamp")
+
+    # instantiate user object
+    current_user = CurrentUser(
+            str(payload["id"]), str(payload["stamp"])
+        )
+    token_cache.set(digest, current_user, payload.get("exp"))
+    return current_user
+
 # authorization decorator
 def token_required(f):
     @wraps(f)
@@ -22,71 +117,46 @@ def token_required(f):
         # check that the Authorization header is set
         authorization_token = request.headers.get('Authorization')
         if not authorization_token:
-            response = jsonify({
-                "status": "fail",
-                "data": {
-                    "message": "Bad request. Header does not contain"
-                            " authorization token"
-                }
-            })
-            response.status_code = 400
-            return response
+            return token_error("Bad request. Header does not contain"
+                               " authorization token", 400)
 
         # validates the word bearer is in the token
         if 'bearer ' not in authorization_token.lower():
-            response = jsonify({
-                "status": "fail",
-                "data": {
-                    "message": "Invalid Token. The token should begin with"
-                            " 'Bearer '"
-                }
-            })
-            response.status_code = 400
-            return response
-
-        unauthorized_response = jsonify({
-            "status": "fail",
-            "data": {
-                "message": "Unauthorized. The authorization token supplied"
-                        " is invalid"
-            }
-        })
-        unauthorized_response.status_code = 401
-        expired_response = jsonify({
-            "status": "fail",
-            "data": {
-                "message": "The authorization token supplied is expired"
-            }
-        })
-        expired_response.status_code = 401
+            return token_error("Invalid Token. The token should begin with"
+                               " 'Bearer '", 400)
 
         try:
             # extracts token by removing bearer
             authorization_token = authorization_token.split(' ')[1]
 
-            # decode token
-            payload = jwt.decode(authorization_token, 'secret',
-                                 options={"verify_signature": False})
+            # verify token
+            current_user = verify_token(authorization_token)
         except jwt.ExpiredSignatureError:
-            return expired_response
+            return token_error("The authorization token supplied is expired", 401)
         except jwt.InvalidTokenError:
-            return unauthorized_response
-        
-        # convert payload keys from unicode to string
-        payload_keys = [str(key) for key in payload.keys()]
-        
-        # confirm that payload has required keys
-        if not {"id", "stamp"}.issubset(payload_keys):
-            return unauthorized_response
-        else:
-            # instantiate user object
-            current_user = CurrentUser(
-                    str(payload["id"]), str(payload["stamp"])
-                )
-
-            # set current user in flask global variable, g
-            g.current_user = current_user
-
-            # now return wrapped function
-            return f(*args, **kwargs)
+            return token_error("Unauthorized. The authorization token supplied"
+                               " is invalid", 401)
+
+        # set current user in flask global variable, g
+        g.current_user = current_user
+        g.current_user_model = None
+
+        # now return wrapped function
+        return f(*args, **kwargs)
     return decorated
+
+def get_current_user():
+    """Get current user
+    Method loads the authenticated user once per request, with the user
+    type, school, wallets and driver info joined in, and keeps it on g
+    """
+    current_user = getattr(g, "current_user_model", None)
+    if current_user is None:
+        current_user = User.query.options(
+                            joinedload(User.user_type),
+                            joinedload(User.school_information),
+                            joinedload(User.wallet_user),
+                            joinedload(User.driver_profile)
+                        ).get(g.current_user.id)
+        g.current_user_model = current_user
+    return current_user
@@ -0,0 +1,287 @@
+import os
+import atexit
+import smtplib
+import threading
+
+from datetime import datetime, timedelta
+from flask_mail import Mail, Message, Connection
+from sqlalchemy import null, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+try:
+    from ..models import db, OutboundMail
+except ImportError:
+    from moov_backend.api.models import db, OutboundMail
+
+
+# subject and template file of each kind of mail
+MAIL_TEMPLATES = {
+    "forgot_password": ("Forgot Password", "template_forgot_password.html")
+}
+
+# params that are never saved with the mail, e.g. a temporary password that
+# is only stored hashed, they are held by the process that queued the mail
+SECRET_PARAMS = {
+    "forgot_password": ("password",)
+}
+
+
+class MailQueue(object):
+    '''
+    Outbound mail is saved to the OutboundMail table, and a background
+    thread sends it over one authenticated SMTP connection that is kept
+    open between messages and closed when idle. Failed mail is retried
+    with a backoff, and mail left in the table by a stopped process is
+    sent by the next worker. Secret params are the exception, they are only
+    held in the memory of the process that queued the mail: its mail is
+    lost if it stops, and the row is left to the purge. Mail is sent in
+    the request when the queue is disabled (e.g. in tests).
+    '''
+
+    def __init__(self, app=None):
+        self.app = None
+        self.mail = Mail()
+        self.templates = {}
+        self.asynchronous = False
+        self.batch_size = 20
+        self.max_attempts = 5
+        self.idle_timeout = 60
+        self.poll_interval = 30
+        self._wake = threading.Event()
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self._connection = None
+        self._connection_used_at = None
+        # mail id: secret params of the mail this process queued
+        self._secrets = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.mail.init_app(app)
+        self.asynchronous = app.config.get('MAIL_QUEUE_ASYNC', False)
+        self.batch_size = app.config.get('MAIL_BATCH_SIZE', self.batch_size)
+        self.max_attempts = app.config.get('MAIL_MAX_ATTEMPTS', self.max_attempts)
+        self.idle_timeout = app.config.get('MAIL_IDLE_TIMEOUT', self.idle_timeout)
+        self.poll_interval = app.config.get('MAIL_POLL_INTERVAL', self.poll_interval)
+
+        # templates are compiled once instead of on every mail
+        self.templates = dict(
+            (name, (subject, app.jinja_env.get_template(template_file)))
+            for name, (subject, template_file) in MAIL_TEMPLATES.items()
+        )
+
+        if self.asynchronous:
+            # pick up mail a previous process left behind
+            app.before_first_request(self._start_worker)
+        atexit.register(self.stop)
+
+    def put(self, recipient, template, params=None):
+        """Saves a mail to the queue and wakes the sender"""
+        subject, _ = self.templates[template]
+        params = dict(params or {})
+        secrets = dict((name, params.pop(name)) for name in SECRET_PARAMS.get(template, ())
+                       if name in params)
+        outbound_mail = OutboundMail(
+            recipient=recipient,
+            subject=subject,
+            template=template,
+            params=params or None
+        )
+        try:
+            db.session.add(outbound_mail)
+            db.session.flush()
+            if secrets:
+                self._secrets[outbound_mail.id] = secrets
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            self._secrets.pop(outbound_mail.id, None)
+            raise
+
+        if not self.asynchronous:
+            # only this mail, the request does not wait on the rest of the queue
+            self.send_pending(ids=[outbound_mail.id])
+            return
+        self._start_worker()
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        """Sends the due mail and stops the worker"""
+        if self._worker and self._worker.is_alive() and \
+           self._worker_pid == os.getpid():
+            self._stopping = True
+            self._wake.set()
+            self._worker.join(timeout)
+
+    def send_pending(self, ids=None):
+        """Sends due mail in batches until there is none left, or only the
+        due mail of the given ids, returns the number of mail sent
+        """
+        sent = 0
+        while True:
+            outbound_mails = self.claim(ids)
+            if not outbound_mails:
+                break
+
+            sent_ids = []
+            failures = []
+            disconnected = False
+            for outbound_mail in outbound_mails:
+                try:
+                    self.send(outbound_mail)
+                except Exception as error:
+                    # e.g. a missing template param fails the same way on
+                    # every attempt, it must not hold back the mail after it
+                    if isinstance(error, (smtplib.SMTPException, IOError)):
+                        disconnected = True
+                        self.close_connection()
+                    failures.append((outbound_mail, error))
+                    if self.app:
+                        self.app.logger.error("Mail to {0} was not sent: {1}".format(
+                            outbound_mail.recipient, repr(error)))
+                else:
+                    sent_ids.append(outbound_mail.id)
+
+            outbound_mail_table = OutboundMail.__table__
+            try:
+                if sent_ids:
+                    db.session.execute(outbound_mail_table.delete().
+                        where(outbound_mail_table.c.id.in_(sent_ids)))
+                for outbound_mail, error in failures:
+                    values = {"last_error": repr(error)[:255]}
+                    if outbound_mail.attempts >= self.max_attempts:
+                        # the mail is not retried, its params are dropped
+                        values["params"] = null()
+                        self._secrets.pop(outbound_mail.id, None)
+                    db.session.execute(outbound_mail_table.update().
+                        where(outbound_mail_table.c.id == outbound_mail.id).
+                        values(**values))
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                raise
+            for outbound_mail_id in sent_ids:
+                self._secrets.pop(outbound_mail_id, None)
+            sent += len(sent_ids)
+            if disconnected or ids:
+                break
+        return sent
+
+    def claim(self, ids=None):
+        """Claims a batch of due mail, of the given ids only if any
+        Method counts an attempt on the due mail and moves it back by the
+        retry backoff in a short transaction, so the row locks are not held
+        while the mail is sent and no other worker sends it meanwhile. Mail
+        claimed by a process that stops before sending it is sent once
+        its backoff passes.
+        """
+        now = datetime.utcnow()
+        query = OutboundMail.query.filter(
+                    OutboundMail.attempts < self.max_attempts,
+                    OutboundMail.send_after <= now
+                )
+        if ids:
+            query = query.filter(OutboundMail.id.in_(ids))
+        # mail with secret params is only sent by the process holding them
+        held = OutboundMail.template.notin_(list(SECRET_PARAMS))
+        held_ids = list(self._secrets)
+        if held_ids:
+            held = or_(held, OutboundMail.id.in_(held_ids))
+        query = query.filter(held)
+        try:
+            outbound_mails = query.order_by(OutboundMail.send_after).\
+                            limit(self.batch_size).\
+                            with_for_update(skip_locked=True).all()
+            for outbound_mail in outbound_mails:
+                outbound_mail.attempts += 1
+                outbound_mail.send_after = now + timedelta(minutes=2 ** outbound_mail.attempts)
+            db.session.flush()
+            # detached, the mail keeps its loaded values after the commit
+            for outbound_mail in outbound_mails:
+                db.session.expunge(outbound_mail)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+        return outbound_mails
+
+    def send(self, outbound_mail):
+        subject, template = self.templates[outbound_mail.template]
+        message = Message(subject,
+            sender=self.app.config.get('MAIL_DEFAULT_SENDER'),
+            recipients=[outbound_mail.recipient])
+        params = dict(outbound_mail.params or {})
+        params.update(self._secrets.get(outbound_mail.id, {}))
+        message.html = template.render(**params)
+
+        connection = self.get_connection()
+        try:
+            connection.send(message)
+        except smtplib.SMTPServerDisconnected:
+            # the server dropped the idle connection, reconnect once
+            self.close_connection()
+            connection = self.get_connection()
+            connection.send(message)
+        self._connection_used_at = datetime.utcnow()
+
+    def get_connection(self):
+        if self._connection is None:
+            state = self.app.extensions['mail']
+            connection = Connection(state)
+            connection.host = None if state.suppress else connection.configure_host()
+            connection.num_emails = 0
+            self._connection = connection
+            self._connection_used_at = datetime.utcnow()
+        return self._connection
+
+    def close_connection(self):
+        connection, self._connection = self._connection, None
+        if connection and connection.host:
+            try:
+                connection.host.quit()
+            except (smtplib.SMTPException, IOError):
+                connection.host.close()
+
+    def _start_worker(self):
+        # the worker is (re)started lazily so forked server workers get their own
+        if self._worker and self._worker.is_alive() and \
+           self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker and self._worker.is_alive() and \
+               self._worker_pid == os.getpid():
+                return
+            self._connection = None
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name="mail-queue")
+            self._worker.daemon = True
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    self.send_pending()
+                except SQLAlchemyError as error:
+                    db.session.rollback()
+                    self.app.logger.error("Mail queue failed: {0}".format(repr(error)))
+                db.session.remove()
+                if self._stopping:
+                    break
+
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+                if self._connection and datetime.utcnow() - self._connection_used_at > \
+                   timedelta(seconds=self.idle_timeout):
+                    self.close_connection()
+            self.close_connection()
+
+
+mail_queue = MailQueue()
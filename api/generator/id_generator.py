@@ -1,8 +1,18 @@
-import numpy
-from random import random
+import os
+import binascii
+import threading
 from time import time
 
 
+# Modeled after base64 web-safe chars, but ordered by ASCII.
+PUSH_CHARS = ('-0123456789'
+              'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+              '_abcdefghijklmnopqrstuvwxyz')
+
+# every 12-bit value as its two characters
+PUSH_PAIRS = tuple(a + b for a in PUSH_CHARS for b in PUSH_CHARS)
+
+
 class PushID(object):
     '''
     A class that implements firebase's fancy ID generator that creates
@@ -17,12 +27,18 @@ class PushID(object):
        in the same timestamp, the latter ones will sort after the former ones.
        We do this by using the previous random bits but "incrementing" them by
        1 (only in the case of a timestamp collision).
+
+    The ID is the 48-bit timestamp and the 72 random bits as one 120-bit
+    integer written in base 64, two characters (12 bits) at a time. One
+    generator is shared by the process, its state is guarded by a lock so
+    IDs stay ordered across threads.
     '''
 
-    # Modeled after base64 web-safe chars, but ordered by ASCII.
-    PUSH_CHARS = ('-0123456789'
-                  'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-                  '_abcdefghijklmnopqrstuvwxyz')
+    PUSH_CHARS = PUSH_CHARS
+    PUSH_PAIRS = PUSH_PAIRS
+
+    RANDOM_BITS = 72
+    RANDOM_MAX = (1 << RANDOM_BITS) - 1
 
     def __init__(self):
 
@@ -30,46 +46,48 @@ class PushID(object):
         # pushtwice in one ms.
         self.last_push_time = 0
 
-        # We generate 72-bits of randomness which get turned into 12
-        # characters and appended to the timestamp to prevent
-        # collisions with other clients.  We store the last characters
-        # we generated because in the event of a collision, we'll use
-        # those same characters except "incremented" by one.
-        self.last_rand_chars = numpy.empty(12, dtype=int)
+        # The 72 random bits of the last push, in the event of a collision
+        # we'll use them again except "incremented" by one.
+        self.last_rand = 0
+
+        self._lock = threading.Lock()
 
     def next_id(self):
+        with self._lock:
+            return self._encode(self._next())
+
+    def next_ids(self, n):
+        """Returns n ordered ids, for bulk inserts"""
+        with self._lock:
+            return [self._encode(self._next()) for _ in range(n)]
+
+    def _next(self):
         now = int(time() * 1000)
-        duplicate_time = (now == self.last_push_time)
+        if now <= self.last_push_time:
+            # same millisecond, or the clock went back: stay on the last
+            # timestamp so ids keep increasing
+            now = self.last_push_time
+            if self.last_rand < self.RANDOM_MAX:
+                self.last_rand += 1
+            else:
+                now += 1
+                self.last_rand = self._random()
+        else:
+            self.last_rand = self._random()
         self.last_push_time = now
-        time_stamp_chars = numpy.empty(8, dtype=str)
-
-        for i in range(7, -1, -1):
-            time_stamp_chars[i] = self.PUSH_CHARS[now % 64]
-            now = int(now / 64)
 
-        if now != 0:
+        if now >> 48:
             raise ValueError('We should have converted the entire timestamp.')
+        return (now << self.RANDOM_BITS) | self.last_rand
 
-        unique_id = ''.join(time_stamp_chars)
+    def _random(self):
+        # urandom, as forked workers share the random module's state
+        return int(binascii.hexlify(os.urandom(9)), 16)
 
-        if not duplicate_time:
-            for i in range(12):
-                # random() returns a floating point number in the
-                # range(0.0, 1.0)
-                self.last_rand_chars[i] = int(random() * 64)
-        else:
-            # If the timestamp hasn't changed since last push, use the
-            # same random number, except incremented by 1.
-            for i in range(11, -1, -1):
-                if self.last_rand_chars[i] == 63:
-                    self.last_rand_chars[i] = 0
-                else:
-                    break
-            self.last_rand_chars[i] += 1
-
-        for i in range(12):
-            unique_id += self.PUSH_CHARS[self.last_rand_chars[i]]
-
-        if len(unique_id) != 20:
-            raise ValueError('Length should be 20.')
-        return unique_id
+    def _encode(self, value):
+        pairs = self.PUSH_PAIRS
+        return ''.join([pairs[(value >> shift) & 0xfff]
+                        for shift in (108, 96, 84, 72, 60, 48, 36, 24, 12, 0)])
+
+
+push_id_generator = PushID()
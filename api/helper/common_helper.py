@@ -61,7 +61,7 @@ def get_moov_user():
     Method gets the default moov user
     """
     moov_email = os.environ.get("MOOV_EMAIL")
-    moov_user = User.query.filter(User.email==moov_email).first()
+    moov_user = User.get_by_email(moov_email)
     if moov_user:
         return moov_user
 
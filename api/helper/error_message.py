@@ -1,3 +1,5 @@
+from flask import current_app
+
 #errors
 
 # moov_errors standard
@@ -9,3 +11,8 @@ def moov_errors(errors, status_code):
 
 def not_found_errors(item):
     return moov_errors("{0} does not exist".format(item), 404)
+
+def server_errors(message, error):
+    # the error is logged, the client only gets the message
+    current_app.logger.error("{0}: {1}".format(message, repr(error)))
+    return moov_errors(message, 500)
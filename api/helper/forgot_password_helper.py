@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+try:
+    from ..models import db, ForgotPassword, OutboundMail
+except ImportError:
+    from moov_backend.api.models import db, ForgotPassword, OutboundMail
+
+
+# how long a temporary password can be used to login
+TEMP_PASSWORD_LIFETIME = timedelta(days=1)
+
+
+def get_latest_forgot_password(user_id):
+    """Get latest forgot password
+    Method returns the latest temporary password issued to a user from the
+    (user_id, created_at) index
+    """
+    return ForgotPassword.query.filter(
+                ForgotPassword.user_id==user_id
+            ).order_by(
+                ForgotPassword.created_at.desc()
+            ).first()
+
+def is_temp_password_expired(forgot_password):
+    return datetime.utcnow() > forgot_password.created_at + TEMP_PASSWORD_LIFETIME
+
+def purge_forgot_passwords(chunk_size=1000, progress=None):
+    """Purge forgot passwords
+    Method deletes used and expired temporary passwords, and the forgot
+    password mail holding them that was not sent before they expired, one
+    chunk per transaction so row locks stay short, and returns how many
+    were deleted
+    """
+    cutoff = datetime.utcnow() - TEMP_PASSWORD_LIFETIME
+    purged = 0
+
+    for model, criterion in [
+        (ForgotPassword, or_(
+            ForgotPassword.used==True,
+            ForgotPassword.created_at<cutoff
+        )),
+        (OutboundMail, and_(
+            OutboundMail.template=="forgot_password",
+            OutboundMail.created_at<cutoff
+        ))
+    ]:
+        table = model.__table__
+        while True:
+            try:
+                ids = [row.id for row in db.session.query(model.id).
+                        filter(criterion).limit(chunk_size).all()]
+                if not ids:
+                    db.session.rollback()
+                    break
+
+                db.session.execute(table.delete().where(table.c.id.in_(ids)))
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                raise
+
+            purged += len(ids)
+            if progress:
+                progress(purged)
+
+    return purged
@@ -1,55 +1,201 @@
 from datetime import datetime, timedelta
 
-from sqlalchemy import desc, and_
+from sqlalchemy import func, and_, or_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
 
 try:
-    from ..models import FreeRide, Transaction
+    from ..models import (
+        db, FreeRide, FreeRideType, Transaction, OperationType, RideCounter,
+        User, UserType, Notification, normalize_email
+    )
+    from ..generator.id_generator import push_id_generator
     from ..generator.free_ride_token_generator import generate_free_ride_token
+    from ..helper.icon_helper import get_icon_id
+    from ..helper.notification_helper import update_notification_counters
     from ..schema import free_ride_schema
 except ImportError:
-    from moov_backend.api.models import FreeRide
+    from moov_backend.api.models import (
+        db, FreeRide, FreeRideType, Transaction, OperationType, RideCounter,
+        User, UserType, Notification, normalize_email
+    )
+    from moov_backend.api.generator.id_generator import push_id_generator
     from moov_backend.api.generator.free_ride_token_generator import generate_free_ride_token
+    from moov_backend.api.helper.icon_helper import get_icon_id
+    from moov_backend.api.helper.notification_helper import update_notification_counters
     from moov_backend.api.schema import free_ride_schema
 
 
+# number of rides in a week that earns a free ride
+MINIMUM_RIDES = 20
+RIDE_WINDOW_DAYS = 7
+
+
+def get_ride_window_start():
+    return datetime.utcnow().date() - timedelta(days=RIDE_WINDOW_DAYS - 1)
+
+def lock_riders(user_ids):
+    """Lock riders
+    Method locks the user rows of the riders, every change to a user's
+    ride counters holds this lock so a rebuild never overwrites a ride
+    recorded at the same time
+    """
+    db.session.query(User.id).filter(User.id.in_(user_ids)).\
+        order_by(User.id).with_for_update().all()
+
+def reset_ride_counters(user_ids):
+    """Reset ride counters
+    Method clears the ride counters of users who were given a free ride,
+    as in the free ride rule the rides before a user's latest free ride,
+    of any type, do not count towards the next one
+    """
+    lock_riders(user_ids)
+    RideCounter.query.filter(RideCounter.user_id.in_(user_ids)).\
+        delete(synchronize_session=False)
+
+def record_ride(user_id):
+    """Record ride
+    Method increments today's ride counter bucket of the user, the
+    change is committed with the ride transaction
+    """
+    now = datetime.utcnow()
+    today = now.date()
+    lock_riders([user_id])
+
+    if db.engine.dialect.name == "postgresql":
+        # a single upsert so concurrent rides never race on the bucket
+        new_ride_counter = postgresql.insert(RideCounter.__table__).values(
+                                id=push_id_generator.next_id(),
+                                user_id=user_id,
+                                ride_day=today,
+                                ride_count=1,
+                                created_at=now,
+                                modified_at=now
+                            )
+        db.session.execute(new_ride_counter.on_conflict_do_update(
+            index_elements=["user_id", "ride_day"],
+            set_={
+                "ride_count": RideCounter.__table__.c.ride_count + 1,
+                "modified_at": now
+            }
+        ))
+        return
+
+    # other databases serialize writers, so the bucket cannot be created
+    # by another request between the update and the insert
+    updated = RideCounter.query.filter(and_(
+                    RideCounter.user_id==user_id,
+                    RideCounter.ride_day==today
+                )).update({RideCounter.ride_count: RideCounter.ride_count + 1},
+                          synchronize_session=False)
+    if not updated:
+        db.session.add(RideCounter(user_id=user_id, ride_day=today, ride_count=1))
+        db.session.flush()
+
 def check_past_week_rides(user_id):
-    day = datetime.today() - timedelta(days=7)
-    past_week_rides = Transaction.query.filter(and_(
-                            Transaction.sender_id==user_id,
-                            Transaction.type_of_operation=="ride_type",
-                            Transaction.transaction_date>=day
-                        )).order_by(desc(Transaction.transaction_date)).limit(20).all()
-    return past_week_rides
-
-def check_latest_free_ride(user_id):
-    latest_free_ride = FreeRide.query.filter(FreeRide.user_id==user_id).\
-                            order_by(desc(FreeRide.created_at)).\
-                            limit(1).first()
-    return latest_free_ride
+    """Check past week rides
+    Method returns the number of rides taken in the rolling week
+    since the user's last ride free ride
+    """
+    past_week_rides = db.session.query(func.sum(RideCounter.ride_count)).filter(and_(
+                            RideCounter.user_id==user_id,
+                            RideCounter.ride_day>=get_ride_window_start()
+                        )).scalar()
+    return past_week_rides or 0
 
 def get_free_ride_token(user):
     free_ride_token = None
-    past_week_rides = check_past_week_rides(user.id)
-    number_of_rides = len(past_week_rides)
 
-    # set limit for rides in a week
-    minimum_rides = 20
-    if number_of_rides >= minimum_rides:
-        latest_free_ride = check_latest_free_ride(user.id)
+    # the rewarded rides are cleared when the token is saved
+    if check_past_week_rides(user.id) >= MINIMUM_RIDES:
+        free_ride_token = generate_free_ride_token()
 
-        # case of which the user has not gotten a free ride before
-        if not latest_free_ride:
-            free_ride_token = generate_free_ride_token(user.email)
+    return free_ride_token
 
-        # case of the user has gotten a free ride and the last free ride
-        # date is beyond the last week
-        if latest_free_ride and (latest_free_ride.created_at < \
-        past_week_rides[number_of_rides-1].transaction_date):
-            free_ride_token = generate_free_ride_token(user.email)
+def rebuild_ride_counters(batch_size=1000):
+    """Rebuild ride counters
+    Method recomputes the ride counter buckets from the ride transactions
+    of the rolling week that came after each user's latest free ride, one
+    batch of users per transaction with their rows locked so rides recorded
+    meanwhile are either counted or applied after the rebuild
+    """
+    window_start = datetime.combine(get_ride_window_start(), datetime.min.time())
+    ride_filter = and_(
+                    Transaction.sender_id!=None,
+                    Transaction.type_of_operation==OperationType.ride_type,
+                    Transaction.transaction_date>=window_start
+                )
+    riders = db.session.query(RideCounter.user_id).union(
+                db.session.query(Transaction.sender_id).filter(ride_filter)
+            )
+    user_ids = sorted(set(rider[0] for rider in riders))
+    db.session.rollback()
 
-    return free_ride_token
+    latest_free_ride = db.session.query(func.max(FreeRide.created_at)).filter(
+                            FreeRide.user_id==Transaction.sender_id
+                        ).correlate(Transaction).as_scalar()
+    ride_day = func.date(Transaction.transaction_date)
+
+    rebuilt = 0
+    for start in range(0, len(user_ids), batch_size):
+        chunk = user_ids[start:start + batch_size]
+        try:
+            lock_riders(chunk)
+            ride_days = db.session.query(
+                            Transaction.sender_id,
+                            ride_day.label("ride_day"),
+                            func.count(Transaction.id).label("ride_count")
+                        ).filter(and_(
+                            ride_filter,
+                            Transaction.sender_id.in_(chunk),
+                            or_(
+                                latest_free_ride==None,
+                                Transaction.transaction_date>latest_free_ride
+                            )
+                        )).group_by(Transaction.sender_id, ride_day).all()
 
-def save_free_ride_token(free_ride_type, token, description, user_id):
+            now = datetime.utcnow()
+            ride_counters = []
+            for row in ride_days:
+                _ride_day = row.ride_day
+                if not hasattr(_ride_day, "year"):
+                    # sqlite returns dates as strings
+                    _ride_day = datetime.strptime(str(_ride_day), "%Y-%m-%d").date()
+                ride_counters.append({
+                    "id": push_id_generator.next_id(),
+                    "user_id": row.sender_id,
+                    "ride_day": _ride_day,
+                    "ride_count": row.ride_count,
+                    "created_at": now,
+                    "modified_at": now
+                })
+
+            RideCounter.query.filter(RideCounter.user_id.in_(chunk)).\
+                delete(synchronize_session=False)
+            db.session.bulk_insert_mappings(RideCounter, ride_counters)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+
+        rebuilt += len(ride_counters)
+
+    return rebuilt
+
+def redeem_free_ride_token(token, user_id):
+    """Redeem free ride token
+    Method deactivates an active token of the user in a single conditional
+    update and returns True only for the request that redeemed it, the
+    change is committed with the ride transaction
+    """
+    redeemed = FreeRide.query.filter(and_(
+                    FreeRide.token==token,
+                    FreeRide.user_id==user_id,
+                    FreeRide.token_status==True
+                )).update({FreeRide.token_status: False}, synchronize_session=False)
+    return redeemed == 1
+
+def save_free_ride_token(free_ride_type, token, description, user_id, commit=True):
     new_free_ride = FreeRide(
                         free_ride_type=free_ride_type,
                         token=token,
@@ -57,7 +203,8 @@ def save_free_ride_token(free_ride_type, token, description, user_id):
                         description=description,
                         user_id=user_id
                     )
-    new_free_ride.save()
+    reset_ride_counters([user_id])
+    new_free_ride.save(commit=commit)
     return free_ride_schema.dump(new_free_ride)
 
 def has_free_ride(user_id, free_ride_type):
@@ -65,3 +212,87 @@ def has_free_ride(user_id, free_ride_type):
                 FreeRide.user_id==user_id,
                 FreeRide.free_ride_type==free_ride_type
             )).first()
+
+def get_campaign_recipients(school_id=None, emails=None):
+    """Get campaign recipients
+    Method returns the ids of the students of a school or of the
+    users with the given emails
+    """
+    recipients = db.session.query(User.id)
+    if school_id:
+        recipients = recipients.join(UserType, User.user_type_id==UserType.id).\
+                        filter(and_(
+                            User.school_id==school_id,
+                            UserType.title=="student"
+                        ))
+    else:
+        recipients = recipients.filter(User.email.in_([normalize_email(email) for email in emails or []]))
+    return [recipient.id for recipient in recipients.order_by(User.id)]
+
+def issue_campaign_free_rides(user_ids, campaign, description, sender_id, transaction_icon_id,
+chunk_size=1000, progress=None):
+    """Issue campaign free rides
+    Method generates a free ride token for every user in memory and bulk
+    inserts the free rides and their notifications one chunk at a time.
+    Users who already hold a token of the campaign are skipped, so a
+    campaign that stopped part way can be run again. progress is called
+    with the running totals of tokens issued and users done after each
+    chunk
+    """
+    issued = 0
+    # bulk inserts skip the default icon save_notification would set
+    transaction_icon_id = transaction_icon_id or get_icon_id("moov_operation")
+
+    for start in range(0, len(user_ids), chunk_size):
+        now = datetime.utcnow()
+        free_rides = []
+        notifications = []
+        chunk = user_ids[start:start + chunk_size]
+        issued_users = set(free_ride.user_id for free_ride in
+                            db.session.query(FreeRide.user_id).filter(and_(
+                                FreeRide.campaign==campaign,
+                                FreeRide.user_id.in_(chunk)
+                            )))
+        chunk = [user_id for user_id in chunk if user_id not in issued_users]
+        # the ids of a chunk's free rides and notifications in one call
+        ids = iter(push_id_generator.next_ids(2 * len(chunk)))
+        for user_id in chunk:
+            token = generate_free_ride_token()
+            free_rides.append({
+                "id": next(ids),
+                "free_ride_type": FreeRideType.campaign_type,
+                "token": token,
+                "token_status": True,
+                "description": description,
+                "campaign": campaign,
+                "user_id": user_id,
+                "created_at": now,
+                "modified_at": now
+            })
+            notifications.append({
+                "id": next(ids),
+                "template": "free_ride_campaign",
+                "params": {"token": token},
+                "recipient_id": user_id,
+                "sender_id": sender_id,
+                "transaction_icon_id": transaction_icon_id,
+                "created_at": now,
+                "modified_at": now
+            })
+
+        try:
+            if chunk:
+                reset_ride_counters(chunk)
+                db.session.bulk_insert_mappings(FreeRide, free_rides)
+                db.session.bulk_insert_mappings(Notification, notifications)
+                update_notification_counters(chunk)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+
+        issued += len(free_rides)
+        if progress:
+            progress(issued, min(start + chunk_size, len(user_ids)))
+
+    return issued
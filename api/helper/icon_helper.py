@@ -0,0 +1,71 @@
+import time
+import threading
+
+try:
+    from ..models import db, Icon
+except ImportError:
+    from moov_backend.api.models import db, Icon
+
+
+# icons are seed data, they are reloaded every few minutes or on a miss
+ICON_CACHE_TTL = 300
+
+_icon_cache = {
+    "loaded_at": None,
+    "by_id": {},
+    "by_operation_type": {},
+    "missed": set()
+}
+_icon_cache_lock = threading.Lock()
+
+
+def load_icons():
+    """Load icons
+    Method reads every icon in a single query into the icon cache
+    """
+    by_id = {}
+    by_operation_type = {}
+    for icon_id, icon, operation_type in db.session.query(Icon.id, Icon.icon, Icon.operation_type):
+        by_id[icon_id] = icon
+        by_operation_type[operation_type] = icon_id
+
+    with _icon_cache_lock:
+        _icon_cache["by_id"] = by_id
+        _icon_cache["by_operation_type"] = by_operation_type
+        _icon_cache["missed"] = set()
+        _icon_cache["loaded_at"] = time.time()
+
+def clear_icon_cache():
+    with _icon_cache_lock:
+        _icon_cache["loaded_at"] = None
+
+def _get_cached_icon(key, value):
+    loaded_at = _icon_cache["loaded_at"]
+    if loaded_at is None or time.time() - loaded_at > ICON_CACHE_TTL:
+        load_icons()
+    if value not in _icon_cache[key] and (key, value) not in _icon_cache["missed"]:
+        # an icon added since the last load is picked up by reloading, a
+        # miss is remembered until the cache expires so a missing icon does
+        # not reload the cache on every lookup
+        missed = _icon_cache["missed"]
+        load_icons()
+        with _icon_cache_lock:
+            _icon_cache["missed"].update(missed)
+            _icon_cache["missed"].add((key, value))
+    return _icon_cache[key].get(value)
+
+def get_icon_id(operation_type):
+    """Get icon id
+    Method returns the id of the icon of an operation type from the icon
+    cache, or None when there is no such icon
+    """
+    return _get_cached_icon("by_operation_type", operation_type)
+
+def get_icon_url(icon_id):
+    """Get icon url
+    Method returns the url of an icon from the icon cache, or an empty
+    string when there is no such icon
+    """
+    if not icon_id:
+        return ""
+    return _get_cached_icon("by_id", icon_id) or ""
@@ -0,0 +1,87 @@
+import json
+
+from functools import partial
+from flask import current_app, make_response
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+# name: (dumps, loads) of every codec that can be used here
+CODECS = {
+    "json": (json.dumps, json.loads)
+}
+
+
+def with_json_fallback(loads):
+    def decode(value):
+        try:
+            return loads(value)
+        except ValueError:
+            # e.g. NaN or an integer past 64 bits, which only json reads
+            return json.loads(value)
+    return decode
+
+if ujson is not None:
+    if int(ujson.__version__.split(".")[0]) >= 2:
+        CODECS["ujson"] = (partial(ujson.dumps, escape_forward_slashes=False),
+                           with_json_fallback(ujson.loads))
+    else:
+        # ujson 1.x, the last releases that build on Python 2, rounds floats
+        # and encodes unknown objects instead of raising when it dumps, so it
+        # only decodes, with precise floats, and json still encodes
+        CODECS["ujson"] = (json.dumps, with_json_fallback(partial(ujson.loads, precise_float=True)))
+
+DEFAULT_CODEC = "ujson" if "ujson" in CODECS else "json"
+
+
+class JSONCodec(object):
+    '''
+    Encodes and decodes the JSON stored in StringyJSON and JSON columns and
+    the JSON the api responds with. The C-backed ujson is used when it is
+    installed, the standard library otherwise, and JSON_CODEC in the config
+    picks one by name. With ujson 1.x (Python 2) only the decoding is
+    ujson's.
+    '''
+
+    def __init__(self, app=None):
+        self.name = None
+        self.dumps = None
+        self.loads = None
+        self.use(DEFAULT_CODEC)
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.use(app.config.get('JSON_CODEC') or DEFAULT_CODEC)
+
+    def use(self, name):
+        if name not in CODECS:
+            raise ValueError("JSON codec {0} is not available, use one of {1}".format(
+                name, ", ".join(sorted(CODECS))))
+        self.name = name
+        self.dumps, self.loads = CODECS[name]
+
+    def output_json(self, data, code, headers=None):
+        """flask_restful's application/json representation on this codec,
+        debug and RESTFUL_JSON settings still format with the standard library
+        """
+        settings = current_app.config.get('RESTFUL_JSON', {})
+        if current_app.debug or settings:
+            settings = dict(settings)
+            if current_app.debug:
+                settings.setdefault('indent', 4)
+            dumped = json.dumps(data, **settings)
+        else:
+            dumped = self.dumps(data)
+
+        # always end the json dumps with a new line, as flask_restful does
+        response = make_response(dumped + "\n", code)
+        response.headers.extend(headers or {})
+        return response
+
+
+json_codec = JSONCodec()
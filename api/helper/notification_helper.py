@@ -1,21 +1,445 @@
+import os
+import atexit
+import base64
+import threading
+
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, bindparam, literal, select, cast, func, case, exists
+from sqlalchemy.exc import SQLAlchemyError
+
 try:
-    from ..models import Notification, Icon
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+try:
+    from ..generator.id_generator import push_id_generator
+    from ..helper.icon_helper import get_icon_id
+    from ..helper.notification_templates import NOTIFICATION_TEMPLATES
+    from ..models import db, User, Notification, NotificationArchive, in_db_transaction
     from ..schema import notification_schema
 except ImportError:
-    from moov_backend.api.models import Notification, Icon
+    from moov_backend.api.generator.id_generator import push_id_generator
+    from moov_backend.api.helper.icon_helper import get_icon_id
+    from moov_backend.api.helper.notification_templates import NOTIFICATION_TEMPLATES
+    from moov_backend.api.models import db, User, Notification, NotificationArchive, in_db_transaction
     from moov_backend.api.schema import notification_schema
 
 
-# save notifications
-def save_notification(recipient_id, sender_id, message, transaction_icon_id=None):
-    # default transaction_icon_id
-    if not transaction_icon_id:
-        transaction_icon_id = Icon.query.filter(Icon.operation_type=="moov_operation").first().id
-    new_notification = Notification(
-        message=message,
-        recipient_id=recipient_id,
-        sender_id=sender_id,
-        transaction_icon_id=transaction_icon_id
+class NotificationQueue(object):
+    '''
+    An in-process queue of notifications that a background thread writes
+    to the database in batched inserts, so requests do not wait on them.
+    The queue is flushed when the process exits cleanly. Notifications are
+    written synchronously when the queue is disabled (e.g. in tests).
+    '''
+
+    _stop = object()
+
+    def __init__(self, app=None):
+        self.app = None
+        self.asynchronous = False
+        self.batch_size = 100
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.asynchronous = app.config.get('NOTIFICATION_QUEUE_ASYNC', False)
+        self.batch_size = app.config.get('NOTIFICATION_BATCH_SIZE', self.batch_size)
+        atexit.register(self.stop)
+
+    def put(self, notifications):
+        """Writes or queues a list of notifications"""
+        if not self.asynchronous:
+            return self.write(notifications)
+        self._start_worker()
+        self._queue.put(notifications)
+
+    def stop(self, timeout=None):
+        """Flushes the queued notifications and stops the worker"""
+        if self._worker and self._worker.is_alive() and \
+           self._worker_pid == os.getpid():
+            self._queue.put(self._stop)
+            self._worker.join(timeout)
+
+    def write(self, notifications):
+        try:
+            insert_notifications(notifications)
+            db.session.commit()
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            if self.app:
+                self.app.logger.error("{0} notification(s) were not saved: {1}".format(
+                    len(notifications), repr(error)))
+
+    def _start_worker(self):
+        # the worker is (re)started lazily so forked server workers get their own
+        if self._worker and self._worker.is_alive() and \
+           self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker and self._worker.is_alive() and \
+               self._worker_pid == os.getpid():
+                return
+            self._worker = threading.Thread(target=self._run, name="notification-queue")
+            self._worker.daemon = True
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _run(self):
+        with self.app.app_context():
+            stopped = False
+            while not stopped:
+                queued = self._queue.get()
+                if queued is self._stop:
+                    break
+
+                notifications = list(queued)
+                while len(notifications) < self.batch_size:
+                    try:
+                        queued = self._queue.get_nowait()
+                    except Empty:
+                        break
+                    if queued is self._stop:
+                        stopped = True
+                        break
+                    notifications.extend(queued)
+
+                self.write(notifications)
+            db.session.remove()
+
+
+notification_queue = NotificationQueue()
+
+
+CURSOR_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+# rows per multi-row INSERT, kept well under the bind parameter limits
+INSERT_CHUNK_SIZE = 500
+
+
+def update_notification_counters(recipient_ids):
+    """Update notification counters
+    Method adds the new notifications to the total and unread counters
+    of their recipients, the change is committed with the notifications
+    """
+    recipients = Counter(recipient_id for recipient_id in recipient_ids if recipient_id)
+    if not recipients:
+        return
+
+    user_table = User.__table__
+    db.session.execute(
+        user_table.update().
+            where(user_table.c.id==bindparam("recipient_id")).
+            values(
+                notification_count=user_table.c.notification_count + bindparam("count"),
+                unread_notification_count=user_table.c.unread_notification_count + bindparam("count")
+            ),
+        [{"recipient_id": recipient_id, "count": count}
+            for recipient_id, count in recipients.items()]
     )
-    new_notification.save()
-    return notification_schema.dump(new_notification)
+
+def archive_notifications(retention_days, chunk_size=1000, progress=None):
+    """Archive notifications
+    Method moves the notifications older than the retention period into
+    NotificationArchive, one chunk per transaction so row locks stay short.
+    Archived notifications are taken off the counters of their recipients
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    notification_table = Notification.__table__
+    archive_table = NotificationArchive.__table__
+    user_table = User.__table__
+    columns = [
+        "id", "message", "template", "params", "read", "recipient_id",
+        "sender_id", "transaction_icon_id", "created_at", "modified_at"
+    ]
+    archived = 0
+
+    while True:
+        try:
+            # the chunk stays locked until it is committed, so it can not be
+            # marked read between being counted and being moved
+            _notifications = db.session.query(
+                                Notification.id,
+                                Notification.recipient_id,
+                                Notification.read
+                            ).filter(Notification.created_at<cutoff).\
+                            order_by(Notification.created_at, Notification.id).\
+                            limit(chunk_size).\
+                            with_for_update().all()
+            if not _notifications:
+                db.session.rollback()
+                break
+
+            notification_ids = [notification.id for notification in _notifications]
+            archived_at = literal(datetime.utcnow(), db.DateTime)
+            db.session.execute(
+                archive_table.insert().from_select(
+                    columns + ["archived_at"],
+                    select([notification_table.c[column] for column in columns] + [archived_at]).
+                        where(notification_table.c.id.in_(notification_ids))
+                )
+            )
+            db.session.execute(
+                notification_table.delete().where(notification_table.c.id.in_(notification_ids))
+            )
+
+            # the counters are of the notifications that are not archived
+            moved = Counter(notification.recipient_id for notification in _notifications
+                                if notification.recipient_id)
+            unread = Counter(notification.recipient_id for notification in _notifications
+                                if not notification.read and notification.recipient_id)
+            if moved:
+                db.session.execute(
+                    user_table.update().
+                        where(user_table.c.id==bindparam("recipient_id")).
+                        values(
+                            notification_count=user_table.c.notification_count - bindparam("count"),
+                            unread_notification_count=user_table.c.unread_notification_count - bindparam("unread")
+                        ),
+                    [{"recipient_id": recipient_id, "count": count, "unread": unread[recipient_id]}
+                        for recipient_id, count in moved.items()]
+                )
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+
+        archived += len(notification_ids)
+        if progress:
+            progress(archived)
+
+    return archived
+
+def compact_notifications():
+    """Compact notifications
+    Method vacuums the Notification table on postgres so the space freed by
+    archiving is reused and the planner statistics are refreshed
+    """
+    if db.engine.dialect.name != "postgresql":
+        return False
+
+    # VACUUM can not run inside a transaction block
+    connection = db.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    try:
+        connection.execute('VACUUM ANALYZE "Notification"')
+    finally:
+        connection.close()
+    return True
+
+def mark_notifications_read(user_id, notification_ids=None):
+    """Mark notifications read
+    Method marks the unread notifications of the user (all of them when no
+    ids are given) as read and takes them off the unread counter
+    """
+    unread_notifications = Notification.query.filter(and_(
+                                Notification.recipient_id==user_id,
+                                Notification.read==False
+                            ))
+    if notification_ids is not None:
+        unread_notifications = unread_notifications.filter(Notification.id.in_(notification_ids))
+
+    try:
+        marked = unread_notifications.update({Notification.read: True}, synchronize_session=False)
+        if marked:
+            User.query.filter(User.id==user_id).update({
+                User.unread_notification_count: User.unread_notification_count - marked
+            }, synchronize_session=False)
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+    return marked
+
+def count_archived_notifications(user_id):
+    """Count archived notifications
+    Method returns how many archived notifications the user has and how
+    many of them are unread
+    """
+    all_count, unread_count = db.session.query(
+                                    func.count(NotificationArchive.id),
+                                    func.sum(case([(NotificationArchive.read==False, 1)], else_=0))
+                                ).filter(NotificationArchive.recipient_id==user_id).one()
+    return all_count, int(unread_count or 0)
+
+def encode_notification_cursor(notification):
+    cursor = "{0}|{1}".format(notification.created_at.strftime(CURSOR_DATE_FORMAT), notification.id)
+    return base64.urlsafe_b64encode(cursor.encode("utf-8")).decode("utf-8")
+
+def decode_notification_cursor(cursor):
+    """Decode notification cursor
+    Method returns the (created_at, id) position encoded in the cursor,
+    or None when the cursor is not valid
+    """
+    try:
+        created_at, notification_id = base64.urlsafe_b64decode(str(cursor)).decode("utf-8").split("|", 1)
+        return datetime.strptime(created_at, CURSOR_DATE_FORMAT), notification_id
+    except (TypeError, ValueError):
+        return None
+
+def get_notifications_page(user_id, limit, cursor=None, model=Notification, offset=0):
+    """Get notifications page
+    Method returns up to limit notifications of the user, newest first,
+    that come after the cursor position (or skips offset of them when there
+    is no cursor), and whether more are left.
+    Archived notifications are paged by passing NotificationArchive as model
+    """
+    notifications = model.query.filter(model.recipient_id==user_id)
+    if cursor:
+        created_at, notification_id = cursor
+        notifications = notifications.filter(or_(
+                            model.created_at<created_at,
+                            and_(
+                                model.created_at==created_at,
+                                model.id<notification_id
+                            )
+                        ))
+    notifications = notifications.order_by(
+                        model.created_at.desc(),
+                        model.id.desc()
+                    )
+    if offset and not cursor:
+        notifications = notifications.offset(offset)
+    notifications = notifications.limit(limit + 1).all()
+    return notifications[:limit], len(notifications) > limit
+
+
+def build_notification(recipient_id, sender_id, template, params=None,
+transaction_icon_id=None, notification_id=None):
+    """Build notification
+    Method returns the row of a new notification, the message is stored
+    as one of the NOTIFICATION_TEMPLATES and the params it is filled with
+    """
+    if template not in NOTIFICATION_TEMPLATES:
+        raise ValueError("Unknown notification template {0}".format(template))
+
+    now = datetime.utcnow()
+    return {
+        "id": notification_id or push_id_generator.next_id(),
+        "message": None,
+        "template": template,
+        "params": params,
+        "read": False,
+        "recipient_id": recipient_id,
+        "sender_id": sender_id,
+        "transaction_icon_id": transaction_icon_id,
+        "created_at": now,
+        "modified_at": now
+    }
+
+def insert_notifications(notifications):
+    """Insert notifications
+    Method writes the notifications with multi-row INSERTs and adds them to
+    their recipients' counters, the caller commits
+    """
+    for notification in notifications:
+        # default transaction_icon_id
+        if not notification.get("transaction_icon_id"):
+            notification["transaction_icon_id"] = get_icon_id("moov_operation")
+
+    for start in range(0, len(notifications), INSERT_CHUNK_SIZE):
+        db.session.execute(
+            Notification.__table__.insert().values(notifications[start:start + INSERT_CHUNK_SIZE])
+        )
+    update_notification_counters(
+        [notification["recipient_id"] for notification in notifications]
+    )
+
+def broadcast_notification(sender_id, template, params=None, school_id=None,
+user_type_id=None, transaction_icon_id=None):
+    """Broadcast notification
+    Method sends a notification to every user of a school and/or user type
+    with a single INSERT ... SELECT, and returns how many were sent
+    """
+    if template not in NOTIFICATION_TEMPLATES:
+        raise ValueError("Unknown notification template {0}".format(template))
+
+    user_table = User.__table__
+    notification_table = Notification.__table__
+    recipients = []
+    if school_id:
+        recipients.append(user_table.c.school_id==school_id)
+    if user_type_id:
+        recipients.append(user_table.c.user_type_id==user_type_id)
+
+    now = datetime.utcnow()
+    params_type = notification_table.c.params.type
+    # every notification id is the broadcast's own push id followed by the
+    # recipient's id, so they are unique and sort in broadcast order
+    broadcast_id = push_id_generator.next_id()
+    notifications = select([
+                        (literal(broadcast_id) + user_table.c.id).label("id"),
+                        literal(template).label("template"),
+                        cast(literal(params, params_type), params_type).label("params"),
+                        literal(False).label("read"),
+                        user_table.c.id.label("recipient_id"),
+                        literal(sender_id).label("sender_id"),
+                        literal(transaction_icon_id or get_icon_id("moov_operation")).label("transaction_icon_id"),
+                        literal(now, db.DateTime).label("created_at"),
+                        literal(now, db.DateTime).label("modified_at")
+                    ]).where(and_(*recipients))
+
+    try:
+        sent = db.session.execute(
+                    notification_table.insert().from_select(
+                        ["id", "template", "params", "read", "recipient_id", "sender_id",
+                         "transaction_icon_id", "created_at", "modified_at"],
+                        notifications
+                    )
+                ).rowcount
+        # the counters are bumped for the users that got one of the rows
+        # just inserted, a user who joins or leaves the recipients between
+        # the two statements is counted the way the insert saw them
+        broadcast_notifications = notification_table.alias()
+        db.session.execute(
+            user_table.update().
+                where(exists().where(
+                    broadcast_notifications.c.id==literal(broadcast_id) + user_table.c.id
+                )).
+                values(
+                    notification_count=user_table.c.notification_count + 1,
+                    unread_notification_count=user_table.c.unread_notification_count + 1
+                )
+        )
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        raise
+    return sent
+
+
+# save notifications
+# commit=False leaves the notifications in the caller's unit of work,
+# otherwise they are queued and written in the background
+def save_notifications(notifications, commit=True):
+    """Save notifications
+    Method saves many notifications together, each one a dict of the
+    arguments of save_notification, in a db_transaction they are written
+    with the transaction instead of the queue
+    """
+    notification_ids = push_id_generator.next_ids(len(notifications))
+    new_notifications = [
+        build_notification(notification_id=notification_id, **notification)
+        for notification_id, notification in zip(notification_ids, notifications)
+    ]
+
+    if not commit or in_db_transaction():
+        insert_notifications(new_notifications)
+    else:
+        notification_queue.put([dict(notification) for notification in new_notifications])
+    return [notification_schema.dump(notification) for notification in new_notifications]
+
+def save_notification(recipient_id, sender_id, template, params=None, transaction_icon_id=None, commit=True):
+    return save_notifications([{
+        "recipient_id": recipient_id,
+        "sender_id": sender_id,
+        "template": template,
+        "params": params,
+        "transaction_icon_id": transaction_icon_id
+    }], commit=commit)[0]
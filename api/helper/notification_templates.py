@@ -0,0 +1,38 @@
+# notifications are stored as a template id and the parameters it is filled
+# with, the message is only rendered when a notification is serialized.
+# ids are stored in the database, so they must never be renamed or reused.
+# the templates are unicode so python 2 can fill them with non-ascii names
+NOTIFICATION_TEMPLATES = {
+    "wallet_loaded": u"Your wallet has been credited with N{amount}",
+    "wallet_credited": u"Your wallet has been credited with N{amount} by {name}",
+    "transfer_sent": u"Your wallet has been debited with N{amount}, with a transaction charge of N{charge} by {name}",
+    "ride_fare_paid": u"Your wallet has been debited with N{amount} for your ride fare with {name}",
+    "free_token_used": u"Your transaction costs N0, your free token {token} was used",
+    "free_ride_given": u"Your transaction with {name} was a free ride",
+    "free_ride_earned": u"You have earned a free ride token '{token}'",
+    "free_ride_shared": u"Congrats, you got a free ride token {token} for sharing our app",
+    "free_ride_campaign": u"Congrats, you got a free ride token {token}",
+    "ride_requested": u"{name} ({email}) has requested to ride with you from {location} to {destination}",
+    "ride_rejected": u"{name} has rejected your request for a ride",
+    "ride_accepted": u"{name} has accepted your request for a ride",
+    "welcome": u"Welcome to MOOV app.",
+    "driver_registered": u"Thank you for registering to be a MOOV driver. Your request is waiting approval, we will get back to you soon",
+    "password_reset": u"You reset your password",
+    "announcement": u"{message}"
+}
+
+
+def render_notification_message(template, params=None, message=None):
+    """Render notification message
+    Method fills the template with its parameters, notifications saved
+    before templates were introduced keep their stored message
+    """
+    if not template:
+        return message
+    text = NOTIFICATION_TEMPLATES.get(template)
+    if text is None:
+        return message
+    try:
+        return text.format(**(params or {}))
+    except (KeyError, IndexError):
+        return text
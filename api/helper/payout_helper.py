@@ -0,0 +1,143 @@
+import os
+import csv
+
+from datetime import datetime
+from decimal import Decimal, ROUND_DOWN
+from sqlalchemy import func, and_, bindparam
+
+try:
+    from ..generator.id_generator import push_id_generator
+    from ..models import (
+        db, User, UserType, Wallet, DriverInfo, SchoolInfo, Transaction,
+        OperationType, TransactionType
+    )
+except ImportError:
+    from moov_backend.api.generator.id_generator import push_id_generator
+    from moov_backend.api.models import (
+        db, User, UserType, Wallet, DriverInfo, SchoolInfo, Transaction,
+        OperationType, TransactionType
+    )
+
+
+PAYOUT_USER_TYPES = ["driver", "school", "car_owner"]
+PAYOUT_FILE_HEADER = [
+    "reference", "account_number", "bank_name", "account_name",
+    "amount", "email", "payee_type"
+]
+
+
+def get_payable_wallets(threshold, batch_size):
+    """Get payable wallets
+    Method streams one row per payee wallet whose balance is at or
+    above the threshold, the wallets are locked until the payout commits
+    """
+    bank_name = func.coalesce(DriverInfo.bank_name, SchoolInfo.bank_name)
+    account_number = func.coalesce(DriverInfo.account_number, SchoolInfo.account_number)
+
+    return db.session.query(
+                Wallet.id.label("wallet_id"),
+                User.id.label("user_id"),
+                User.email,
+                User.firstname,
+                User.lastname,
+                UserType.title.label("user_type"),
+                bank_name.label("bank_name"),
+                account_number.label("account_number"),
+                Wallet.wallet_amount.label("balance")
+            ).join(User, Wallet.user_id==User.id).\
+            join(UserType, User.user_type_id==UserType.id).\
+            outerjoin(DriverInfo, DriverInfo.driver_id==User.id).\
+            outerjoin(SchoolInfo, SchoolInfo.email==User.email).\
+            filter(and_(
+                UserType.title.in_(PAYOUT_USER_TYPES),
+                account_number!=None,
+                Wallet.wallet_amount>=threshold
+            )).order_by(Wallet.id).\
+            with_for_update(of=Wallet).\
+            yield_per(batch_size)
+
+
+def run_payout(output_file, threshold, batch_size=500):
+    """Run payout
+    Method debits every payable wallet, writes the bank-upload file for the
+    wallets that were debited and records the payout debits as transactions.
+    The file is only moved into place once the debits have been committed,
+    so a failed run leaves nothing behind
+    """
+    transactions = []
+    total_amount = 0.0
+    skipped = 0
+    temp_file = "{0}.part".format(output_file)
+    payout_date = datetime.utcnow()
+    wallet_table = Wallet.__table__
+
+    # a wallet is only debited while it still holds the amount, e.g. where
+    # the database does not lock the selected wallets (sqlite)
+    debit_wallet = wallet_table.update().\
+                    where(and_(
+                        wallet_table.c.id==bindparam("wallet_id"),
+                        wallet_table.c.wallet_amount>=bindparam("amount")
+                    )).\
+                    values(
+                        wallet_amount=wallet_table.c.wallet_amount - bindparam("amount"),
+                        modified_at=payout_date
+                    )
+
+    try:
+        payees = list(get_payable_wallets(threshold, batch_size))
+        with open(temp_file, "w") as upload_file:
+            writer = csv.writer(upload_file)
+            writer.writerow(PAYOUT_FILE_HEADER)
+
+            for payee in payees:
+                # whole kobo, never more than the balance
+                amount = float(Decimal(repr(payee.balance)).quantize(Decimal("0.01"), rounding=ROUND_DOWN))
+                debited = db.session.execute(debit_wallet, {
+                                "wallet_id": payee.wallet_id,
+                                "amount": amount
+                            }).rowcount
+                if debited != 1:
+                    skipped += 1
+                    continue
+
+                reference = push_id_generator.next_id()
+                account_name = "{0} {1}".format(payee.firstname, payee.lastname).title()
+                writer.writerow([
+                    reference, payee.account_number, payee.bank_name,
+                    account_name, "{0:.2f}".format(amount), payee.email,
+                    payee.user_type
+                ])
+
+                transactions.append({
+                    "id": reference,
+                    "transaction_detail": "Payout of N{0} to {1} ({2} {3})".format(
+                        amount, payee.email, payee.bank_name, payee.account_number
+                    ),
+                    "type_of_operation": OperationType.payout_type,
+                    "type_of_transaction": TransactionType.debit_type,
+                    "cost_of_transaction": amount,
+                    "sender_amount_before_transaction": payee.balance,
+                    "sender_amount_after_transaction": payee.balance - amount,
+                    "sender_id": payee.user_id,
+                    "sender_wallet_id": payee.wallet_id,
+                    "transaction_date": payout_date,
+                    "modified_at": payout_date
+                })
+                total_amount += amount
+
+        for start in range(0, len(transactions), batch_size):
+            db.session.bulk_insert_mappings(Transaction, transactions[start:start + batch_size])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    os.rename(temp_file, output_file)
+    return {
+        "payees": len(transactions),
+        "skipped": skipped,
+        "total_amount": round(total_amount, 2),
+        "output_file": output_file
+    }
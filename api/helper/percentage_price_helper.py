@@ -9,3 +9,12 @@ except ImportError:
 def get_percentage_price(title):
     _percentage_price = PercentagePrice.query.filter(PercentagePrice.title==title).first()
     return _percentage_price
+
+# get many percentage prices by title
+def get_percentage_prices(*titles):
+    """Get percentage prices
+    Method loads the percentage prices of the titles in a single query and
+    returns them keyed by title
+    """
+    _percentage_prices = PercentagePrice.query.filter(PercentagePrice.title.in_(set(title for title in titles if title))).all()
+    return dict((_percentage_price.title, _percentage_price) for _percentage_price in _percentage_prices)
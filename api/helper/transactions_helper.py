@@ -8,19 +8,23 @@ from sqlalchemy import desc, and_
 
 try:
     from .error_message import moov_errors
-    from ..helper.notification_helper import save_notification
+    from ..helper.icon_helper import get_icon_id
+    from ..helper.notification_helper import save_notification, save_notifications
+    from ..helper.free_ride_helper import record_ride
     from ..schema import transaction_schema
     from ..models import (
-        Wallet, Icon, Transaction, OperationType, TransactionType,
-        FreeRide
+        db, Wallet, Transaction, OperationType, TransactionType,
+        FreeRide, save_all
     )
 except ImportError:
     from moov_backend.api.helper.error_message import moov_errors
-    from moov_backend.api.helper.notification_helper import save_notification
+    from moov_backend.api.helper.icon_helper import get_icon_id
+    from moov_backend.api.helper.notification_helper import save_notification, save_notifications
+    from moov_backend.api.helper.free_ride_helper import record_ride
     from moov_backend.api.schema import transaction_schema
     from moov_backend.api.models import (
-        Wallet, Icon, Transaction, OperationType, TransactionType,
-        FreeRide
+        db, Wallet, Transaction, OperationType, TransactionType,
+        FreeRide, save_all
     )
 
 # load-wallet operation function
@@ -37,15 +41,13 @@ def load_wallet_operation(cost_of_transaction, _current_user, _current_user_id,
     _receiver_wallet.wallet_amount = receiver_amount_after_transaction
     _receiver_wallet.save()
 
-    transaction_icon = Icon.query.filter(Icon.operation_type=="load_wallet_operation").first()
-    if transaction_icon:
-        _transaction_icon_id = transaction_icon.id
+    _transaction_icon_id = get_icon_id("load_wallet_operation")
 
-    notification_message = "Your wallet has been credited with N{0}".format(cost_of_transaction)
     save_notification(
             recipient_id=receiver_id, 
             sender_id=moov_user.id, 
-            message=notification_message, 
+            template="wallet_loaded",
+            params={"amount": cost_of_transaction},
             transaction_icon_id=_transaction_icon_id
         )
     
@@ -76,28 +78,26 @@ def transfer_operation(_sender, _receiver, _sender_wallet, _receiver_wallet,
     _sender_wallet.wallet_amount = sender_amount_after_transaction
     _receiver_wallet.wallet_amount = receiver_amount_after_transaction
     moov_wallet.wallet_amount += transfer_charge
-    _sender_wallet.save()
-    _receiver_wallet.save()
-    moov_wallet.save()
-
-    transaction_icon = Icon.query.filter(Icon.operation_type=="transfer_operation").first()
-    if transaction_icon:
-        _transaction_icon_id = transaction_icon.id
-
-    notification_user_sender_message = "Your wallet has been debited with N{0}, with a transaction charge of N{1} by {2}".format(cost_of_transaction, transfer_charge, "MOOV")
-    notification_user_receiver_message = "Your wallet has been credited with N{0} by {1}".format(cost_of_transaction, (str(_sender.firstname)).title())
-    save_notification(
-            recipient_id=_sender.id, 
-            sender_id=moov_user.id, 
-            message=notification_user_sender_message, 
-            transaction_icon_id=_transaction_icon_id
-        )
-    save_notification(
-            recipient_id=_receiver.id, 
-            sender_id=moov_user.id, 
-            message=notification_user_receiver_message, 
-            transaction_icon_id=_transaction_icon_id
-        )
+    save_all([_sender_wallet, _receiver_wallet, moov_wallet])
+
+    _transaction_icon_id = get_icon_id("transfer_operation")
+
+    save_notifications([
+        {
+            "recipient_id": _sender.id,
+            "sender_id": moov_user.id,
+            "template": "transfer_sent",
+            "params": {"amount": cost_of_transaction, "charge": transfer_charge, "name": "MOOV"},
+            "transaction_icon_id": _transaction_icon_id
+        },
+        {
+            "recipient_id": _receiver.id,
+            "sender_id": moov_user.id,
+            "template": "wallet_credited",
+            "params": {"amount": cost_of_transaction, "name": (str(_sender.firstname)).title()},
+            "transaction_icon_id": _transaction_icon_id
+        }
+    ])
 
     new_transaction = Transaction(
         transaction_detail= transaction_detail,
@@ -135,30 +135,29 @@ def ride_fare_operation(_sender, _receiver, driver_percentage_price_info,
     car_owner_wallet.wallet_amount += car_owner_wallet_amount
     _receiver_wallet.wallet_amount = receiver_amount_after_transaction
     _sender_wallet.wallet_amount = sender_amount_after_transaction
-    moov_wallet.save()
-    school_wallet.save()
-    car_owner_wallet.save()
-    _receiver_wallet.save()
-    _sender_wallet.save()
+    save_all([moov_wallet, school_wallet, car_owner_wallet, _receiver_wallet, _sender_wallet])
+
+    # rolling ride counter used for free ride eligibility
+    record_ride(_sender.id)
 
-    transaction_icon = Icon.query.filter(Icon.operation_type=="ride_operation").first()
-    if transaction_icon:
-        _transaction_icon_id = transaction_icon.id
+    _transaction_icon_id = get_icon_id("ride_operation")
     
-    notification_user_sender_message = "Your wallet has been debited with N{0} for your ride fare with {1}".format(cost_of_transaction, (str(_receiver.firstname)).title())
-    notification_user_receiver_message = "Your wallet has been credited with N{0} by {1}".format(driver_amount, (str(_sender.firstname)).title())
-    save_notification(
-            recipient_id=_sender.id, 
-            sender_id=moov_user.id, 
-            message=notification_user_sender_message, 
-            transaction_icon_id=_transaction_icon_id
-        )
-    save_notification(
-            recipient_id=_receiver.id, 
-            sender_id=moov_user.id, 
-            message=notification_user_receiver_message, 
-            transaction_icon_id=_transaction_icon_id
-        )
+    save_notifications([
+        {
+            "recipient_id": _sender.id,
+            "sender_id": moov_user.id,
+            "template": "ride_fare_paid",
+            "params": {"amount": cost_of_transaction, "name": (str(_receiver.firstname)).title()},
+            "transaction_icon_id": _transaction_icon_id
+        },
+        {
+            "recipient_id": _receiver.id,
+            "sender_id": moov_user.id,
+            "template": "wallet_credited",
+            "params": {"amount": driver_amount, "name": (str(_sender.firstname)).title()},
+            "transaction_icon_id": _transaction_icon_id
+        }
+    ])
 
     new_transaction = Transaction(
         transaction_detail= transaction_detail,
@@ -179,7 +178,8 @@ def ride_fare_operation(_sender, _receiver, driver_percentage_price_info,
 
 def save_transaction(transaction_detail, type_of_operation, type_of_transaction, cost_of_transaction, 
 _receiver, _sender, _receiver_wallet, _sender_wallet, receiver_amount_before_transaction, 
-sender_amount_before_transaction, receiver_amount_after_transaction, sender_amount_after_transaction):
+sender_amount_before_transaction, receiver_amount_after_transaction, sender_amount_after_transaction,
+commit=True):
     new_transaction = Transaction(
         transaction_detail= transaction_detail,
         type_of_operation= type_of_operation,
@@ -194,7 +194,7 @@ sender_amount_before_transaction, receiver_amount_after_transaction, sender_amou
         receiver_wallet_id= _receiver_wallet.id,
         sender_wallet_id= _sender_wallet.id
     )
-    new_transaction.save()
+    new_transaction.save(commit=commit)
     return transaction_schema.dump(new_transaction)
 
 # paystack deduction calculation
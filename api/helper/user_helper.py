@@ -1,15 +1,32 @@
+from sqlalchemy.orm import joinedload
+
 try:
     from .error_message import moov_errors
-    from ..models import User, AuthenticationType
+    from ..models import User, AuthenticationType, normalize_email
 except ImportError:
     from moov_backend.api.helper.error_message import moov_errors
-    from moov_backend.api.models import User, SchoolInfo, AuthenticationType
+    from moov_backend.api.models import User, SchoolInfo, AuthenticationType, normalize_email
 
 # get any user by email
 def get_user(email):
-    _user = User.query.filter(User.email==email).first()
+    _user = User.get_by_email(email)
     return _user
 
+# get users with their wallets by email
+def get_users_with_wallets(*emails):
+    """Get users with wallets
+    Method loads the users of the emails in a single query, with their user
+    type and wallets joined in, and returns them keyed by normalized email
+    """
+    emails = set(normalize_email(email) for email in emails if email)
+    if not emails:
+        return {}
+    _users = User.query.options(
+                    joinedload(User.user_type),
+                    joinedload(User.wallet_user)
+                ).filter(User.email.in_(emails)).all()
+    return dict((_user.email, _user) for _user in _users)
+
 # get authentication type
 def get_authentication_type(authentication_type):
     if (str(authentication_type) == "facebook"):
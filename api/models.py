@@ -1,22 +1,46 @@
 # models
 import os
-import json
+import hmac
 import enum
+import hashlib
+import operator
 
+from contextlib import contextmanager
 from datetime import datetime
 from alembic import op
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import backref, relationship
+from sqlalchemy.orm import backref, relationship, validates
+from sqlalchemy.orm.attributes import get_history
 
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.types import JSON, TEXT, TypeDecorator
-from sqlalchemy import event, and_
-from werkzeug import generate_password_hash, check_password_hash
+from sqlalchemy import event
 
 try:
-    from generator.id_generator import PushID
+    from auth.password import password_hasher
+    from generator.id_generator import push_id_generator
+    from helper.json_codec import json_codec
 except ImportError:
-    from moov_backend.api.generator.id_generator import PushID
+    from moov_backend.api.auth.password import password_hasher
+    from moov_backend.api.generator.id_generator import push_id_generator
+    from moov_backend.api.helper.json_codec import json_codec
+
+def normalize_email(email):
+    """Normalize email
+    Method strips and lower cases an email, emails are stored normalized so
+    a case-insensitive lookup is an equality on the unique email index
+    """
+    if email is None:
+        return email
+    return email.strip().lower()
+
+def hash_temp_password(password):
+    """Hash temp password
+    Method returns the keyed digest a temporary password is stored and
+    matched as
+    """
+    key = (os.getenv("TOKEN_KEY") or "").encode("utf-8")
+    return hmac.new(key, password.encode("utf-8"), hashlib.sha256).hexdigest()
 
 def to_camel_case(snake_str):
     title_str = snake_str.title().replace("_", "")
@@ -31,13 +55,13 @@ class StringyJSON(TypeDecorator):
     def process_bind_param(self, value, dialect):
         """Map value into json data."""
         if value is not None:
-            value = json.dumps(value)
+            value = json_codec.dumps(value)
         return value
 
     def process_result_value(self, value, dialect):
         """Map json data to python dictionary."""
         if value is not None:
-            value = json.loads(value)
+            value = json_codec.loads(value)
         return value
 
 
@@ -48,33 +72,111 @@ MagicJSON = JSON().with_variant(StringyJSON, 'sqlite')
 type_map = {'sqlite': MagicJSON, 'postgresql': JSON}
 json_type = type_map[os.getenv("DB_TYPE")]
 
-db = SQLAlchemy()
+
+class MoovSQLAlchemy(SQLAlchemy):
+    """Encodes postgres JSON columns with the app's JSON codec."""
+
+    def apply_driver_hacks(self, app, info, options):
+        if info.drivername.startswith("postgresql"):
+            options.setdefault("json_serializer", lambda value: json_codec.dumps(value))
+            options.setdefault("json_deserializer", lambda value: json_codec.loads(value))
+        return super(MoovSQLAlchemy, self).apply_driver_hacks(app, info, options)
+
+
+db = MoovSQLAlchemy()
+
+# key of the db_transaction nesting depth in the session's info dict
+TRANSACTION_DEPTH = "moov_transaction_depth"
+
+
+def in_db_transaction():
+    """In db transaction
+    Method returns True inside a db_transaction block
+    """
+    return db.session.info.get(TRANSACTION_DEPTH, 0) > 0
+
+@contextmanager
+def db_transaction():
+    """Db transaction
+    Method runs a block in one database transaction, saves and deletes in
+    the block are flushed and committed together when it ends, or rolled
+    back when it raises. A nested block runs in a savepoint, so only its
+    own changes are rolled back
+    """
+    session = db.session()
+    depth = session.info.get(TRANSACTION_DEPTH, 0)
+    if depth:
+        session.begin_nested()
+    session.info[TRANSACTION_DEPTH] = depth + 1
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.info[TRANSACTION_DEPTH] = depth
+
+def save_all(objects, commit=True):
+    """Save all
+    Method saves many instances in one flush, and commits them unless
+    commit is False or it runs in a db_transaction
+    """
+    db.session.add_all(objects)
+    return _finish_write(commit)
+
+def delete_all(objects, commit=True):
+    """Delete all
+    Method deletes many instances in one flush, and commits them unless
+    commit is False or it runs in a db_transaction
+    """
+    for obj in objects:
+        db.session.delete(obj)
+    return _finish_write(commit)
+
+def _finish_write(commit):
+    # a deferred write is flushed so ids and constraint errors surface now,
+    # and its errors are raised for the caller's transaction to roll back
+    if not commit or in_db_transaction():
+        db.session.flush()
+        return True
+    try:
+        db.session.commit()
+        return True
+    except SQLAlchemyError as error:
+        db.session.rollback()
+        return error
+
 
 class ModelViewsMix(object):
 
+    # camelCase keys of the columns and a getter of their values, set once
+    # per model when its mapper is configured
+    _serialize_keys = ()
+    _serialize_values = None
+
     def serialize(self):
-        return {to_camel_case(column.name): getattr(self, column.name)
-                for column in self.__table__.columns}
-
-    def save(self):
-        """Saves an instance of the model to the database."""
-        try:
-            db.session.add(self)
-            db.session.commit()
-            return True
-        except SQLAlchemyError as error:
-            db.session.rollback()
-            return error
+        return dict(zip(self._serialize_keys, self._serialize_values(self)))
+
+    def save(self, commit=True):
+        """Saves an instance of the model to the database, the instance is
+        only flushed when commit is False or in a db_transaction."""
+        return save_all([self], commit=commit)
     
-    def delete(self):
-        """Delete an instance of the model from the database."""
-        try:
-            db.session.delete(self)
-            db.session.commit()
-            return True
-        except SQLAlchemyError as error:
-            db.session.rollback()
-            return error
+    def delete(self, commit=True):
+        """Delete an instance of the model from the database, the instance
+        is only flushed when commit is False or in a db_transaction."""
+        return delete_all([self], commit=commit)
+
+    @staticmethod
+    def save_all(objects, commit=True):
+        """Saves many instances to the database in one flush."""
+        return save_all(objects, commit=commit)
+
+    @staticmethod
+    def delete_all(objects, commit=True):
+        """Deletes many instances from the database in one flush."""
+        return delete_all(objects, commit=commit)
 
 
 # enums
@@ -84,6 +186,7 @@ class OperationType(enum.Enum):
     ride_type = "ride_fare"
     borrow_type = "borrow_me"
     cancel_type = "cancel_ride"
+    payout_type = "payout"
 
 
 class TransactionType(enum.Enum):
@@ -95,6 +198,7 @@ class TransactionType(enum.Enum):
 class FreeRideType(enum.Enum):
     social_share_type = "social_share"
     ride_type = "ride"
+    campaign_type = "campaign"
 
 
 class RatingsType(enum.Enum):
@@ -143,7 +247,6 @@ class User(db.Model, ModelViewsMix):
     lastname = db.Column(db.String(30), nullable=False)
     email = db.Column(db.String(50), unique=True, nullable=False)
     _password = db.Column('password', db.String())
-    _ratings = db.Column('ratings', db.Integer)
     image_url = db.Column(db.String)
     mobile_number = db.Column(db.String, nullable=False)
     authorization_code = db.Column(db.String, unique=True)
@@ -151,10 +254,16 @@ class User(db.Model, ModelViewsMix):
     number_of_rides = db.Column(db.Integer, default=0)
     reset_password = db.Column(db.Boolean, default=False)
     current_ride = db.Column(json_type, nullable=True)
+    notification_count = db.Column(db.Integer, default=0, nullable=False)
+    unread_notification_count = db.Column(db.Integer, default=0, nullable=False)
+    ratings_sum = db.Column(db.Integer, default=0, nullable=False)
+    ratings_count = db.Column(db.Integer, default=0, nullable=False)
     forgot_password = db.relationship('ForgotPassword', backref='user_forgot_password', lazy='dynamic')
     wallet_user = db.relationship('Wallet', cascade="all,delete-orphan", back_populates='user_wallet')
     free_ride = db.relationship('FreeRide', backref='user_free_ride', lazy='dynamic')
     driver_info = db.relationship('DriverInfo', backref='driver_information', lazy='dynamic')
+    # the same driver info as a scalar that can be eager loaded
+    driver_profile = db.relationship('DriverInfo', uselist=False, viewonly=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -167,61 +276,42 @@ class User(db.Model, ModelViewsMix):
     def __setitem__(self, key, item):
         return setattr(self, key, item)
     
+    @validates('email')
+    def validate_email(self, key, email):
+        return normalize_email(email)
+
     def _get_password(self):
         return self._password
 
     def _set_password(self, password):
-        self._password = generate_password_hash(password)
+        self._password = password_hasher.hash(password)
 
     password = db.synonym('_password',
                         descriptor=property(_get_password,
                                             _set_password))
 
-    def _get_ratings(self):
-        self._ratings = self.get_average_ratings() 
-        return self._ratings
-
-    def _set_ratings(self):
-        self._ratings = self.get_average_ratings() 
-
-    ratings = db.synonym('_ratings',
-                        descriptor=property(_get_ratings,
-                                            _set_ratings))
-
-    def get_average_ratings(self):
-        total_ratings = 0
-        my_ratings = RateMe.query.filter(and_(
-                        RateMe.ratee_id==str(self.id),
-                        RateMe.rating_type!=RatingsType.no_ratings
-                    )).all()
-
-        my_ratings_count = len(my_ratings)
-        if my_ratings_count == 0:
+    @property
+    def ratings(self):
+        # the average of the ratings kept by the RateMe listeners
+        if not self.ratings_count:
             return None
-
-        for rating in my_ratings:
-            if rating.rating_type == RatingsType.one:
-                total_ratings += 1
-            if rating.rating_type == RatingsType.two:
-                total_ratings += 2
-            if rating.rating_type == RatingsType.three:
-                total_ratings += 3
-            if rating.rating_type == RatingsType.four:
-                total_ratings += 4
-            if rating.rating_type == RatingsType.five:
-                total_ratings += 5
-
-        average_ratings = int(round(total_ratings / my_ratings_count, 0))
-        return average_ratings 
+        return int(round(float(self.ratings_sum) / self.ratings_count))
 
     def check_password(self, password):
         if self.password is None:
             return False
-        return check_password_hash(self.password, password)
+        return password_hasher.check(self.password, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password)
+
+    @classmethod
+    def get_by_email(cls, email):
+        return cls.query.filter(cls.email==normalize_email(email)).first()
 
     @classmethod
     def is_user_data_taken(cls, email):
-        return db.session.query(db.exists().where(User.email==email)).scalar()
+        return db.session.query(db.exists().where(User.email==normalize_email(email))).scalar()
 
     @classmethod
     def is_user_id_taken(cls, user_id):
@@ -229,14 +319,14 @@ class User(db.Model, ModelViewsMix):
 
     @classmethod
     def confirm_login(cls, email, user_id):
-        user = db.session.query(User).filter(User.email==email).first()
+        user = User.get_by_email(email)
         if str(user.user_id) == str(user_id):
             return True
         return False
 
     @classmethod
     def add_current_ride(cls, user_email, driver_info, user_location_name, user_destination_name, user_location, user_destination):
-        user = db.session.query(User).filter(User.email==user_email).first()
+        user = User.get_by_email(user_email)
 
         obj = {}
         obj["driver_info"] = driver_info
@@ -249,7 +339,7 @@ class User(db.Model, ModelViewsMix):
 
     @classmethod
     def remove_current_ride(cls, user_email):
-        user = db.session.query(User).filter(User.email==user_email).first()
+        user = User.get_by_email(user_email)
         user.current_ride = None
         user.save()
         
@@ -258,11 +348,14 @@ class User(db.Model, ModelViewsMix):
 class ForgotPassword(db.Model, ModelViewsMix):
   
     __tablename__ = 'ForgotPassword'
+    __table_args__ = (
+        db.Index('ForgotPassword_user_id_created_at_idx', 'user_id', 'created_at'),
+    )
 
     id = db.Column(db.String, primary_key=True)
     user_id = db.Column(db.String(), db.ForeignKey('User.id', ondelete='SET NULL'))
     school_id = db.Column(db.String(), db.ForeignKey('SchoolInfo.id', ondelete='SET NULL'))
-    temp_password = db.Column(db.String)
+    _temp_password = db.Column('temp_password', db.String)
     used = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     modified_at = db.Column(db.DateTime, default=datetime.utcnow,
@@ -271,6 +364,22 @@ class ForgotPassword(db.Model, ModelViewsMix):
     def __repr__(self):
         return '<ForgotPassword %r>' % (self.user_id)
 
+    def _get_temp_password(self):
+        return self._temp_password
+
+    def _set_temp_password(self, password):
+        # only the digest of a temporary password is stored
+        self._temp_password = hash_temp_password(password)
+
+    temp_password = db.synonym('_temp_password',
+                        descriptor=property(_get_temp_password,
+                                            _set_temp_password))
+
+    def check_temp_password(self, password):
+        if self.temp_password is None:
+            return False
+        return hmac.compare_digest(str(self.temp_password), hash_temp_password(password))
+
 
 class UserType(db.Model, ModelViewsMix):
   
@@ -292,12 +401,17 @@ class UserType(db.Model, ModelViewsMix):
 class FreeRide(db.Model, ModelViewsMix):
     
     __tablename__ = 'FreeRide'
+    __table_args__ = (
+        db.UniqueConstraint('campaign', 'user_id', name='FreeRide_campaign_user_id_key'),
+    )
 
     id = db.Column(db.String, primary_key=True)
     free_ride_type = db.Column(db.Enum(FreeRideType), nullable=False)
     token = db.Column(db.String, unique=True, nullable=False)
     token_status = db.Column(db.Boolean, default=False)
     description = db.Column(db.String, nullable=True)
+    # name of the campaign that issued the token, a user gets one per campaign
+    campaign = db.Column(db.String, nullable=True)
     user_id = db.Column(db.String(), db.ForeignKey('User.id', ondelete='SET NULL'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -306,6 +420,24 @@ class FreeRide(db.Model, ModelViewsMix):
         return '<FreeRide %r>' % (self.user_id)
 
 
+class RideCounter(db.Model, ModelViewsMix):
+    
+    __tablename__ = 'RideCounter'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'ride_day', name='RideCounter_user_id_ride_day_key'),
+    )
+
+    id = db.Column(db.String, primary_key=True)
+    user_id = db.Column(db.String(), db.ForeignKey('User.id', ondelete='CASCADE'), nullable=False)
+    ride_day = db.Column(db.Date, nullable=False)
+    ride_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return '<RideCounter %r %r %r>' % (self.user_id, self.ride_day, self.ride_count)
+
+
 class DriverInfo(db.Model, ModelViewsMix):
     
     __tablename__ = 'DriverInfo'
@@ -406,11 +538,15 @@ class SchoolInfo(db.Model, ModelViewsMix):
     def __repr__(self):
         return '<SchoolInfo %r>' % (self.name)
 
+    @validates('email')
+    def validate_email(self, key, email):
+        return normalize_email(email)
+
     def _get_password(self):
         return self._password
 
     def _set_password(self, password):
-        self._password = generate_password_hash(password)
+        self._password = password_hasher.hash(password)
 
     password = db.synonym('_password',
                         descriptor=property(_get_password,
@@ -513,9 +649,17 @@ class Icon(db.Model, ModelViewsMix):
 class Notification(db.Model, ModelViewsMix):
     
     __tablename__ = 'Notification'
+    __table_args__ = (
+        db.Index('Notification_recipient_id_created_at_id_idx', 'recipient_id', 'created_at', 'id'),
+        db.Index('Notification_created_at_id_idx', 'created_at', 'id'),
+    )
 
     id = db.Column(db.String, primary_key=True)
+    # rendered from template and params, only set on older notifications
     message = db.Column(db.String)
+    template = db.Column(db.String(32))
+    params = db.Column(json_type, nullable=True)
+    read = db.Column(db.Boolean, default=False, nullable=False)
     recipient_id = db.Column(db.String(), db.ForeignKey('User.id', ondelete='SET NULL'))
     sender_id = db.Column(db.String(), db.ForeignKey('User.id', ondelete='SET NULL'))
     transaction_icon_id = db.Column(db.String(), db.ForeignKey('Icon.id', ondelete='SET NULL'))
@@ -525,15 +669,60 @@ class Notification(db.Model, ModelViewsMix):
     modified_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
-        return '<Notification %r>' % (self.message)
+        return '<Notification %r>' % (self.template or self.message)
+
+
+class NotificationArchive(db.Model, ModelViewsMix):
+
+    __tablename__ = 'NotificationArchive'
+    __table_args__ = (
+        db.Index('NotificationArchive_recipient_id_created_at_id_idx', 'recipient_id', 'created_at', 'id'),
+    )
+
+    # rows keep the id, owners and dates they had in Notification
+    id = db.Column(db.String, primary_key=True)
+    message = db.Column(db.String)
+    template = db.Column(db.String(32))
+    params = db.Column(json_type, nullable=True)
+    read = db.Column(db.Boolean, default=False, nullable=False)
+    recipient_id = db.Column(db.String())
+    sender_id = db.Column(db.String())
+    transaction_icon_id = db.Column(db.String())
+    created_at = db.Column(db.DateTime)
+    modified_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<NotificationArchive %r>' % (self.template or self.message)
+
+
+class OutboundMail(db.Model, ModelViewsMix):
+
+    __tablename__ = 'OutboundMail'
+    __table_args__ = (
+        db.Index('OutboundMail_send_after_idx', 'send_after'),
+    )
+
+    # queued mail, a row is deleted once the mail is sent
+    id = db.Column(db.String, primary_key=True)
+    recipient = db.Column(db.String, nullable=False)
+    subject = db.Column(db.String, nullable=False)
+    template = db.Column(db.String(64), nullable=False)
+    params = db.Column(json_type, nullable=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    last_error = db.Column(db.String)
+    send_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<OutboundMail %r %r>' % (self.template, self.recipient)
 
 
 def fancy_id_generator(mapper, connection, target):
     '''
     A function to generate unique identifiers on insert
     '''
-    push_id = PushID()
-    target.id = push_id.next_id()
+    target.id = push_id_generator.next_id()
 
 # associate the listener function with models, to execute during the
 # "before_insert" event
@@ -545,13 +734,66 @@ tables = [
             Wallet, 
             Transaction, 
             Notification, 
+            OutboundMail,
             PercentagePrice,
             AdmissionType,
             Icon,
             SchoolInfo,
             DriverInfo,
-            FreeRide
+            FreeRide,
+            RideCounter
         ]
 
 for table in tables:
     event.listen(table, 'before_insert', fancy_id_generator)
+
+
+def rating_value(rating_type):
+    return rating_type.value if rating_type is not None else None
+
+def update_ratings_aggregate(connection, ratee_id, old_value, new_value):
+    # the change is applied in SQL within the flush, so ratings submitted
+    # at the same time can not overwrite each other
+    if not ratee_id or old_value == new_value:
+        return
+    user_table = User.__table__
+    connection.execute(
+        user_table.update().
+            where(user_table.c.id==ratee_id).
+            values(
+                ratings_sum=user_table.c.ratings_sum + (new_value or 0) - (old_value or 0),
+                ratings_count=user_table.c.ratings_count + \
+                    (new_value is not None) - (old_value is not None)
+            )
+    )
+
+def rating_inserted(mapper, connection, target):
+    update_ratings_aggregate(connection, target.ratee_id, None, rating_value(target.rating_type))
+
+def rating_updated(mapper, connection, target):
+    history = get_history(target, 'rating_type')
+    if not history.has_changes():
+        return
+    old_value = rating_value(history.deleted[0]) if history.deleted else None
+    update_ratings_aggregate(connection, target.ratee_id, old_value, rating_value(target.rating_type))
+
+def rating_deleted(mapper, connection, target):
+    update_ratings_aggregate(connection, target.ratee_id, rating_value(target.rating_type), None)
+
+# keep the ratings sum and count of the ratee in step with RateMe
+event.listen(RateMe, 'after_insert', rating_inserted)
+event.listen(RateMe, 'after_update', rating_updated)
+event.listen(RateMe, 'after_delete', rating_deleted)
+
+def set_serialize_columns(mapper, cls):
+    '''
+    A function to precompute the columns ModelViewsMix.serialize outputs
+    '''
+    names = [column.name for column in cls.__table__.columns]
+    getter = operator.attrgetter(*names)
+    cls._serialize_keys = tuple(to_camel_case(name) for name in names)
+    # attrgetter of a single name returns the value instead of a tuple
+    cls._serialize_values = staticmethod(getter if len(names) > 1 else
+                                         lambda obj: (getter(obj),))
+
+event.listen(ModelViewsMix, 'mapper_configured', set_serialize_columns, propagate=True)
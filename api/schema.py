@@ -1,6 +1,13 @@
 from marshmallow import Schema, fields, validate, pre_load, post_dump, validates_schema, ValidationError
+from marshmallow import utils
+from marshmallow.decorators import PRE_DUMP, POST_DUMP
 from datetime import datetime as dt
 
+try:
+    from .helper.notification_templates import render_notification_message
+except ImportError:
+    from moov_backend.api.helper.notification_templates import render_notification_message
+
 
 def check_unknown_fields(data, original_data, fields):
     unknown = set(original_data) - set(fields)
@@ -142,13 +149,19 @@ class TransactionSchema(Schema):
 
 class NotificationSchema(Schema):
     id = fields.Str(dump_only=True)
-    message = fields.Str(errors={'type': 'Invalid type'})
+    message = fields.Method("get_message", dump_only=True)
+    read = fields.Bool(errors={'type': 'Invalid type'})
     transaction_icon = fields.Str(errors={'type': 'Invalid type'})
     recipient_id = fields.Str(errors={'type': 'Invalid type'})
     sender_id = fields.Str(errors={'type': 'Invalid type'})
     created_at = fields.DateTime(dump_only=True)
     modified_at = fields.DateTime(dump_only=True)
 
+    def get_message(self, obj):
+        if isinstance(obj, dict):
+            return render_notification_message(obj.get("template"), obj.get("params"), obj.get("message"))
+        return render_notification_message(obj.template, obj.params, obj.message)
+
 
 class DriverInfoSchema(Schema):
     id = fields.Str(dump_only=True)
@@ -249,3 +262,97 @@ notification_schema = NotificationSchema()
 free_ride_schema = FreeRideSchema()
 driver_info_schema = DriverInfoSchema()
 school_info_schema= SchoolInfoSchema()
+
+
+def _serialize_str(value):
+    return None if value is None else utils.ensure_text_type(value)
+
+def _serialize_datetime(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        # what utils.isoformat returns for a naive (UTC) datetime
+        return value.isoformat() + "+00:00"
+    return utils.isoformat(value)
+
+def _compile_field(schema, name, field):
+    # returns (whether the value is read from the object, converter)
+    field_type = type(field)
+    if field_type is fields.Method:
+        method = getattr(schema, field.serialize_method_name)
+        return False, lambda value, obj: method(obj)
+    if field.attribute is not None or field.default is not utils.missing:
+        return True, lambda value, obj: field.serialize(name, obj)
+    if field_type is fields.String:
+        return True, lambda value, obj: _serialize_str(value)
+    if field_type in (fields.Integer, fields.Float) and not field.as_string and \
+       not getattr(field, "strict", False):
+        num_type = field.num_type
+        return True, lambda value, obj: None if value is None else num_type(value)
+    if field_type is fields.Boolean:
+        truthy, falsy = field.truthy, field.falsy
+        return True, lambda value, obj: None if value is None else \
+            True if value in truthy else False if value in falsy else bool(value)
+    if field_type is fields.DateTime and field.dateformat in (None, "iso", "iso8601") and \
+       not field.localtime:
+        return True, lambda value, obj: _serialize_datetime(value)
+    if field_type in (fields.Field, fields.Dict):
+        return True, lambda value, obj: value
+    return True, lambda value, obj: field._serialize(value, name, obj)
+
+def compile_serializer(schema, exclude=()):
+    """Compile serializer
+    Method returns a function that dumps an object or dict to the same data
+    as schema.dump, without the fields in exclude. The fields are resolved
+    once here, so a dump is a single loop with no marshmallow machinery
+    """
+    if any(schema.__processors__[(tag, pass_many)]
+           for tag in (PRE_DUMP, POST_DUMP) for pass_many in (False, True)):
+        raise ValueError("Schemas with dump processors can not be compiled")
+
+    plan = tuple(
+        (name,) + _compile_field(schema, name, field)
+        for name, field in schema.fields.items()
+        if name not in exclude and not field.load_only
+    )
+    missing = utils.missing
+
+    def serializer(obj):
+        get = obj.get if isinstance(obj, dict) else lambda key, default: getattr(obj, key, default)
+        data = {}
+        for name, read, convert in plan:
+            value = get(name, missing) if read else None
+            if value is missing:
+                continue
+            value = convert(value, obj)
+            if value is not missing:
+                data[name] = value
+        return data
+
+    return serializer
+
+
+DRIVER_PRIVATE_FIELDS = (
+    "bank_name", "account_number", "admission_type_id", "driver_id",
+    "location_latitude", "location_longitude", "destination_latitude",
+    "destination_longitude"
+)
+
+serialize_user = compile_serializer(user_schema, exclude=("password", "user_id"))
+serialize_transaction = compile_serializer(transaction_schema)
+serialize_notification = compile_serializer(notification_schema)
+serialize_driver_info = compile_serializer(driver_info_schema)
+serialize_driver_profile = compile_serializer(driver_info_schema, exclude=DRIVER_PRIVATE_FIELDS)
+# the driver and driver's user fields a rider is sent
+serialize_ride_driver = compile_serializer(driver_info_schema, exclude=DRIVER_PRIVATE_FIELDS + (
+    "on_trip_with", "created_at", "modified_at"
+))
+serialize_ride_driver_user = compile_serializer(user_schema, exclude=(
+    "id", "user_type", "user_id", "password", "authorization_code",
+    "authorization_code_status", "current_ride", "created_at", "modified_at",
+    "authentication_type"
+))
+serialize_school = compile_serializer(school_info_schema, exclude=(
+    "account_number", "bank_name", "email", "password", "admin_status",
+    "reset_password"
+))
@@ -4,12 +4,13 @@ from os.path import join, dirname
 from dotenv import load_dotenv
 
 from sqlalchemy import or_, func
+from sqlalchemy.exc import SQLAlchemyError
 from flask import g, request, jsonify
 from flask_restful import Resource
 from flask_jwt import jwt
 
 try:
-    from ...auth.token import token_required
+    from ...auth.token import token_required, get_current_user
     from ...auth.validation import (
         validate_request, validate_input_data, validate_empty_string
     )
@@ -19,11 +20,11 @@ try:
     from ...helper.driver_helper import get_nearest_or_furthest_drivers
     from ...helper.school_helper import get_school
     from ...helper.notification_helper import save_notification
-    from ...helper.error_message import moov_errors, not_found_errors
-    from ...models import User, DriverInfo, AdmissionType
-    from ...schema import driver_info_schema, user_schema
+    from ...helper.error_message import moov_errors, not_found_errors, server_errors
+    from ...models import User, DriverInfo, AdmissionType, db_transaction
+    from ...schema import serialize_driver_info, serialize_ride_driver, serialize_ride_driver_user
 except ImportError:
-    from moov_backend.api.auth.token import token_required
+    from moov_backend.api.auth.token import token_required, get_current_user
     from moov_backend.api.auth.validation import (
         validate_request, validate_input_data, validate_empty_string
     )
@@ -33,9 +34,9 @@ except ImportError:
     from moov_backend.api.helper.driver_helper import get_nearest_or_furthest_drivers
     from moov_backend.api.helper.school_helper import get_school
     from moov_backend.api.helper.notification_helper import save_notification
-    from moov_backend.api.helper.error_message import moov_errors, not_found_errors
-    from moov_backend.api.models import User, DriverInfo, AdmissionType
-    from moov_backend.api.schema import driver_info_schema, user_schema
+    from moov_backend.api.helper.error_message import moov_errors, not_found_errors, server_errors
+    from moov_backend.api.models import User, DriverInfo, AdmissionType, db_transaction
+    from moov_backend.api.schema import serialize_driver_info, serialize_ride_driver, serialize_ride_driver_user
 
 
 class DriverResource(Resource):
@@ -43,7 +44,7 @@ class DriverResource(Resource):
     @token_required
     def get(self):
         _user_id = g.current_user.id
-        _user = User.query.get(_user_id)
+        _user = get_current_user()
         if not _user:
             return moov_errors('User does not exist', 404)
 
@@ -153,46 +154,46 @@ class DriverResource(Resource):
             _driver = _empty_slot_drivers[0]
             _driver.available_car_slots = _driver.car_slots
             _driver.on_trip_with = {}
-            _driver.save()
+            # committed with the trip below
+            _driver.save(commit=False)
         else:
             # handle case no driver was found for the school at all
             return moov_errors("No driver available for this school ({0})".format(_school), 404)
 
-        _driver.add_to_trip(_driver.driver_id, str(_user.email), _slots)
-        _driver_data, _ = driver_info_schema.dump(_driver)
-        _driver_data["driver_location"] = [_driver_data["location_latitude"], _driver_data["location_longitude"]]
-        _driver_data["driver_destination"] = [_driver_data["destination_latitude"], _driver_data["destination_longitude"]]
-        # remove all irrelevant info for drivers
-        for key in ['bank_name', 'account_number', 'admission_type_id', 'driver_id', 'location_latitude', \
-        'location_longitude', 'destination_latitude', 'destination_longitude']:
-            _driver_data.pop(key, None)
-        # append other driver's information from the user's model
-        _driver_user_data, _ = user_schema.dump(_driver.driver_information)
-        for key in _driver_user_data.keys():
-            if key not in ["id", "user_type_id", "user_id", "password", "authorization_code", \
-               "authorization_code_status", "reset_password", "number_of_rides", "user_type"]:
-                _driver_data[key] = _driver_user_data[key]
-
-        # User Aspect
-        # remove all irrelevant info for drivers
-        for key in ['on_trip_with', 'created_at', 'modified_at', 'current_ride', 'authentication_type']:
-            _driver_data.pop(key, None)
-        # add to user's current ride
-        _user.add_current_ride(
-            user_email=_user.email,
-            driver_info=_driver_data,
-            user_location_name=_user_location_name,
-            user_destination_name=_user_destination_name,
-            user_location=[_user_location_latitude, _user_location_longitude],
-            user_destination=[_user_destination_latitude, _user_destination_longitude]
-        )
-        # send notification to driver
-        save_notification(
-            recipient_id=_driver_user_data['id'],
-            sender_id=_user_id,
-            message="{0} ({1}) has requested to ride with you from {2} to {3}" \
-                .format(_user.firstname.title(), _user.email, _user_location_name, _user_destination_name)
-        )
+        # the driver's slots, the user's current ride and the notification
+        # are committed together
+        try:
+            with db_transaction():
+                _driver.add_to_trip(_driver.driver_id, str(_user.email), _slots)
+                # only the driver's information a rider needs
+                _driver_data = serialize_ride_driver(_driver)
+                _driver_data["driver_location"] = [_driver.location_latitude, _driver.location_longitude]
+                _driver_data["driver_destination"] = [_driver.destination_latitude, _driver.destination_longitude]
+                # append other driver's information from the user's model
+                _driver_data.update(serialize_ride_driver_user(_driver.driver_information))
+                # add to user's current ride
+                _user.add_current_ride(
+                    user_email=_user.email,
+                    driver_info=_driver_data,
+                    user_location_name=_user_location_name,
+                    user_destination_name=_user_destination_name,
+                    user_location=[_user_location_latitude, _user_location_longitude],
+                    user_destination=[_user_destination_latitude, _user_destination_longitude]
+                )
+                # send notification to driver
+                save_notification(
+                    recipient_id=_driver.driver_id,
+                    sender_id=_user_id,
+                    template="ride_requested",
+                    params={
+                        "name": _user.firstname.title(),
+                        "email": _user.email,
+                        "location": _user_location_name,
+                        "destination": _user_destination_name
+                    }
+                )
+        except SQLAlchemyError as error:
+            return server_errors("Ride request was not saved", error)
             
         return {
             'status': 'success',
@@ -249,7 +250,7 @@ class DriverResource(Resource):
                 _driver.__setitem__(key, json_input[key])
         
         _driver.save()
-        _data, _ = driver_info_schema.dump(_driver)
+        _data = serialize_driver_info(_driver)
         return {
             'status': 'success',
             'data': {
@@ -282,8 +283,8 @@ class DriverConfirmRideResouce(Resource):
         if _confirmation_type not in ['accept', 'reject']:
             return moov_errors('Confirmation type can only be accept or reject', 400)
 
-        _user_email = str(json_input['user_email']).strip().lower()
-        _user = User.query.filter(User.email==_user_email).first()
+        _user_email = str(json_input['user_email'])
+        _user = User.get_by_email(_user_email)
         if not _user:
             return moov_errors('User email is not valid', 400)
 
@@ -297,16 +298,19 @@ class DriverConfirmRideResouce(Resource):
             return moov_errors('{0} did not request a ride with current driver'.format(_user_email), 400)
 
         if _confirmation_type=="reject":
-            _driver.remove_from_trip(_driver_id, str(_user.email))
-            _user.remove_current_ride(str(_user.email))
-            # send notification to user
-            save_notification(
-                recipient_id=_user.id,
-                sender_id=_driver_id,
-                message="{0} has rejected your request for a ride".format(
-                    _driver.driver_information.firstname.title()
-                )
-            )
+            try:
+                with db_transaction():
+                    _driver.remove_from_trip(_driver_id, str(_user.email))
+                    _user.remove_current_ride(str(_user.email))
+                    # send notification to user
+                    save_notification(
+                        recipient_id=_user.id,
+                        sender_id=_driver_id,
+                        template="ride_rejected",
+                        params={"name": _driver.driver_information.firstname.title()}
+                    )
+            except SQLAlchemyError as error:
+                return server_errors("Ride was not rejected", error)
             return {
                 'status': 'success',
                 'data': {
@@ -318,9 +322,8 @@ class DriverConfirmRideResouce(Resource):
         save_notification(
             recipient_id=_user.id,
             sender_id=_driver_id,
-            message="{0} has accepted your request for a ride".format(
-                _driver.driver_information.firstname.title()
-            )
+            template="ride_accepted",
+            params={"name": _driver.driver_information.firstname.title()}
         )
         return {
             'status': 'success',
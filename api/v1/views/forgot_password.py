@@ -5,6 +5,7 @@ from flask_restful import Resource
 
 try:
     from ...auth.token import token_required
+    from ...auth.rate_limit import rate_limit
     from ...auth.validation import validate_input_data
     from ...generator.password_generator import generate_password
     from ...helper.error_message import moov_errors, not_found_errors
@@ -14,6 +15,7 @@ try:
     from ...emails.email_forgot_password import send_forgot_password_mail
 except ImportError:
     from moov_backend.api.auth.token import token_required
+    from moov_backend.api.auth.rate_limit import rate_limit
     from moov_backend.api.auth.validation import validate_input_data
     from moov_backend.api.generator.password_generator import generate_password
     from moov_backend.api.helper.error_message import moov_errors, not_found_errors
@@ -25,6 +27,7 @@ except ImportError:
 
 class ForgotPasswordResource(Resource):
     
+    @rate_limit("forgot_password")
     def post(self):
         json_input = request.get_json()
 
@@ -32,7 +35,7 @@ class ForgotPasswordResource(Resource):
         if validate_input_data(json_input, keys):
             return validate_input_data(json_input, keys)
         
-        _user = User.query.filter(User.email==json_input['email']).first()
+        _user = User.get_by_email(json_input['email'])
         if not _user:
             return moov_errors('User does not exist', 404)
 
@@ -51,7 +54,7 @@ class ForgotPasswordResource(Resource):
         _user.save()
 
         moov_email = os.environ.get("MOOV_EMAIL")
-        moov_user = User.query.filter(User.email==moov_email).first()
+        moov_user = User.get_by_email(moov_email)
         if not moov_user:
             return not_found_errors(moov_email)
 
@@ -60,11 +63,10 @@ class ForgotPasswordResource(Resource):
         if transaction_icon:
             _transaction_icon_id = transaction_icon.id
 
-        message = "You reset your password"
         save_notification(
             recipient_id=_user.id, 
             sender_id=moov_user.id, 
-            message=message, 
+            template="password_reset",
             transaction_icon_id=_transaction_icon_id
         )
 
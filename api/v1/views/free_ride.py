@@ -2,25 +2,34 @@ import os
 
 from flask import request, jsonify, json, Response
 from flask_restful import Resource
-from flask import g, request, jsonify
+from sqlalchemy.exc import SQLAlchemyError
+from flask import g, request, jsonify, current_app
 
 try:
-    from ...auth.token import token_required
+    from ...auth.token import token_required, get_current_user
     from ...auth.validation import validate_request, validate_input_data
     from ...generator.free_ride_token_generator import generate_free_ride_token
-    from ...helper.error_message import moov_errors, not_found_errors
+    from ...helper.error_message import moov_errors, not_found_errors, server_errors
     from ...helper.notification_helper import save_notification
-    from ...helper.free_ride_helper import save_free_ride_token, has_free_ride
-    from ...models import User, FreeRide, Icon, FreeRideType
+    from ...helper.free_ride_helper import (
+        save_free_ride_token, has_free_ride, get_campaign_recipients,
+        issue_campaign_free_rides
+    )
+    from ...helper.school_helper import get_school
+    from ...models import User, FreeRide, Icon, FreeRideType, db_transaction
     from ...schema import free_ride_schema
 except ImportError:
-    from moov_backend.api.auth.token import token_required
+    from moov_backend.api.auth.token import token_required, get_current_user
     from moov_backend.api.auth.validation import validate_request, validate_input_data
     from moov_backend.api.generator.free_ride_token_generator import generate_free_ride_token
-    from moov_backend.api.helper.error_message import moov_errors, not_found_errors
+    from moov_backend.api.helper.error_message import moov_errors, not_found_errors, server_errors
     from moov_backend.api.helper.notification_helper import save_notification
-    from moov_backend.api.helper.free_ride_helper import save_free_ride_token, has_free_ride
-    from moov_backend.api.models import User, FreeRide, Icon, FreeRideType
+    from moov_backend.api.helper.free_ride_helper import (
+        save_free_ride_token, has_free_ride, get_campaign_recipients,
+        issue_campaign_free_rides
+    )
+    from moov_backend.api.helper.school_helper import get_school
+    from moov_backend.api.models import User, FreeRide, Icon, FreeRideType, db_transaction
     from moov_backend.api.schema import free_ride_schema
 
 
@@ -37,7 +46,7 @@ class FreeRideResource(Resource):
             return validate_input_data(json_input, keys)
 
         _user_id = g.current_user.id
-        _user = User.query.get(_user_id)
+        _user = get_current_user()
         if not _user:
             return moov_errors('User does not exist', 404)
 
@@ -48,7 +57,7 @@ class FreeRideResource(Resource):
         if str(_free_ride_type) == "social_share_type":
             if not has_free_ride(user_id=_user_id, free_ride_type=FreeRideType.social_share_type):
                 moov_email = os.environ.get("MOOV_EMAIL")
-                moov_user = User.query.filter(User.email==moov_email).first()
+                moov_user = User.get_by_email(moov_email)
                 if not moov_user:
                     return not_found_errors(moov_email)
 
@@ -57,27 +66,29 @@ class FreeRideResource(Resource):
                 if transaction_icon:
                     _transaction_icon_id = transaction_icon.id
 
-                token = generate_free_ride_token(user_email=_user.email)
+                token = generate_free_ride_token()
                 description = "{0} generated to {1} for publisicing moov app".format(
                                     token,
                                     _user.email
                                 )
-                message = "Congrats, you got a free ride token {0} for sharing our app".format(
-                                token
-                            )
-
-                save_notification(
-                    recipient_id=_user_id,
-                    sender_id=moov_user.id,
-                    message=message,
-                    transaction_icon_id=_transaction_icon_id
-                )
-                _data, _ = save_free_ride_token(
-                                free_ride_type=FreeRideType.social_share_type,
-                                token=token,
-                                description=description,
-                                user_id=_user_id
-                            )
+
+                try:
+                    with db_transaction():
+                        save_notification(
+                            recipient_id=_user_id,
+                            sender_id=moov_user.id,
+                            template="free_ride_shared",
+                            params={"token": token},
+                            transaction_icon_id=_transaction_icon_id
+                        )
+                        _data, _ = save_free_ride_token(
+                                        free_ride_type=FreeRideType.social_share_type,
+                                        token=token,
+                                        description=description,
+                                        user_id=_user_id
+                                    )
+                except SQLAlchemyError as error:
+                    return server_errors("Free ride was not saved", error)
                 return {
                     'status': 'success',
                         'data': {
@@ -89,3 +100,87 @@ class FreeRideResource(Resource):
         # cases that don't meet any of the free ride conditions
         # cases that the user has collected a free ride for a particular free_ride_type
         return moov_errors("Free ride collection denied", 400)
+
+
+class FreeRideCampaignResource(Resource):
+    
+    @token_required
+    @validate_request()
+    def post(self):
+        json_input = request.get_json()
+
+        keys = ['campaign', 'school', 'emails', 'description']
+
+        if validate_input_data(json_input, keys):
+            return validate_input_data(json_input, keys)
+
+        _user_id = g.current_user.id
+        _user = get_current_user()
+        if not _user:
+            return moov_errors('User does not exist', 404)
+
+        if str(_user.user_type.title) not in ["admin", "super_admin"]:
+            return moov_errors('Unauthorized access', 401)
+
+        if not json_input.get("campaign"):
+            return moov_errors('Campaign name is required, a user gets one token per campaign', 400)
+        _campaign = str(json_input["campaign"])
+
+        if ("school" in json_input) == ("emails" in json_input):
+            return moov_errors('Provide either a school or a list of user emails', 400)
+
+        moov_email = os.environ.get("MOOV_EMAIL")
+        moov_user = User.get_by_email(moov_email)
+        if not moov_user:
+            return not_found_errors(moov_email)
+
+        _transaction_icon_id = None
+        transaction_icon = Icon.query.filter(Icon.operation_type=="free_ride_operation").first()
+        if transaction_icon:
+            _transaction_icon_id = transaction_icon.id
+
+        if "school" in json_input:
+            school = get_school(str(json_input["school"]).lower())
+            if not school:
+                return moov_errors('{0} (school) does not exist'.format(str(json_input["school"])), 404)
+            user_ids = get_campaign_recipients(school_id=school.id)
+        else:
+            if not isinstance(json_input["emails"], list):
+                return moov_errors('Emails should be a list of user emails', 400)
+            user_ids = get_campaign_recipients(emails=json_input["emails"])
+
+        if not user_ids:
+            return moov_errors('No user found for this free ride campaign', 404)
+
+        description = json_input.get("description") or \
+                        "Free ride campaign {0} by {1}".format(_campaign, _user.email)
+
+        # the chunks committed before a failure are kept and reported
+        _issued = {"count": 0}
+        def progress(issued, done):
+            _issued["count"] = issued
+
+        try:
+            issued = issue_campaign_free_rides(
+                        user_ids=user_ids,
+                        campaign=_campaign,
+                        description=description,
+                        sender_id=moov_user.id,
+                        transaction_icon_id=_transaction_icon_id,
+                        chunk_size=current_app.config['CAMPAIGN_CHUNK_SIZE'],
+                        progress=progress
+                    )
+        except SQLAlchemyError as error:
+            response, status_code = server_errors(
+                "Free ride campaign stopped after issuing {0} token(s), run it again to "
+                "issue the rest".format(_issued["count"]), error)
+            response["data"]["issued_count"] = _issued["count"]
+            return response, status_code
+
+        return {
+            'status': 'success',
+            'data': {
+                'message': 'Free ride tokens issued succesfully',
+                'issued_count': issued
+            }
+        }, 201
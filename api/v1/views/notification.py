@@ -1,68 +1,219 @@
+import os
+from math import ceil
+
 from flask import g, request, jsonify, json, current_app, url_for, Response
 from flask_restful import Resource
+from sqlalchemy.exc import SQLAlchemyError
 
 try:
-    from ...auth.token import token_required
-    from ...helper.error_message import moov_errors
-    from ...models import User, Notification, Icon
-    from ...schema import notification_schema
+    from ...auth.token import token_required, get_current_user
+    from ...auth.validation import validate_request, validate_input_data
+    from ...helper.error_message import moov_errors, not_found_errors, server_errors
+    from ...helper.notification_helper import (
+        get_notifications_page, mark_notifications_read,
+        encode_notification_cursor, decode_notification_cursor,
+        count_archived_notifications, broadcast_notification
+    )
+    from ...helper.school_helper import get_school
+    from ...models import User, UserType, Notification, NotificationArchive, Icon
+    from ...schema import serialize_notification
 except ImportError:
-    from moov_backend.api.auth.token import token_required
-    from moov_backend.api.helper.error_message import moov_errors
-    from moov_backend.api.models import User, Notification, Icon
-    from moov_backend.api.schema import notification_schema
+    from moov_backend.api.auth.token import token_required, get_current_user
+    from moov_backend.api.auth.validation import validate_request, validate_input_data
+    from moov_backend.api.helper.error_message import moov_errors, not_found_errors, server_errors
+    from moov_backend.api.helper.notification_helper import (
+        get_notifications_page, mark_notifications_read,
+        encode_notification_cursor, decode_notification_cursor,
+        count_archived_notifications, broadcast_notification
+    )
+    from moov_backend.api.helper.school_helper import get_school
+    from moov_backend.api.models import User, UserType, Notification, NotificationArchive, Icon
+    from moov_backend.api.schema import serialize_notification
 
 
-class NotificationResource(Resource):
-    
-    @token_required
-    def get(self):
-        _user_id = g.current_user.id
-        _user = User.query.get(_user_id)
-        if not _user:
-            return moov_errors('User does not exist', 404)
+def get_notifications_response(model, message):
+    _user_id = g.current_user.id
+    _user = get_current_user()
+    if not _user:
+        return moov_errors('User does not exist', 404)
 
-        _page = request.args.get('page')
-        _limit = request.args.get('limit')
+    if model is NotificationArchive:
+        all_count, unread_count = count_archived_notifications(_user_id)
+    else:
+        all_count, unread_count = _user.notification_count, _user.unread_notification_count
+
+    _cursor = request.args.get('cursor')
+    _page = request.args.get('page')
+    _limit = request.args.get('limit')
+    try:
         page = int(_page or current_app.config['DEFAULT_PAGE'])
         limit = int(_limit or current_app.config['PAGE_LIMIT'])
+    except ValueError:
+        return moov_errors('Page and limit must be numbers', 400)
+    if page < 1 or limit < 1:
+        return moov_errors('Page and limit must be greater than zero', 400)
+
+    cursor = None
+    if _cursor:
+        cursor = decode_notification_cursor(_cursor)
+        if not cursor:
+            return moov_errors('Invalid cursor', 400)
 
-        _notifications = Notification.query.filter(Notification.recipient_id==_user_id).order_by(
-                            Notification.created_at.desc()
-                        )
-        notification_count = len(_notifications.all())
-        _notifications = _notifications.paginate(
-            page=page, per_page=limit, error_out=False)
+    # the next_url carries a cursor along with the page number, pages asked
+    # for by number alone (older clients) are still served with an offset
+    _notifications, has_next = get_notifications_page(
+                                    _user_id, limit, cursor, model=model,
+                                    offset=(page - 1) * limit
+                                )
 
-        notifications = []
-        for _notification in _notifications.items:
-            _data, _ = notification_schema.dump(_notification)
-            notifications.append(_data)
+    notifications = []
+    for _notification in _notifications:
+        notifications.append(serialize_notification(_notification))
 
-        previous_url = None
-        next_url = None
+    next_cursor = None
+    next_url = None
+    previous_url = None
 
-        if _notifications.has_next:
-            next_url = url_for(request.endpoint,
+    if has_next:
+        next_cursor = encode_notification_cursor(_notifications[-1])
+        next_url = url_for(request.endpoint,
+                           limit=limit,
+                           page=page+1,
+                           cursor=next_cursor,
+                           _external=True)
+    if page > 1:
+        previous_url = url_for(request.endpoint,
                                limit=limit,
-                               page=page+1,
+                               page=page-1,
                                _external=True)
-        if _notifications.has_prev:
-            previous_url = url_for(request.endpoint,
-                                   limit=limit,
-                                   page=page-1,
-                                   _external=True)
 
+    return {
+        'status': 'success',
+        'data': {
+                    'message': message,
+                    'all_count': all_count,
+                    'unread_count': unread_count,
+                    'current_count': len(notifications),
+                    'notifications': notifications,
+                    'next_cursor': next_cursor,
+                    'next_url': next_url,
+                    'previous_url': previous_url,
+                    'current_page': page,
+                    'all_pages': int(ceil(all_count / float(limit)))
+                }
+    }, 200
+
+
+class NotificationResource(Resource):
+
+    @token_required
+    def get(self):
+        return get_notifications_response(Notification, 'Notifications successfully retrieved')
+
+    @token_required
+    @validate_request()
+    def put(self):
+        json_input = request.get_json()
+
+        keys = ['notification_ids', 'mark_all']
+
+        if validate_input_data(json_input, keys):
+            return validate_input_data(json_input, keys)
+
+        _user_id = g.current_user.id
+        _user = get_current_user()
+        if not _user:
+            return moov_errors('User does not exist', 404)
+
+        notification_ids = None
+        if not json_input.get("mark_all"):
+            notification_ids = json_input.get("notification_ids")
+            if not isinstance(notification_ids, list) or not notification_ids:
+                return moov_errors('Notification ids or mark_all is required', 400)
+
+        try:
+            marked = mark_notifications_read(_user_id, notification_ids)
+        except SQLAlchemyError:
+            return moov_errors('Notifications could not be updated', 400)
+
+        _user = get_current_user()
         return {
             'status': 'success',
-            'data': { 
-                        'message': 'Notifications successfully retrieved',
-                        'all_count': notification_count,
-                        'current_count': len(notifications),
-                        'notifications': notifications,
-                        'next_url': next_url,
-                        'previous_url': previous_url,
-                        'current_page': _notifications.page,
-                        'all_pages': _notifications.pages
+            'data': {
+                        'message': 'Notifications successfully marked as read',
+                        'marked_count': marked,
+                        'unread_count': _user.unread_notification_count
                     }
         }, 200
+
+
+class NotificationHistoryResource(Resource):
+
+    @token_required
+    def get(self):
+        return get_notifications_response(NotificationArchive, 'Notification history successfully retrieved')
+
+
+class NotificationBroadcastResource(Resource):
+
+    @token_required
+    @validate_request()
+    def post(self):
+        json_input = request.get_json()
+
+        keys = ['message', 'school', 'user_type']
+
+        if validate_input_data(json_input, keys):
+            return validate_input_data(json_input, keys)
+
+        _user_id = g.current_user.id
+        _user = get_current_user()
+        if not _user:
+            return moov_errors('User does not exist', 404)
+
+        if str(_user.user_type.title) not in ["admin", "super_admin"]:
+            return moov_errors('Unauthorized access', 401)
+
+        message = json_input.get("message")
+        if not message or not str(message).strip():
+            return moov_errors('Message is required', 400)
+        if not json_input.get("school") and not json_input.get("user_type"):
+            return moov_errors('Provide a school and/or a user type to broadcast to', 400)
+
+        _school_id = None
+        if json_input.get("school"):
+            school = get_school(str(json_input["school"]).lower())
+            if not school:
+                return moov_errors('{0} (school) does not exist'.format(str(json_input["school"])), 404)
+            _school_id = school.id
+
+        _user_type_id = None
+        if json_input.get("user_type"):
+            user_type = UserType.query.filter(UserType.title==str(json_input["user_type"]).lower()).first()
+            if not user_type:
+                return moov_errors('{0} (user type) does not exist'.format(str(json_input["user_type"])), 404)
+            _user_type_id = user_type.id
+
+        moov_email = os.environ.get("MOOV_EMAIL")
+        moov_user = User.get_by_email(moov_email)
+        if not moov_user:
+            return not_found_errors(moov_email)
+
+        try:
+            sent = broadcast_notification(
+                        sender_id=moov_user.id,
+                        template="announcement",
+                        params={"message": message},
+                        school_id=_school_id,
+                        user_type_id=_user_type_id
+                    )
+        except SQLAlchemyError as error:
+            return server_errors("Notification broadcast failed", error)
+
+        return {
+            'status': 'success',
+            'data': {
+                'message': 'Notification successfully broadcast',
+                'sent_count': sent
+            }
+        }, 201
@@ -1,56 +1,65 @@
 import os
 
-from flask import g, request, jsonify
+from flask import g, request
 from flask_restful import Resource
 from sqlalchemy import desc
 
 try:
-    from ...auth.token import token_required
+    from ...auth.token import token_required, get_current_user
     from ...helper.error_message import moov_errors
-    from ...models import User, Notification
-    from ...schema import user_schema, notification_schema
+    from ...helper.icon_helper import get_icon_url
+    from ...models import db, User, Notification
+    from ...schema import serialize_user, serialize_notification
 except ImportError:
-    from moov_backend.api.auth.token import token_required
+    from moov_backend.api.auth.token import token_required, get_current_user
     from moov_backend.api.helper.error_message import moov_errors
-    from moov_backend.api.models import User, Notification
-    from moov_backend.api.schema import user_schema, notification_schema
+    from moov_backend.api.helper.icon_helper import get_icon_url
+    from moov_backend.api.models import db, User, Notification
+    from moov_backend.api.schema import serialize_user, serialize_notification
 
 
 class BasicInfoResource(Resource):
     
     @token_required
     def get(self):
-        _user_id = g.current_user.id
-
-        _user = User.query.get(_user_id)
+        _user = get_current_user()
         if not _user:
             return moov_errors('User does not exist', 404)
 
-        _notifications = Notification.query.filter(Notification.recipient_id==_user.id).order_by(desc(Notification.created_at)).limit(20).all()
+        # only the serialized columns, icon urls come from the icon cache
+        _notifications = db.session.query(
+                            Notification.id,
+                            Notification.message,
+                            Notification.template,
+                            Notification.params,
+                            Notification.read,
+                            Notification.recipient_id,
+                            Notification.sender_id,
+                            Notification.created_at,
+                            Notification.modified_at,
+                            Notification.transaction_icon_id
+                        ).filter(Notification.recipient_id==_user.id).\
+                        order_by(desc(Notification.created_at)).limit(20).all()
         _notifications_data = []
-        if _notifications:
-            for _notification in _notifications:
-                _notification_to_append, _ = notification_schema.dump(_notification)
-                _notification_to_append["icon"] = ""
-                if _notification.transaction_icon_id:
-                    _notification_to_append["icon"] = str(_notification.notification_icon.icon)
-                _notifications_data.append(_notification_to_append)
+        for _notification in _notifications:
+            _notification_to_append = serialize_notification(_notification)
+            _notification_to_append["icon"] = str(get_icon_url(_notification.transaction_icon_id))
+            _notifications_data.append(_notification_to_append)
 
         _user_type = (_user.user_type.title).lower()
         if _user_type == "admin":
             return moov_errors('Unauthorized access', 401)
 
-        _user_data, _ = user_schema.dump(_user)
+        _user_data = serialize_user(_user)
         _user_data['wallet_amount'] = _user.wallet_user[0].wallet_amount
         _user_data["school"] = str(_user.school_information.name)
         _user_data["user_type"] = _user_type
-        _user_data.pop('password', None)
-        _user_data.pop('user_id', None)
-
-        return jsonify({"status": "success",
-                        "data": {
-                            "message": "Basic information successfully retrieved",
-                            "user": _user_data,
-                            "notifications": _notifications_data
-                        }
-                    })
+
+        return {
+            "status": "success",
+            "data": {
+                "message": "Basic information successfully retrieved",
+                "user": _user_data,
+                "notifications": _notifications_data
+            }
+        }, 200
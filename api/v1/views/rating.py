@@ -0,0 +1,74 @@
+from flask import request
+from flask_restful import Resource
+from sqlalchemy.exc import SQLAlchemyError
+
+try:
+    from ...auth.token import token_required, get_current_user
+    from ...auth.validation import validate_request, validate_input_data
+    from ...helper.error_message import moov_errors, server_errors
+    from ...models import db, User, RateMe, RatingsType
+except ImportError:
+    from moov_backend.api.auth.token import token_required, get_current_user
+    from moov_backend.api.auth.validation import validate_request, validate_input_data
+    from moov_backend.api.helper.error_message import moov_errors, server_errors
+    from moov_backend.api.models import db, User, RateMe, RatingsType
+
+
+class RatingResource(Resource):
+
+    @token_required
+    @validate_request()
+    def post(self):
+        json_input = request.get_json()
+
+        keys = ['user_email', 'rating']
+        if validate_input_data(json_input, keys):
+            return validate_input_data(json_input, keys)
+
+        if 'user_email' not in json_input or 'rating' not in json_input:
+            return moov_errors('User email and rating are required', 400)
+
+        _rating = json_input['rating']
+        if isinstance(_rating, bool) or not isinstance(_rating, int) or not 1 <= _rating <= 5:
+            return moov_errors('Rating must be a whole number from 1 to 5', 400)
+
+        _rater = get_current_user()
+        if not _rater:
+            return moov_errors('User does not exist', 404)
+
+        _ratee = User.get_by_email(str(json_input['user_email']))
+        if not _ratee:
+            return moov_errors('User email is not valid', 400)
+        if _ratee.id == _rater.id:
+            return moov_errors('You cannot rate yourself', 400)
+
+        try:
+            # the ratee row is locked so a rater's ratings are serialized,
+            # their sum and count are updated by the RateMe listeners
+            db.session.query(User.id).filter(User.id==_ratee.id).with_for_update().first()
+            rate_me = RateMe.query.filter(
+                            RateMe.ratee_id==_ratee.id,
+                            RateMe.rater_id==_rater.id
+                        ).order_by(RateMe.created_at.desc()).first()
+            if rate_me:
+                rate_me.rating_type = RatingsType(_rating)
+            else:
+                rate_me = RateMe(
+                    ratee_id=_ratee.id,
+                    rater_id=_rater.id,
+                    rating_type=RatingsType(_rating)
+                )
+                db.session.add(rate_me)
+            db.session.commit()
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            return server_errors("Rating was not saved", error)
+
+        return {
+            'status': 'success',
+            'data': {
+                'message': 'Rating successfully submitted',
+                'ratings': _ratee.ratings,
+                'ratings_count': _ratee.ratings_count
+            }
+        }, 201
@@ -5,12 +5,12 @@ try:
     from ...auth.token import token_required
     from ...helper.error_message import moov_errors
     from ...models import SchoolInfo, User
-    from ...schema import school_info_schema
+    from ...schema import serialize_school
 except ImportError:
     from moov_backend.api.auth.token import token_required
     from moov_backend.api.helper.error_message import moov_errors
     from moov_backend.api.models import SchoolInfo, User
-    from moov_backend.api.schema import school_info_schema
+    from moov_backend.api.schema import serialize_school
 
 
 class SchoolResource(Resource):
@@ -21,10 +21,8 @@ class SchoolResource(Resource):
 
         schools = []
         for _school in _schools:
-            _data, _ = school_info_schema.dump(_school)
+            _data = serialize_school(_school)
             _data['name'] = _data['name'].upper()
-            for item in ['account_number', 'bank_name', 'email', 'password', 'admin_status', 'reset_password']:
-                _data.pop(item, None)
             schools.append(_data)
 
         return {
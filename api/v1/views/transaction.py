@@ -4,46 +4,52 @@ from datetime import datetime
 from flask import g, request, current_app, url_for, jsonify
 from flask_restful import Resource
 from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
 
 try:
-    from ...auth.token import token_required
+    from ...auth.token import token_required, get_current_user
     from ...auth.validation import validate_request, validate_input_data
-    from ...generator.free_ride_token_generator import generate_free_ride_token
-    from ...helper.error_message import moov_errors, not_found_errors
-    from ...helper.user_helper import get_user
+    from ...helper.error_message import moov_errors, not_found_errors, server_errors
+    from ...helper.icon_helper import get_icon_id
+    from ...helper.user_helper import get_users_with_wallets
     from ...helper.school_helper import get_school
-    from ...helper.wallet_helper import get_wallet
-    from ...helper.percentage_price_helper import get_percentage_price
-    from ...helper.notification_helper import save_notification
-    from ...helper.free_ride_helper import get_free_ride_token, save_free_ride_token
+    from ...helper.percentage_price_helper import get_percentage_price, get_percentage_prices
+    from ...helper.notification_helper import save_notification, save_notifications
+    from ...helper.free_ride_helper import (
+        get_free_ride_token, save_free_ride_token, record_ride,
+        redeem_free_ride_token
+    )
     from ...helper.transactions_helper import (
         paystack_deduction_amount, check_transaction_validity, load_wallet_operation,
         ride_fare_operation, transfer_operation, save_transaction, verify_paystack_payment
     )
     from ...models import (
-        User, Transaction, Wallet, Icon, FreeRide, OperationType, TransactionType,
-        FreeRideType
+        User, Transaction, FreeRide, OperationType, TransactionType,
+        FreeRideType, db_transaction, normalize_email
     )
-    from ...schema import transaction_schema
+    from ...schema import transaction_schema, serialize_transaction
 except ImportError:
-    from moov_backend.api.auth.token import token_required
+    from moov_backend.api.auth.token import token_required, get_current_user
     from moov_backend.api.auth.validation import validate_request, validate_input_data
-    from moov_backend.api.helper.error_message import moov_errors, not_found_errors
-    from moov_backend.api.helper.user_helper import get_user
+    from moov_backend.api.helper.error_message import moov_errors, not_found_errors, server_errors
+    from moov_backend.api.helper.icon_helper import get_icon_id
+    from moov_backend.api.helper.user_helper import get_users_with_wallets
     from moov_backend.api.helper.school_helper import get_school
-    from moov_backend.api.helper.wallet_helper import get_wallet
-    from moov_backend.api.helper.percentage_price_helper import get_percentage_price
-    from moov_backend.api.helper.notification_helper import save_notification
-    from moov_backend.api.helper.free_ride_helper import get_free_ride_token, save_free_ride_token
+    from moov_backend.api.helper.percentage_price_helper import get_percentage_price, get_percentage_prices
+    from moov_backend.api.helper.notification_helper import save_notification, save_notifications
+    from moov_backend.api.helper.free_ride_helper import (
+        get_free_ride_token, save_free_ride_token, record_ride,
+        redeem_free_ride_token
+    )
     from moov_backend.api.helper.transactions_helper import (
         paystack_deduction_amount, check_transaction_validity, load_wallet_operation,
         ride_fare_operation, transfer_operation, save_transaction, verify_paystack_payment
     )
     from moov_backend.api.models import (
-        User, Transaction, Wallet, Icon, FreeRide, OperationType, TransactionType,
-        FreeRideType
+        User, Transaction, FreeRide, OperationType, TransactionType,
+        FreeRideType, db_transaction, normalize_email
     )
-    from moov_backend.api.schema import transaction_schema
+    from moov_backend.api.schema import transaction_schema, serialize_transaction
 
 
 class TransactionResource(Resource):
@@ -51,7 +57,7 @@ class TransactionResource(Resource):
     @token_required
     def get(self):
         _user_id = g.current_user.id
-        _user = User.query.get(_user_id)
+        _user = get_current_user()
         if not _user:
             return moov_errors('User does not exist', 404)
 
@@ -72,8 +78,7 @@ class TransactionResource(Resource):
 
         transactions = []
         for _transaction in _transactions.items:
-            _data, _ = transaction_schema.dump(_transaction)
-            transactions.append(_data)
+            transactions.append(serialize_transaction(_transaction))
 
         previous_url = None
         next_url = None
@@ -129,7 +134,7 @@ class TransactionResource(Resource):
         # establishing the _current_user is valid and not an admin
         _current_user_id = g.current_user.id
 
-        _current_user = User.query.get(_current_user_id)
+        _current_user = get_current_user()
         if not _current_user:
             return moov_errors('User does not exist', 404)
 
@@ -139,8 +144,10 @@ class TransactionResource(Resource):
 
         _transaction_icon = "https://cdn.pixabay.com/photo/2015/10/05/22/37/blank-profile-picture-973461_1280.png"
 
+        # moov and the receiver are loaded with their wallets in one query
         moov_email = os.environ.get("MOOV_EMAIL")
-        moov_user = User.query.filter(User.email==moov_email).first()
+        _users = get_users_with_wallets(moov_email, json_input.get('receiver_email'))
+        moov_user = _users.get(normalize_email(moov_email))
         if not moov_user:
             return not_found_errors(moov_email)
 
@@ -160,7 +167,11 @@ class TransactionResource(Resource):
             if check_transaction_validity(cost_of_transaction, message):
                 return check_transaction_validity(cost_of_transaction, message)
             
-            _data, _ = load_wallet_operation(cost_of_transaction, _current_user, _current_user_id, moov_user)
+            try:
+                with db_transaction():
+                    _data, _ = load_wallet_operation(cost_of_transaction, _current_user, _current_user_id, moov_user)
+            except SQLAlchemyError as error:
+                return server_errors("Wallet was not loaded", error)
             _data["free_ride_token"] = ""
             return {
                     'status': 'success',
@@ -176,7 +187,7 @@ class TransactionResource(Resource):
             _receiver_email = json_input['receiver_email']
             _sender_id = _current_user_id
             _sender = _current_user
-            _receiver = User.query.filter(User.email==_receiver_email).first()
+            _receiver = _users.get(normalize_email(_receiver_email))
 
             if not _receiver:
                 return moov_errors("User does not exist", 404)
@@ -184,8 +195,8 @@ class TransactionResource(Resource):
                 return moov_errors("Unauthorized access", 401) 
             
 
-            _receiver_wallet = Wallet.query.filter(Wallet.user_id==_receiver.id).first()
-            _sender_wallet = Wallet.query.filter(Wallet.user_id==_sender_id).first()
+            _receiver_wallet = _receiver.wallet_user[0]
+            _sender_wallet = _sender.wallet_user[0]
 
             message = "Cost of transaction cannot be a negative value"
             if check_transaction_validity(cost_of_transaction, message):
@@ -211,23 +222,27 @@ class TransactionResource(Resource):
                 if check_transaction_validity(sender_amount_after_transaction, message):
                   return check_transaction_validity(sender_amount_after_transaction, message)
 
-                moov_wallet = get_wallet(email=moov_email)
-                if not moov_wallet:
+                if not moov_user.wallet_user:
                     return not_found_errors(moov_email)
-
-                _data, _ = transfer_operation(
-                                _sender, 
-                                _receiver, 
-                                _sender_wallet, 
-                                _receiver_wallet, 
-                                moov_wallet, 
-                                cost_of_transaction, 
-                                transfer_charge, 
-                                sender_amount_before_transaction, 
-                                receiver_amount_before_transaction, 
-                                sender_amount_after_transaction, 
-                                moov_user
-                            )
+                moov_wallet = moov_user.wallet_user[0]
+
+                try:
+                    with db_transaction():
+                        _data, _ = transfer_operation(
+                                        _sender, 
+                                        _receiver, 
+                                        _sender_wallet, 
+                                        _receiver_wallet, 
+                                        moov_wallet, 
+                                        cost_of_transaction, 
+                                        transfer_charge, 
+                                        sender_amount_before_transaction, 
+                                        receiver_amount_before_transaction, 
+                                        sender_amount_after_transaction, 
+                                        moov_user
+                                    )
+                except SQLAlchemyError as error:
+                    return server_errors("Transfer was not saved", error)
                 _data["free_ride_token"] = ""
                 return {
                         'status': 'success',
@@ -240,60 +255,65 @@ class TransactionResource(Resource):
             # case ride_fare
             if str(json_input['type_of_operation']).lower() == 'ride_fare':
                 _data = {}
-                free_ride_icon = Icon.query.filter(Icon.operation_type=="free_ride_operation").first()
-                if free_ride_icon:
-                    free_ride_icon_id = free_ride_icon.id
+                free_ride_icon_id = get_icon_id("free_ride_operation")
 
                 if ("free_token" in json_input) and (json_input["free_token"] is not None):
-                    token_valid = FreeRide.query.filter(
-                                    FreeRide.token==json_input["free_token"]
-                                ).first()
-
-                    # error handlers
-                    if not token_valid:
-                        return moov_errors("{0} is not a valid token".format(json_input["free_token"]), 404)
-                    if not token_valid.token_status:
+                    _transaction_icon_id = get_icon_id("ride_operation")
+
+                    # the token is redeemed, the ride transaction and its notifications
+                    # saved in a single unit of work so a token can only be used once
+                    try:
+                        with db_transaction():
+                            # set the token to false i.e. make it inactive
+                            redeemed = redeem_free_ride_token(json_input["free_token"], _sender.id)
+                            if redeemed:
+                                record_ride(_sender.id)
+
+                                # save notification
+                                save_notifications([
+                                    {
+                                        "recipient_id": _sender.id,
+                                        "sender_id": moov_user.id,
+                                        "template": "free_token_used",
+                                        "params": {"token": json_input["free_token"]},
+                                        "transaction_icon_id": _transaction_icon_id
+                                    },
+                                    {
+                                        "recipient_id": _receiver.id,
+                                        "sender_id": moov_user.id,
+                                        "template": "free_ride_given",
+                                        "params": {"name": str(_sender.firstname).title()},
+                                        "transaction_icon_id": _transaction_icon_id
+                                    }
+                                ])
+
+                                # save transaction
+                                transaction_detail = "Free ride token {0} was used for this ride transaction".format(json_input["free_token"])
+                                _data, _ = save_transaction(
+                                                transaction_detail=transaction_detail,
+                                                type_of_operation=OperationType.ride_type,
+                                                type_of_transaction=TransactionType.both_types,
+                                                cost_of_transaction=0,
+                                                _receiver=_receiver,
+                                                _sender=_sender,
+                                                _receiver_wallet=_receiver_wallet,
+                                                _sender_wallet=_sender_wallet,
+                                                receiver_amount_before_transaction=receiver_amount_before_transaction,
+                                                sender_amount_before_transaction=sender_amount_before_transaction,
+                                                receiver_amount_after_transaction=(receiver_amount_before_transaction + 0),
+                                                sender_amount_after_transaction=(sender_amount_before_transaction+0)
+                                            )
+                    except SQLAlchemyError as error:
+                        return server_errors("Free ride token could not be redeemed", error)
+                    if not redeemed:
+                        # error handlers, a token of another user is not valid
+                        token_valid = FreeRide.query.filter(
+                                        FreeRide.token==json_input["free_token"],
+                                        FreeRide.user_id==_sender.id
+                                    ).first()
+                        if not token_valid:
+                            return moov_errors("{0} is not a valid token".format(json_input["free_token"]), 404)
                         return moov_errors("{0} has been used".format(json_input["free_token"]), 400)
-
-                    # set the token to false i.e. make it inactive
-                    token_valid.token_status = False
-                    token_valid.save()
-
-                    # save notification
-                    transaction_icon = Icon.query.filter(Icon.operation_type=="ride_operation").first()
-                    if transaction_icon:
-                        _transaction_icon_id = transaction_icon.id
-                    notification_user_sender_message = "Your transaction costs N0, your free token {0} was used".format(json_input["free_token"])
-                    notification_user_receiver_message = "Your transaction with {0} was a free ride".format(str(_sender.firstname).title())
-                    save_notification(
-                            recipient_id=_sender.id, 
-                            sender_id=moov_user.id, 
-                            message=notification_user_sender_message, 
-                            transaction_icon_id=_transaction_icon_id
-                        )
-                    save_notification(
-                            recipient_id=_receiver.id, 
-                            sender_id=moov_user.id, 
-                            message=notification_user_receiver_message, 
-                            transaction_icon_id=_transaction_icon_id
-                        )
-
-                    # save transaction
-                    transaction_detail = "Free ride token {0} was used for this ride transaction".format(json_input["free_token"])
-                    _data, _ = save_transaction(
-                                    transaction_detail=transaction_detail, 
-                                    type_of_operation=OperationType.ride_type, 
-                                    type_of_transaction=TransactionType.both_types, 
-                                    cost_of_transaction=0, 
-                                    _receiver=_receiver, 
-                                    _sender=_sender, 
-                                    _receiver_wallet=_receiver_wallet, 
-                                    _sender_wallet=_sender_wallet, 
-                                    receiver_amount_before_transaction=receiver_amount_before_transaction, 
-                                    sender_amount_before_transaction=sender_amount_before_transaction, 
-                                    receiver_amount_after_transaction=(receiver_amount_before_transaction + 0), 
-                                    sender_amount_after_transaction=(sender_amount_before_transaction+0)
-                                )
                     _data["free_ride_token"] = ""
                 else:
                     # increments the number of rides taken by a user
@@ -308,74 +328,83 @@ class TransactionResource(Resource):
 
                     school_email = school.email
                     car_owner_email = os.environ.get("CAR_OWNER_EMAIL") if ("car_owner" not in json_input) else json_input["car_owner"]
-                    car_owner = get_user(car_owner_email)
+                    # the school and car owner with their wallets in one query
+                    _users = get_users_with_wallets(school_email, car_owner_email)
+                    car_owner = _users.get(normalize_email(car_owner_email))
                     if not car_owner:
                         return not_found_errors(car_owner_email)
+                    school_user = _users.get(normalize_email(school_email))
 
-                    moov_wallet = get_wallet(email=moov_email)
-                    school_wallet = get_wallet(email=school_email)
-                    car_owner_wallet = get_wallet(email=car_owner_email)
-
-                    if not moov_wallet:
+                    if not moov_user.wallet_user:
                         return not_found_errors(moov_email)
-                    if not school_wallet:
+                    if not school_user or not school_user.wallet_user:
                         return not_found_errors(school_email)
-                    if not car_owner_wallet:
+                    if not car_owner.wallet_user:
                         return not_found_errors(car_owner_email)
-
+                    moov_wallet = moov_user.wallet_user[0]
+                    school_wallet = school_user.wallet_user[0]
+                    car_owner_wallet = car_owner.wallet_user[0]
+
+                    # the percentage prices of the school and car owner, and
+                    # the defaults they fall back to, in one query
+                    percentage_prices = get_percentage_prices(
+                                            "default_driver", school.email, "default_school",
+                                            car_owner.email, "default_car_owner"
+                                        )
                     # change here in case percentage cut is dynamic for drivers of different schools
-                    driver_percentage_price_info = get_percentage_price(title="default_driver")
-                    if not driver_percentage_price_info:
-                        # ignore repitition from above for now
-                        driver_percentage_price_info = get_percentage_price(title="default_driver")  
-                    school_percentage_price_info = get_percentage_price(title=school.email)
-                    if not school_percentage_price_info:
-                        school_percentage_price_info = get_percentage_price(title="default_school")          
-                    car_owner_percentage_price_info = get_percentage_price(title=car_owner.email)
-                    if not car_owner_percentage_price_info:
-                        car_owner_percentage_price_info = get_percentage_price(title="default_car_owner")  
+                    driver_percentage_price_info = percentage_prices.get("default_driver")
+                    school_percentage_price_info = percentage_prices.get(school.email) or \
+                                                   percentage_prices.get("default_school")
+                    car_owner_percentage_price_info = percentage_prices.get(car_owner.email) or \
+                                                      percentage_prices.get("default_car_owner")
 
                     if not car_owner_percentage_price_info or not school_percentage_price_info:
                         return moov_errors("Percentage price was not set for the school or car_owner ({0}, {1})".format(school.name, car_owner_email), 400)
 
-                    # free ride generation
-                    free_ride_token = get_free_ride_token(_sender)
-                    if free_ride_token:
-                        free_ride_description = "Token generated for {0} on the {1} for ride number {2}".format(
-                                                    _sender.email, str(datetime.now()), _sender.number_of_rides
-                                                )
-                        save_free_ride_token(
-                            free_ride_type=FreeRideType.ride_type,
-                            token=free_ride_token, 
-                            description=free_ride_description, 
-                            user_id=_sender_id
-                        )
+                    # the wallets, a free ride earned, the transaction and the
+                    # notifications are committed together
+                    try:
+                        with db_transaction():
+                            # free ride generation
+                            free_ride_token = get_free_ride_token(_sender)
+                            if free_ride_token:
+                                free_ride_description = "Token generated for {0} on the {1} for ride number {2}".format(
+                                                            _sender.email, str(datetime.now()), _sender.number_of_rides
+                                                        )
+                                save_free_ride_token(
+                                    free_ride_type=FreeRideType.ride_type,
+                                    token=free_ride_token, 
+                                    description=free_ride_description, 
+                                    user_id=_sender_id
+                                )
 
-                        free_ride_notification_message = "You have earned a free ride token '{0}'".format(free_ride_token)
-                        save_notification(
-                            recipient_id=_sender_id, 
-                            sender_id=moov_user.id, 
-                            message=free_ride_notification_message, 
-                            transaction_icon_id=free_ride_icon_id
-                        )
-                    
-                    _data, _ = ride_fare_operation(
-                                    _sender, 
-                                    _receiver, 
-                                    driver_percentage_price_info, 
-                                    school_percentage_price_info, 
-                                    car_owner_percentage_price_info, 
-                                    cost_of_transaction, 
-                                    receiver_amount_before_transaction, 
-                                    sender_amount_before_transaction, 
-                                    sender_amount_after_transaction, 
-                                    moov_wallet, 
-                                    school_wallet, 
-                                    car_owner_wallet, 
-                                    _sender_wallet, 
-                                    _receiver_wallet, 
-                                    moov_user
+                                save_notification(
+                                    recipient_id=_sender_id, 
+                                    sender_id=moov_user.id, 
+                                    template="free_ride_earned",
+                                    params={"token": free_ride_token},
+                                    transaction_icon_id=free_ride_icon_id
                                 )
+                    
+                            _data, _ = ride_fare_operation(
+                                            _sender, 
+                                            _receiver, 
+                                            driver_percentage_price_info, 
+                                            school_percentage_price_info, 
+                                            car_owner_percentage_price_info, 
+                                            cost_of_transaction, 
+                                            receiver_amount_before_transaction, 
+                                            sender_amount_before_transaction, 
+                                            sender_amount_after_transaction, 
+                                            moov_wallet, 
+                                            school_wallet, 
+                                            car_owner_wallet, 
+                                            _sender_wallet, 
+                                            _receiver_wallet, 
+                                            moov_user
+                                        )
+                    except SQLAlchemyError as error:
+                        return server_errors("Ride fare was not paid", error)
                     _data["free_ride_token"] = free_ride_token
     
                 return {
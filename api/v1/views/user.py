@@ -1,38 +1,50 @@
 import os
 import datetime
-from datetime import timedelta
 from os.path import join, dirname
 from dotenv import load_dotenv
 
 from sqlalchemy import or_, and_
-from flask import g, request, jsonify
+from sqlalchemy.exc import SQLAlchemyError
+from flask import g, request, current_app
 from flask_restful import Resource
 from flask_jwt import jwt
 
 try:
-    from ...auth.token import token_required
+    from ...auth.token import token_required, get_current_user
+    from ...auth.rate_limit import rate_limit
     from ...auth.validation import validate_request, validate_input_data, validate_empty_string
     from ...helper.common_helper import is_empty_request_fields, is_user_type_authorized
-    from ...helper.error_message import moov_errors, not_found_errors
+    from ...helper.error_message import moov_errors, not_found_errors, server_errors
+    from ...helper.forgot_password_helper import get_latest_forgot_password, is_temp_password_expired
+    from ...helper.icon_helper import get_icon_id
     from ...helper.user_helper import get_authentication_type
     from ...helper.school_helper import get_school
+    from ...helper.notification_helper import save_notifications
     from ...models import (
         User, UserType, Wallet, Transaction, Notification, 
-        FreeRide, Icon, DriverInfo, AdmissionType, ForgotPassword
+        FreeRide, DriverInfo, AdmissionType, db_transaction, save_all
+    )
+    from ...schema import (
+        user_schema, user_login_schema, serialize_user, serialize_driver_profile
     )
-    from ...schema import user_schema, user_login_schema, driver_info_schema
 except ImportError:
-    from moov_backend.api.auth.token import token_required
+    from moov_backend.api.auth.token import token_required, get_current_user
+    from moov_backend.api.auth.rate_limit import rate_limit
     from moov_backend.api.auth.validation import validate_request, validate_input_data
     from moov_backend.api.helper.common_helper import is_empty_request_fields
-    from moov_backend.api.helper.error_message import moov_errors, not_found_errors
+    from moov_backend.api.helper.error_message import moov_errors, not_found_errors, server_errors
+    from moov_backend.api.helper.forgot_password_helper import get_latest_forgot_password, is_temp_password_expired
+    from moov_backend.api.helper.icon_helper import get_icon_id
     from moov_backend.api.helper.user_helper import get_authentication_type
     from moov_backend.api.helper.school_helper import get_school
+    from moov_backend.api.helper.notification_helper import save_notifications
     from moov_backend.api.models import (
         User, UserType, Wallet, Transaction, Notification, 
-        FreeRide, Icon, DriverInfo, AdmissionType, ForgotPassword
+        FreeRide, DriverInfo, AdmissionType, db_transaction, save_all
+    )
+    from moov_backend.api.schema import (
+        user_schema, user_login_schema, serialize_user, serialize_driver_profile
     )
-    from moov_backend.api.schema import user_schema, user_login_schema, driver_info_schema
 
 
 dotenv_path = join(dirname(__file__), '.env')
@@ -45,7 +57,7 @@ class UserResource(Resource):
     def get(self):
         _data = {}
         _user_id = g.current_user.id
-        _user = User.query.get(_user_id)
+        _user = get_current_user()
         if not _user:
             return moov_errors('User does not exist', 404)
 
@@ -59,23 +71,18 @@ class UserResource(Resource):
 
         # handle driver users
         if user_type == "driver":
-            driver_info = DriverInfo.query.filter(DriverInfo.driver_id==_user_id).first()
-            driver_info_data, _ = driver_info_schema.dump(driver_info)
-            driver_info_data["driver_location"] = [driver_info_data["location_latitude"], driver_info_data["location_longitude"]]
-            driver_info_data["driver_destination"] = [driver_info_data["destination_latitude"], driver_info_data["destination_longitude"]]
-            for key in ['bank_name', 'account_number', 'driver_id', 'admission_type_id', 'location_latitude', \
-            'location_longitude', 'destination_latitude', 'destination_longitude']:
-                driver_info_data.pop(key, None)
-            _data, _ = user_schema.dump(_user)
+            driver_info = _user.driver_profile
+            driver_info_data = serialize_driver_profile(driver_info)
+            driver_info_data["driver_location"] = [driver_info.location_latitude, driver_info.location_longitude]
+            driver_info_data["driver_destination"] = [driver_info.destination_latitude, driver_info.destination_longitude]
+            _data = serialize_user(_user)
             _data["driver_info"] = driver_info_data
         else:
-            _data, _ = user_schema.dump(_user)
+            _data = serialize_user(_user)
 
         _data['wallet_amount'] = _user.wallet_user[0].wallet_amount
         _data["school"] = str(_user.school_information.name)
         _data["user_type"] = user_type
-        _data.pop('password', None)
-        _data.pop('user_id', None)
         return {
             'status': 'success',
             'data': { 
@@ -103,7 +110,7 @@ class UserResource(Resource):
             return validate_input_data(json_input, keys)
 
         _user_id = g.current_user.id
-        _user = User.query.get(_user_id)
+        _user = get_current_user()
         if not _user:
             return moov_errors("User does not exist", 404)
 
@@ -131,11 +138,9 @@ class UserResource(Resource):
             _user.__setitem__(key, json_input[key])
 
         _user.save()
-        _data, _ = user_schema.dump(_user)
+        _data = serialize_user(_user)
         _data["user_type"] = _user.user_type.title
         _data["school"] = str(_user.school_information.name)
-        _data.pop('password', None)
-        _data.pop('user_id', None)
         return {
             'status': 'success',
             'data': {
@@ -156,8 +161,8 @@ class UserResource(Resource):
             return validate_input_data(json_input, keys)
 
         _current_user_id = g.current_user.id
-        _current_user = User.query.get(_current_user_id)
-        _user_to_delete = User.query.filter(User.email==json_input["email"]).first()
+        _current_user = get_current_user()
+        _user_to_delete = User.get_by_email(json_input["email"])
         if not _current_user or not _user_to_delete:
             return moov_errors("User does not exist", 404)
 
@@ -181,6 +186,7 @@ class UserResource(Resource):
 
 class UserSignupResource(Resource):
     
+    @rate_limit("signup")
     @validate_request()
     def post(self):
         json_input = request.get_json()
@@ -231,14 +237,12 @@ class UserSignupResource(Resource):
             return moov_errors("User type can only be student or driver", 400)
 
         moov_email = os.environ.get("MOOV_EMAIL")
-        moov_user = User.query.filter(User.email==moov_email).first()
+        moov_user = User.get_by_email(moov_email)
         if not moov_user:
             return not_found_errors(moov_email)
 
         _transaction_icon = "https://cdn.pixabay.com/photo/2015/10/05/22/37/blank-profile-picture-973461_1280.png"
-        transaction_icon = Icon.query.filter(Icon.operation_type=="moov_operation").first()
-        if transaction_icon:
-            _transaction_icon_id = transaction_icon.id
+        _transaction_icon_id = get_icon_id("moov_operation")
 
         authentication_type = "email" if "authentication_type" not in json_input else json_input['authentication_type']
         authentication_type = get_authentication_type(authentication_type)
@@ -255,22 +259,39 @@ class UserSignupResource(Resource):
                         "https://cdn.pixabay.com/photo/2015/10/05/22/37/blank-profile-picture-973461_1280.png",
             mobile_number=data['mobile_number'] if json_input.get('mobile_number') else ""
         )
-        new_user.save()
-
-        user_wallet = Wallet(
-            wallet_amount= 0.00,
-            user_id = new_user.id,
-            description = "{0} {1}'s Wallet".format((new_user.lastname).title(), (new_user.firstname).title())
-        )
-        user_wallet.save()
 
-        user_notification = Notification(
-            message="Welcome to MOOV app.",
-            recipient_id=new_user.id,
-            sender_id=moov_user.id,
-            transaction_icon_id=_transaction_icon_id
-        )
-        user_notification.save()
+        # the user, their wallet, driver info and notifications are saved
+        # in one transaction so a failed signup leaves no partial profile
+        try:
+            with db_transaction():
+                new_user.save()
+
+                user_wallet = Wallet(
+                    wallet_amount= 0.00,
+                    user_id = new_user.id,
+                    description = "{0} {1}'s Wallet".format((new_user.lastname).title(), (new_user.firstname).title())
+                )
+                new_objects = [user_wallet]
+                notifications = [{
+                    "recipient_id": new_user.id,
+                    "sender_id": moov_user.id,
+                    "template": "welcome",
+                    "transaction_icon_id": _transaction_icon_id
+                }]
+                if user_type.title.lower() == "driver":
+                    new_objects.append(DriverInfo(
+                        driver_id=new_user.id
+                    ))
+                    notifications.append({
+                        "recipient_id": new_user.id,
+                        "sender_id": moov_user.id,
+                        "template": "driver_registered",
+                        "transaction_icon_id": _transaction_icon_id
+                    })
+                save_all(new_objects)
+                save_notifications(notifications)
+        except SQLAlchemyError as error:
+            return server_errors("The profile could not be created", error)
 
         token_date = datetime.datetime.utcnow()
         payload = {
@@ -281,26 +302,10 @@ class UserSignupResource(Resource):
 
         message = "The profile with email {0} has been created succesfully".format(new_user.email)
 
-        _data, _ = user_schema.dump(new_user)
+        _data = serialize_user(new_user)
         _data["wallet_amount"] = user_wallet.wallet_amount
         _data["school"] = str(new_user.school_information.name)
         _data["user_type"] = new_user.user_type.title
-        _data.pop('password', None)
-        _data.pop('user_id', None)
-
-        if user_type.title.lower() == "driver":
-            new_driver_info = DriverInfo(
-                driver_id=new_user.id
-            )
-            new_driver_info.save()
-            user_notification = Notification(
-                message="Thank you for registering to be a MOOV driver. \
-                            Your request is waiting approval, we will get back to you soon",
-                recipient_id=new_user.id,
-                sender_id=moov_user.id,
-                transaction_icon_id=_transaction_icon_id
-            )
-            user_notification.save()
 
         return {
             'status': 'success',
@@ -314,6 +319,7 @@ class UserSignupResource(Resource):
     
 class UserLoginResource(Resource):
         
+    @rate_limit("login")
     @validate_request()
     def post(self):
         set_temporary_password = False
@@ -327,23 +333,19 @@ class UserLoginResource(Resource):
         if errors:
             return moov_errors(errors, 422)
 
-        _user = User.query.filter(User.email.like(json_input['email'])).first()
+        _user = User.get_by_email(json_input['email'])
         if not _user:
             return moov_errors('User does not exist', 404)
 
         if _user.reset_password:
-            temp_password = ForgotPassword.query.filter(
-                ForgotPassword.user_id==_user.id
-            ).order_by(
-                ForgotPassword.created_at.desc()
-            ).first()
+            temp_password = get_latest_forgot_password(_user.id)
 
             # Precautions
-            if (not temp_password) or (temp_password and temp_password.temp_password != json_input['password']):
+            if (not temp_password) or (not temp_password.check_temp_password(json_input['password'])):
                 return moov_errors("Invalid password", 400)
             if temp_password.used:
                 return moov_errors("Sorry, this password has been used to reset forgotten password details", 400)
-            if not datetime.datetime.utcnow() <= (temp_password.created_at + timedelta(days=1)):
+            if is_temp_password_expired(temp_password):
                 return moov_errors("Temporary password expired", 400)
 
             set_temporary_password = True
@@ -355,6 +357,16 @@ class UserLoginResource(Resource):
             if not _user.check_password(json_input['password']):
                 return moov_errors("Invalid email/password", 401)
 
+            # upgrade hashes made with an older method or work factor
+            # the login goes on with the old hash when the new one is not saved
+            if _user.password_needs_rehash():
+                _user_id = _user.id
+                _user.password = json_input['password']
+                saved = _user.save()
+                if saved is not True:
+                    current_app.logger.warning(
+                        "Password of user {0} was not rehashed: {1!r}".format(_user_id, saved))
+
         _user_wallet = Wallet.query.filter(Wallet.user_id==_user.id).first()
 
         token_date = datetime.datetime.utcnow()
@@ -364,20 +376,19 @@ class UserLoginResource(Resource):
                 }
         _token = jwt.encode(payload, os.getenv("TOKEN_KEY"), algorithm='HS256')
 
-        _data, _ = user_schema.dump(_user)
+        _data = serialize_user(_user)
         _data["wallet_amount"] = _user_wallet.wallet_amount if _user_wallet else "Unavailable"
         _data["school"] = str(_user.school_information.name)
         _data["user_type"] = _user.user_type.title
         _data["set_temporary_password"] = set_temporary_password
-        _data.pop('password', None)
-        _data.pop('user_id', None)
-        return jsonify({"status": "success",
-                        "data": {
-                            "data": _data,
-                            "message": "Login successful",
-                            "token": str(_token)
-                        }
-                    })
+        return {
+            "status": "success",
+            "data": {
+                "data": _data,
+                "message": "Login successful",
+                "token": str(_token)
+            }
+        }, 200
 
 
 class UserAuthorizationResource(Resource):
@@ -386,7 +397,7 @@ class UserAuthorizationResource(Resource):
     def get(self):
         _current_user_id = g.current_user.id
 
-        _current_user = User.query.get(_current_user_id)
+        _current_user = get_current_user()
         if not _current_user:
             return moov_errors("User does not exist", 404)
 
@@ -394,11 +405,11 @@ class UserAuthorizationResource(Resource):
         _data['user_id'] = _current_user_id
         _data['authorization_code'] = _data['authorization_code'] = _current_user.authorization_code
         _data['authorization_code_status'] = _current_user.authorization_code_status
-        _data.pop('password', None)
         _data.pop('user_id', None)
 
-        return jsonify({"status": "success",
-                        "data": {
-                            "data": _data
-                        }
-                    })
+        return {
+            "status": "success",
+            "data": {
+                "data": _data
+            }
+        }, 200
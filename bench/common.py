@@ -0,0 +1,105 @@
+"""
+Shared setup of the benchmarks, run them from the repository root, e.g.
+
+    python -m bench.free_ride_tokens
+
+Every benchmark drops and recreates the tables of its own database, a
+SQLite file in the temp directory unless BENCH_DATABASE_URI (with the
+matching DB_TYPE) points at another scratch database.
+"""
+import os
+import tempfile
+import timeit
+
+from contextlib import contextmanager
+from datetime import datetime
+
+# the benchmarks always run on the testing configuration
+os.environ["FLASK_CONFIG"] = "testing"
+os.environ.setdefault("DB_TYPE", "sqlite")
+os.environ.setdefault("TOKEN_KEY", "bench_token_key")
+os.environ.setdefault("MOOV_EMAIL", "moov@bench.com")
+
+from sqlalchemy import event
+
+try:
+    from main import app
+    from api.auth.password import password_hasher
+    from api.generator.id_generator import push_id_generator
+    from api.models import db, User, UserType, Wallet
+except ImportError:
+    from moov_backend.main import app
+    from moov_backend.api.auth.password import password_hasher
+    from moov_backend.api.generator.id_generator import push_id_generator
+    from moov_backend.api.models import db, User, UserType, Wallet
+
+app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("BENCH_DATABASE_URI") or \
+    "sqlite:///" + os.path.join(tempfile.gettempdir(), "moov_bench.sqlite")
+
+USER_TYPES = ['admin', 'driver', 'student', 'moov', 'school', 'car_owner']
+
+
+def reset_database():
+    """Recreates the tables and returns the ids of the user types"""
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    user_types = [UserType(title=title, description='{0} privilege'.format(title))
+                  for title in USER_TYPES]
+    db.session.add_all(user_types)
+    db.session.commit()
+    return dict((user_type.title, user_type.id) for user_type in user_types)
+
+def add_users(count, user_type_id, school_id=None, prefix="bench"):
+    """Bulk inserts users with a wallet each and returns their ids"""
+    now = datetime.utcnow()
+    # one hash for every user, hashing each password would dominate
+    password = password_hasher.hash("password")
+    user_ids = push_id_generator.next_ids(count)
+    wallet_ids = push_id_generator.next_ids(count)
+    for start in range(0, count, 5000):
+        db.session.bulk_insert_mappings(User, [{
+            "id": user_id,
+            "user_type_id": user_type_id,
+            "school_id": school_id,
+            "firstname": "bench",
+            "lastname": "user",
+            "email": "{0}{1}@bench.com".format(prefix, start + index),
+            "_password": password,
+            "mobile_number": "0",
+            "created_at": now,
+            "modified_at": now
+        } for index, user_id in enumerate(user_ids[start:start + 5000])])
+        db.session.bulk_insert_mappings(Wallet, [{
+            "id": wallet_id,
+            "user_id": user_id,
+            "wallet_amount": 0.0,
+            "description": "bench wallet",
+            "created_at": now,
+            "modified_at": now
+        } for wallet_id, user_id in zip(wallet_ids[start:start + 5000],
+                                        user_ids[start:start + 5000])])
+    db.session.commit()
+    return user_ids
+
+def best_of(func, number, repeat=5):
+    """Returns the best time of one call of func, in seconds"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+@contextmanager
+def count_queries():
+    """Counts the statements sent to the database in the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.get_engine(app)
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def report(label, *columns):
+    print("{0:<44}".format(label) + "".join("{0:>16}".format(column) for column in columns))
@@ -0,0 +1,84 @@
+"""
+Cost of issuing a free ride token and a temporary password as the FreeRide
+and ForgotPassword tables grow. Generating either needs no query, so the
+cost of an issue stays the one INSERT whatever the table size.
+"""
+from datetime import datetime
+
+from .common import (
+    app, db, push_id_generator, reset_database, add_users, best_of,
+    count_queries, report
+)
+
+try:
+    from api.generator.free_ride_token_generator import generate_free_ride_token
+    from api.generator.password_generator import generate_password
+    from api.models import FreeRide, FreeRideType, ForgotPassword
+except ImportError:
+    from moov_backend.api.generator.free_ride_token_generator import generate_free_ride_token
+    from moov_backend.api.generator.password_generator import generate_password
+    from moov_backend.api.models import FreeRide, FreeRideType, ForgotPassword
+
+
+TABLE_SIZES = [0, 10000, 50000, 100000]
+ISSUES = 200
+
+
+def grow_tables(rows, user_id):
+    now = datetime.utcnow()
+    for start in range(0, rows, 5000):
+        count = min(5000, rows - start)
+        db.session.bulk_insert_mappings(FreeRide, [{
+            "id": free_ride_id,
+            "free_ride_type": FreeRideType.social_share_type,
+            "token": generate_free_ride_token(),
+            "token_status": True,
+            "user_id": user_id,
+            "created_at": now,
+            "modified_at": now
+        } for free_ride_id in push_id_generator.next_ids(count)])
+        db.session.bulk_insert_mappings(ForgotPassword, [{
+            "id": forgot_password_id,
+            "user_id": user_id,
+            "_temp_password": generate_password(),
+            "used": True,
+            "created_at": now,
+            "modified_at": now
+        } for forgot_password_id in push_id_generator.next_ids(count)])
+    db.session.commit()
+
+def issue_free_ride(user_id):
+    FreeRide(
+        free_ride_type=FreeRideType.social_share_type,
+        token=generate_free_ride_token(),
+        token_status=True,
+        user_id=user_id
+    ).save()
+
+def issue_temp_password(user_id):
+    ForgotPassword(
+        user_id=user_id,
+        temp_password=generate_password(),
+        used=False
+    ).save()
+
+def main():
+    with app.app_context():
+        user_types = reset_database()
+        user_id = add_users(1, user_types["student"])[0]
+
+        with count_queries() as statements:
+            generate_free_ride_token()
+            generate_password()
+        report("queries to generate a token and a password", len(statements))
+        report("rows in each table", "token issue", "password issue")
+
+        for table_size in TABLE_SIZES:
+            grow_tables(max(0, table_size - FreeRide.query.count()), user_id)
+            report(FreeRide.query.count(),
+                   "{0:.2f}ms".format(best_of(lambda: issue_free_ride(user_id), ISSUES, 3) * 1000),
+                   "{0:.2f}ms".format(best_of(lambda: issue_temp_password(user_id), ISSUES, 3) * 1000))
+
+
+if __name__ == "__main__":
+    main()
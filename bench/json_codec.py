@@ -0,0 +1,67 @@
+"""
+Cost of encoding and decoding a 50-row transactions page and a
+current_ride with every codec api.helper.json_codec can use here. With
+ujson 1.x (Python 2) the ujson codec still encodes with json.
+"""
+from datetime import datetime
+
+from .common import best_of, report
+
+try:
+    from api.helper.json_codec import CODECS
+except ImportError:
+    from moov_backend.api.helper.json_codec import CODECS
+
+
+CALLS = 2000
+
+
+def transactions_page():
+    now = datetime.utcnow().isoformat() + "+00:00"
+    return {
+        "status": "success",
+        "data": {
+            "transactions": [{
+                "id": "-L{0:018d}".format(index),
+                "transaction_detail": u"Transfer of 1234.5 to caf\xe9 user",
+                "type_of_operation": "OperationType.transfer_type",
+                "type_of_transaction": "TransactionType.both_types",
+                "cost_of_transaction": 1234.5 + index / 7.0,
+                "receiver_amount_before_transaction": 100.0,
+                "receiver_amount_after_transaction": 1334.5,
+                "paystack_deduction": 0.0,
+                "receiver_id": "-Lreceiver",
+                "sender_id": "-Lsender",
+                "transaction_date": now,
+                "modified_at": now
+            } for index in range(50)],
+            "next_url": "/api/v1/transaction?page=2&limit=50",
+            "all_pages": 4
+        }
+    }
+
+def current_ride():
+    return {
+        "driver_email": "driver@moov.com",
+        "location": [6.5244, 3.3792],
+        "destination": [6.6018, 3.3515],
+        "slots": 2
+    }
+
+def main():
+    json_dumps, json_loads = CODECS["json"]
+    for label, value in [("50-row transactions page", transactions_page()),
+                         ("current_ride", current_ride())]:
+        document = json_dumps(value)
+        report(label, "dumps", "loads")
+        for name in sorted(CODECS):
+            dumps, loads = CODECS[name]
+            # every codec reads back what json writes and the other way round
+            assert loads(document) == json_loads(dumps(value)) == value
+            report("  " + name,
+                   "{0:.1f}us".format(best_of(lambda: dumps(value), CALLS) * 1000000),
+                   "{0:.1f}us".format(best_of(lambda: loads(document), CALLS) * 1000000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Requests per second and latency of a running server under concurrent
+keep-alive clients, e.g. to compare the dev server with gunicorn:
+
+    python manage.py runserver
+    gunicorn --config gunicorn_config.py main:app
+
+    python -m bench.load_test --email admin@moov.com --password ... \\
+        --concurrency 16 --seconds 10
+
+Every client logs in once as the given user and then requests the paths
+in turn until the time is up. Run it against a scratch database, the
+paths are only read.
+"""
+import argparse
+import json
+import threading
+import time
+
+try:
+    from httplib import HTTPConnection
+    from urlparse import urlparse
+except ImportError:
+    from http.client import HTTPConnection
+    from urllib.parse import urlparse
+
+
+PATHS = "/api/v1/user_authorization,/api/v1/all_schools,/api/v1/transaction"
+
+
+def login(host, port, email, password):
+    connection = HTTPConnection(host, port)
+    connection.request("POST", "/api/v1/login",
+                       json.dumps({"email": email, "password": password}),
+                       {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    body = json.loads(response.read().decode("utf-8"))
+    connection.close()
+    if response.status != 200:
+        raise SystemExit("Login failed ({0}): {1}".format(response.status, body))
+    return body["data"]["token"]
+
+def run_client(host, port, headers, paths, stop_at, results):
+    connection = HTTPConnection(host, port)
+    latencies = []
+    errors = 0
+    index = 0
+    while time.time() < stop_at:
+        started = time.time()
+        try:
+            connection.request("GET", paths[index % len(paths)], headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except Exception:
+            # e.g. a worker that was recycled closed the connection
+            errors += 1
+            connection.close()
+            connection = HTTPConnection(host, port)
+            continue
+        if response.status >= 500:
+            errors += 1
+        latencies.append(time.time() - started)
+        index += 1
+    connection.close()
+    results.append((latencies, errors))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--paths", default=PATHS, help="comma separated")
+    args = parser.parse_args()
+
+    url = urlparse(args.url)
+    host, port = url.hostname, url.port or 80
+    paths = args.paths.split(",")
+    headers = {"Authorization": "Bearer {0}".format(
+                    login(host, port, args.email, args.password))}
+
+    results = []
+    stop_at = time.time() + args.seconds
+    clients = [threading.Thread(target=run_client,
+                                args=(host, port, headers, paths, stop_at, results))
+               for _ in range(args.concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+
+    latencies = sorted(latency for client_latencies, _ in results for latency in client_latencies)
+    errors = sum(client_errors for _, client_errors in results)
+    if not latencies:
+        raise SystemExit("No request succeeded, {0} error(s)".format(errors))
+    print("{0} clients for {1:.0f}s: {2:.0f} req/s, p50 {3:.1f}ms, p99 {4:.1f}ms, "
+          "{5} error(s)".format(
+              args.concurrency, args.seconds, len(latencies) / args.seconds,
+              latencies[len(latencies) // 2] * 1000,
+              latencies[int(len(latencies) * 0.99)] * 1000, errors))
+
+
+if __name__ == "__main__":
+    main()
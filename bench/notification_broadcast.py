@@ -0,0 +1,66 @@
+"""
+Cost of broadcasting a notification to every student. broadcast_notification
+writes the notifications with one INSERT ... SELECT and bumps the counters
+with one UPDATE, save_notifications builds and inserts a row per user
+in Python.
+"""
+from .common import (
+    app, db, reset_database, add_users, best_of, count_queries, report
+)
+
+try:
+    from api.helper.notification_helper import broadcast_notification, save_notifications
+    from api.models import User, Notification
+except ImportError:
+    from moov_backend.api.helper.notification_helper import broadcast_notification, save_notifications
+    from moov_backend.api.models import User, Notification
+
+
+AUDIENCES = [1000, 10000, 50000]
+
+
+def broadcast(sender_id, user_type_id):
+    return broadcast_notification(
+                sender_id=sender_id,
+                template="announcement",
+                params={"message": "bench"},
+                user_type_id=user_type_id
+            )
+
+def save_one_by_one(sender_id, user_type_id):
+    recipient_ids = [user_id for user_id, in db.session.query(User.id).
+                        filter(User.user_type_id==user_type_id)]
+    save_notifications([{
+        "recipient_id": recipient_id,
+        "sender_id": sender_id,
+        "template": "announcement",
+        "params": {"message": "bench"}
+    } for recipient_id in recipient_ids])
+    return len(recipient_ids)
+
+def main():
+    with app.app_context():
+        user_types = reset_database()
+        sender_id = add_users(1, user_types["moov"], prefix="moov")[0]
+
+        with count_queries() as statements:
+            broadcast(sender_id, user_types["student"])
+        report("statements of a broadcast", len(statements))
+        report("recipients", "INSERT SELECT", "row per user")
+
+        students = 0
+        for audience in AUDIENCES:
+            add_users(audience - students, user_types["student"], prefix="student{0}_".format(audience))
+            students = audience
+            report(audience,
+                   "{0:.1f}ms".format(best_of(lambda: broadcast(sender_id, user_types["student"]), 1, 3) * 1000),
+                   "{0:.1f}ms".format(best_of(lambda: save_one_by_one(sender_id, user_types["student"]), 1, 3) * 1000))
+
+        # every broadcast reached every student and is on their counters
+        sent = db.session.query(Notification.id).filter(Notification.recipient_id!=sender_id).count()
+        counted = db.session.query(db.func.sum(User.notification_count)).scalar()
+        report("notifications / counted", sent, counted)
+
+
+if __name__ == "__main__":
+    main()
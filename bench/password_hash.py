@@ -0,0 +1,70 @@
+"""
+Password checks per second under a burst of logins, and how much of the
+process the requests that do not hash still get, for several sizes of
+the hashing pool (0 hashes in the request thread). The checks use the
+production PASSWORD_HASH_METHOD, the ticker stands in for a light
+request, e.g. a profile page serialized to json.
+"""
+import json
+import threading
+import time
+
+from .common import app, report
+
+try:
+    from config import Config
+    from api.auth.password import password_hasher
+except ImportError:
+    from moov_backend.config import Config
+    from moov_backend.api.auth.password import password_hasher
+
+
+POOL_SIZES = [0, 1, 2, 4]
+LOGIN_THREADS = 8
+SECONDS = 3
+
+
+def light_request():
+    return json.dumps({"user": dict(("field{0}".format(index), index) for index in range(20))})
+
+def run(workers):
+    password_hasher.init_app(app)
+    password_hasher.method = Config.PASSWORD_HASH_METHOD
+    password_hasher.workers = workers
+    pwhash = password_hasher.hash("password")
+
+    counts = {"checks": 0, "ticks": 0}
+    lock = threading.Lock()
+    stop_at = time.time() + SECONDS
+
+    def login():
+        while time.time() < stop_at:
+            password_hasher.check(pwhash, "password")
+            with lock:
+                counts["checks"] += 1
+
+    def ticker():
+        while time.time() < stop_at:
+            light_request()
+            counts["ticks"] += 1
+
+    threads = [threading.Thread(target=login) for _ in range(LOGIN_THREADS)] + \
+              [threading.Thread(target=ticker)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    password_hasher.shutdown()
+    return float(counts["checks"]) / SECONDS, float(counts["ticks"]) / SECONDS
+
+def main():
+    report("{0} logins at once, {1}".format(LOGIN_THREADS, Config.PASSWORD_HASH_METHOD),
+           "checks/s", "ticks/s")
+    for workers in POOL_SIZES:
+        checks, ticks = run(workers)
+        report("inline" if not workers else "pool of {0}".format(workers),
+               "{0:.1f}".format(checks), "{0:,.0f}".format(ticks))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Ids per second of the PushID generator, and its ordering. legacy is the
+numpy generator as it was before push_id_generator was shared: the models
+built a new one for every insert, which lost the ordering within a
+millisecond. The legacy rows need numpy, which the app no longer does,
+and are skipped without it.
+"""
+import threading
+import timeit
+
+from random import random
+from time import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .common import report
+
+try:
+    from api.generator.id_generator import PUSH_CHARS, push_id_generator
+except ImportError:
+    from moov_backend.api.generator.id_generator import PUSH_CHARS, push_id_generator
+
+
+IDS = 20000
+THREADS = 8
+
+
+class LegacyPushID(object):
+
+    def __init__(self):
+        self.last_push_time = 0
+        self.last_rand_chars = numpy.empty(12, dtype=int)
+
+    def next_id(self):
+        now = int(time() * 1000)
+        duplicate_time = (now == self.last_push_time)
+        self.last_push_time = now
+        time_stamp_chars = numpy.empty(8, dtype=str)
+
+        for i in range(7, -1, -1):
+            time_stamp_chars[i] = PUSH_CHARS[now % 64]
+            now = int(now / 64)
+        unique_id = ''.join(time_stamp_chars)
+
+        if not duplicate_time:
+            for i in range(12):
+                self.last_rand_chars[i] = int(random() * 64)
+        else:
+            for i in range(11, -1, -1):
+                if self.last_rand_chars[i] == 63:
+                    self.last_rand_chars[i] = 0
+                else:
+                    break
+            self.last_rand_chars[i] += 1
+
+        for i in range(12):
+            unique_id += PUSH_CHARS[self.last_rand_chars[i]]
+        return unique_id
+
+
+def ids_per_second(func, number):
+    return "{0:,.0f}".format(number / min(timeit.repeat(func, number=1, repeat=3)))
+
+def out_of_order(ids):
+    return sum(1 for before, after in zip(ids, ids[1:]) if after < before)
+
+def main():
+    report("generator", "ids/s", "out of order")
+
+    if numpy is not None:
+        report("legacy, new PushID() per insert",
+               ids_per_second(lambda: [LegacyPushID().next_id() for _ in range(IDS)], IDS),
+               out_of_order([LegacyPushID().next_id() for _ in range(IDS)]))
+        legacy_generator = LegacyPushID()
+        report("legacy, shared instance",
+               ids_per_second(lambda: [legacy_generator.next_id() for _ in range(IDS)], IDS),
+               out_of_order([legacy_generator.next_id() for _ in range(IDS)]))
+
+    report("next_id",
+           ids_per_second(lambda: [push_id_generator.next_id() for _ in range(IDS)], IDS),
+           out_of_order([push_id_generator.next_id() for _ in range(IDS)]))
+    report("next_ids(1000)",
+           ids_per_second(lambda: [push_id_generator.next_ids(1000) for _ in range(IDS // 1000)], IDS),
+           out_of_order(push_id_generator.next_ids(IDS)))
+
+    # ids of each thread stay ordered and unique across threads
+    thread_ids = []
+
+    def generate():
+        thread_ids.append([push_id_generator.next_id() for _ in range(IDS // THREADS)])
+
+    threads = [threading.Thread(target=generate) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report("next_id, {0} threads".format(THREADS),
+           "{0} unique".format(len(set(push_id for ids in thread_ids for push_id in ids))),
+           sum(out_of_order(ids) for ids in thread_ids))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Cost of dumping 10k notifications, transactions and users with their
+marshmallow schema and with the serializer compile_serializer built from
+it. Both give the same output, less the fields the views leave out.
+"""
+from datetime import datetime
+
+from .common import app, db, push_id_generator, reset_database, add_users, best_of, report
+
+try:
+    from api.models import User, Transaction, Notification, OperationType, TransactionType
+    from api.schema import (
+        transaction_schema, notification_schema, user_schema,
+        serialize_transaction, serialize_notification, serialize_user
+    )
+except ImportError:
+    from moov_backend.api.models import User, Transaction, Notification, OperationType, TransactionType
+    from moov_backend.api.schema import (
+        transaction_schema, notification_schema, user_schema,
+        serialize_transaction, serialize_notification, serialize_user
+    )
+
+
+ROWS = 10000
+
+
+def add_rows(user_ids):
+    now = datetime.utcnow()
+    db.session.bulk_insert_mappings(Notification, [{
+        "id": notification_id,
+        "template": "free_ride_given",
+        "params": {"name": "Bench"},
+        "read": index % 2 == 0,
+        "recipient_id": user_ids[index % len(user_ids)],
+        "sender_id": user_ids[0],
+        "created_at": now,
+        "modified_at": now
+    } for index, notification_id in enumerate(push_id_generator.next_ids(ROWS))])
+    db.session.bulk_insert_mappings(Transaction, [{
+        "id": transaction_id,
+        "transaction_detail": "bench transfer",
+        "type_of_operation": OperationType.transfer_type,
+        "type_of_transaction": TransactionType.both_types,
+        "cost_of_transaction": 100.0,
+        "receiver_amount_before_transaction": 0.0,
+        "receiver_amount_after_transaction": 100.0,
+        "sender_amount_before_transaction": 100.0,
+        "sender_amount_after_transaction": 0.0,
+        "receiver_id": user_ids[index % len(user_ids)],
+        "sender_id": user_ids[0],
+        "transaction_date": now,
+        "modified_at": now
+    } for index, transaction_id in enumerate(push_id_generator.next_ids(ROWS))])
+    db.session.commit()
+
+def marshmallow_user(user):
+    data, _ = user_schema.dump(user)
+    data.pop('password', None)
+    data.pop('user_id', None)
+    return data
+
+def main():
+    with app.app_context():
+        user_types = reset_database()
+        add_rows(add_users(ROWS, user_types["student"]))
+
+        report("10k dumps", "marshmallow", "compiled")
+        for label, dump, serialize, rows in [
+            ("notification", lambda row: notification_schema.dump(row).data,
+             serialize_notification, Notification.query.all()),
+            ("transaction", lambda row: transaction_schema.dump(row).data,
+             serialize_transaction, Transaction.query.all()),
+            ("user", marshmallow_user, serialize_user, User.query.all())
+        ]:
+            assert [dump(row) for row in rows] == [serialize(row) for row in rows]
+            report(label,
+                   "{0:.0f}ms".format(best_of(lambda: [dump(row) for row in rows], 1, 3) * 1000),
+                   "{0:.0f}ms".format(best_of(lambda: [serialize(row) for row in rows], 1, 3) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Cost of ModelViewsMix.serialize over 10k rows. legacy is serialize as it
+was before the column map was precomputed: it walked __table__.columns
+and camel cased every column name on every call.
+"""
+from .common import app, reset_database, add_users, best_of, report
+
+try:
+    from api.models import User, Wallet, to_camel_case
+except ImportError:
+    from moov_backend.api.models import User, Wallet, to_camel_case
+
+
+ROWS = 10000
+
+
+def legacy_serialize(row):
+    return {to_camel_case(column.name): getattr(row, column.name)
+            for column in row.__table__.columns}
+
+def main():
+    with app.app_context():
+        user_types = reset_database()
+        add_users(ROWS, user_types["student"])
+
+        report("rows", "legacy", "precomputed")
+        for label, rows in [
+            ("{0} Wallet rows".format(ROWS), [Wallet(id=str(index), wallet_amount=float(index),
+                                                     user_id=str(index), description="bench")
+                                              for index in range(ROWS)]),
+            ("{0} User rows".format(ROWS), User.query.all())
+        ]:
+            # the output is unchanged
+            assert [row.serialize() for row in rows] == [legacy_serialize(row) for row in rows]
+            report(label,
+                   "{0:.1f}ms".format(best_of(lambda: [legacy_serialize(row) for row in rows], 1) * 1000),
+                   "{0:.1f}ms".format(best_of(lambda: [row.serialize() for row in rows], 1) * 1000))
+
+
+if __name__ == "__main__":
+    main()
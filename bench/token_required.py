@@ -0,0 +1,79 @@
+"""
+Cost of the token_required decorator per call in a test request context.
+legacy is the decorator as it was before tokens were verified: it decoded
+without checking the signature and built both error responses on every
+call. A cached token skips the signature check, an uncached one is
+verified with TOKEN_KEY.
+"""
+import os
+
+from functools import wraps
+
+from flask import g, request, jsonify
+from flask_jwt import jwt
+
+from .common import app, best_of, report
+
+try:
+    from api.auth.token import token_required, token_cache, CurrentUser
+except ImportError:
+    from moov_backend.api.auth.token import token_required, token_cache, CurrentUser
+
+
+CALLS = 10000
+
+
+def legacy_token_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        authorization_token = request.headers.get('Authorization')
+        unauthorized_response = jsonify({
+            "status": "fail",
+            "data": {"message": "Unauthorized. The authorization token supplied is invalid"}
+        })
+        unauthorized_response.status_code = 401
+        expired_response = jsonify({
+            "status": "fail",
+            "data": {"message": "The authorization token supplied is expired"}
+        })
+        expired_response.status_code = 401
+        try:
+            payload = jwt.decode(authorization_token.split(' ')[1], 'secret',
+                                 options={"verify_signature": False})
+        except jwt.ExpiredSignatureError:
+            return expired_response
+        except jwt.InvalidTokenError:
+            return unauthorized_response
+        if not {"id", "stamp"}.issubset(str(key) for key in payload.keys()):
+            return unauthorized_response
+        g.current_user = CurrentUser(str(payload["id"]), str(payload["stamp"]))
+        return f(*args, **kwargs)
+    return decorated
+
+def view():
+    return g.current_user
+
+def main():
+    token = jwt.encode({"id": "-bench_user_id", "stamp": "bench"},
+                       os.getenv("TOKEN_KEY"), algorithm="HS256").decode("utf-8")
+    headers = {"Authorization": "Bearer {0}".format(token)}
+    legacy_view = legacy_token_required(view)
+    verified_view = token_required(view)
+
+    def uncached():
+        token_cache.clear()
+        verified_view()
+
+    with app.test_request_context(headers=headers):
+        report("decorator", "per call")
+        report("legacy, signature not checked",
+               "{0:.1f}us".format(best_of(legacy_view, CALLS) * 1000000))
+        report("verified, uncached token",
+               "{0:.1f}us".format(best_of(uncached, CALLS) * 1000000))
+        verified_view()
+        report("verified, cached token",
+               "{0:.1f}us".format(best_of(verified_view, CALLS) * 1000000))
+
+
+if __name__ == "__main__":
+    main()
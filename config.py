@@ -1,5 +1,5 @@
 import os
-from os.path import join, dirname
+from os.path import join, dirname, abspath
 from dotenv import load_dotenv
 
 dotenv_path = join(dirname(__file__), '.env')
@@ -7,13 +7,53 @@ load_dotenv(dotenv_path)
 
 
 class Config(object):
-    BASE_DIR = dirname(__file__)
+    BASE_DIR = dirname(abspath(__file__))
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI")
     SQLALCHEMY_ECHO = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     PAGE_LIMIT = 10
     DEFAULT_PAGE = 1
+    PAYOUT_THRESHOLD = 1000.0
+    PAYOUT_BATCH_SIZE = 500
+    CAMPAIGN_CHUNK_SIZE = 1000
+    NOTIFICATION_QUEUE_ASYNC = True
+    NOTIFICATION_BATCH_SIZE = 100
+    NOTIFICATION_RETENTION_DAYS = 90
+    NOTIFICATION_ARCHIVE_CHUNK_SIZE = 1000
+    FORGOT_PASSWORD_PURGE_CHUNK_SIZE = 1000
+    TOKEN_CACHE_SIZE = 1024
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:50000"
+    PASSWORD_SALT_LENGTH = 8
+    # hashes running at once per process, 0 hashes in the request thread
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    RATE_LIMIT_ENABLED = True
+    # requests per seconds, per client ip and per email in the request
+    RATE_LIMITS = {
+        "login": {"ip": (60, 60), "email": (10, 60)},
+        "signup": {"ip": (20, 3600), "email": (5, 3600)},
+        "forgot_password": {"ip": (20, 3600), "email": (3, 3600)}
+    }
+    # a SQLite file shares the limits between worker processes
+    RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE")
+    # the app runs behind one proxy that appends the client ip
+    RATE_LIMIT_TRUSTED_PROXIES = 1
+    MAIL_SERVER = 'smtp.gmail.com'
+    MAIL_PORT = 465
+    MAIL_USE_SSL = True
+    MAIL_USERNAME = os.getenv('MOOV_EMAIL')
+    MAIL_PASSWORD = os.getenv('MOOV_EMAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.getenv('MOOV_EMAIL')
+    MAIL_QUEUE_ASYNC = True
+    MAIL_BATCH_SIZE = 20
+    MAIL_MAX_ATTEMPTS = 5
+    # seconds an unused SMTP connection stays open
+    MAIL_IDLE_TIMEOUT = 60
+    # seconds between checks for mail to retry
+    MAIL_POLL_INTERVAL = 30
+    # ujson or json, ujson is used when installed if unset, ujson 1.x
+    # (Python 2) only decodes
+    JSON_CODEC = os.getenv("JSON_CODEC")
 
 
 class DevelopmentConfiguration(Config):
@@ -27,6 +67,11 @@ class TestingConfiguration(Config):
     SQLALCHEMY_DATABASE_URI  = "sqlite:///" + Config.BASE_DIR \
                               + "/test/test_db.sqlite"
     PAGE_LIMIT = 3
+    # a cheap work factor keeps the tests fast
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    NOTIFICATION_QUEUE_ASYNC = False
+    RATE_LIMIT_ENABLED = False
+    MAIL_QUEUE_ASYNC = False
 
 
 app_configuration = {
@@ -0,0 +1,62 @@
+import os
+import multiprocessing
+
+# Production server settings, the Procfile runs
+#
+#   gunicorn --config gunicorn_config.py main:app
+#
+# Every setting below can be overridden from the environment. Each worker
+# keeps its own SQLAlchemy pool of up to 15 connections (5 + 10 overflow),
+# so WEB_CONCURRENCY workers times 15 must fit the database's connection
+# limit.
+#
+# Reloading: `kill -HUP <master>` replaces the workers gracefully, but as the
+# app is preloaded in the master they keep the old code. To deploy new code
+# without dropping requests send USR2 to the master (it starts a new master
+# with the new code), then WINCH and TERM to the old one.
+
+
+# heroku sets PORT and WEB_CONCURRENCY for the dyno size
+bind = "0.0.0.0:{0}".format(os.getenv("PORT", "5000"))
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+# sync, gthread or gevent, sync workers with more than one thread are gthread
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.getenv("GUNICORN_THREADS", 1))
+# requests a gevent worker handles at once
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100))
+
+# import the app once in the master, workers are forked with it loaded
+preload_app = True
+
+# recycle workers after a number of requests, the jitter keeps them from
+# restarting all at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+# heroku kills the dyno 30 seconds after SIGTERM, workers stop before that
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 25))
+
+# logs go to stdout and stderr for the platform to collect
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+if worker_class == "gevent":
+    # patch before the app is preloaded so its locks, threads and sockets
+    # are gevent's, and make psycopg2 yield to other requests while waiting
+    # on postgres (needs gevent and psycogreen installed)
+    from gevent import monkey
+    monkey.patch_all()
+
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+
+def post_fork(server, worker):
+    # database connections opened while preloading belong to the master,
+    # every worker opens its own
+    app = server.app.wsgi()
+    app.extensions['sqlalchemy'].db.get_engine(app).dispose()
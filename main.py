@@ -24,10 +24,13 @@ try:
     from api.v1.views.transaction import (
         TransactionResource, AllTransactionsResource
     )
-    from api.v1.views.free_ride import FreeRideResource
-    from api.v1.views.notification import NotificationResource
+    from api.v1.views.free_ride import FreeRideResource, FreeRideCampaignResource
+    from api.v1.views.notification import (
+        NotificationResource, NotificationHistoryResource, NotificationBroadcastResource
+    )
     from api.v1.views.forgot_password import ForgotPasswordResource
     from api.v1.views.school import SchoolResource
+    from api.v1.views.rating import RatingResource
 except ImportError:
     from moov_backend.config import app_configuration
     from moov_backend.api.v1.views.route import RouteResource
@@ -42,10 +45,13 @@ except ImportError:
     from moov_backend.api.v1.views.transaction import (
         TransactionResource, AllTransactionsResource
     )
-    from moov_backend.api.v1.views.free_ride import FreeRideResource
-    from moov_backend.api.v1.views.notification import NotificationResource
+    from moov_backend.api.v1.views.free_ride import FreeRideResource, FreeRideCampaignResource
+    from moov_backend.api.v1.views.notification import (
+        NotificationResource, NotificationHistoryResource, NotificationBroadcastResource
+    )
     from moov_backend.api.v1.views.forgot_password import ForgotPasswordResource
     from moov_backend.api.v1.views.school import SchoolResource
+    from moov_backend.api.v1.views.rating import RatingResource
     
 
 dotenv_path = join(dirname(__file__), '.env')
@@ -56,23 +62,55 @@ def create_flask_app(environment):
     app = Flask(__name__, instance_relative_config=True, static_folder=None, template_folder='./api/emails/templates')
     app.config.from_object(app_configuration[environment])
     app.config['BUNDLE_ERRORS'] = True
+    app.secret_key = os.getenv("APP_SECRET")
 
     try:
         from api import models
+        from api.auth.password import password_hasher
+        from api.auth.rate_limit import rate_limiter
+        from api.auth.token import token_cache
+        from api.emails.mail_queue import mail_queue
+        from api.helper.json_codec import json_codec
+        from api.helper.notification_helper import notification_queue
     except ImportError:
         from moov_backend.api import models
+        from moov_backend.api.auth.password import password_hasher
+        from moov_backend.api.auth.rate_limit import rate_limiter
+        from moov_backend.api.auth.token import token_cache
+        from moov_backend.api.emails.mail_queue import mail_queue
+        from moov_backend.api.helper.json_codec import json_codec
+        from moov_backend.api.helper.notification_helper import notification_queue
 
     # to allow cross origin resource sharing
     CORS(app)
 
+    # pick the JSON codec for stored JSON and responses
+    json_codec.init_app(app)
+
     # initialize SQLAlchemy
     models.db.init_app(app)
 
+    # initialize the background notification writer
+    notification_queue.init_app(app)
+
+    # initialize the verified token cache
+    token_cache.init_app(app)
+
+    # initialize the password hashing pool
+    password_hasher.init_app(app)
+
+    # initialize the login, signup and forgot password rate limits
+    rate_limiter.init_app(app)
+
+    # initialize the outbound mail queue and its sender
+    mail_queue.init_app(app)
+
     # initilize migration commands
     Migrate(app, models.db)
 
     # initilize api resources
     api = Api(app)
+    api.representation('application/json')(json_codec.output_json)
 
     environment = os.getenv("FLASK_CONFIG")
 
@@ -112,9 +150,12 @@ def create_flask_app(environment):
     
     # Free Ride routes
     api.add_resource(FreeRideResource, '/api/v1/free_ride', '/api/v1/free_ride/', endpoint='free_ride_endpoint')
+    api.add_resource(FreeRideCampaignResource, '/api/v1/free_ride_campaign', '/api/v1/free_ride_campaign/', endpoint='free_ride_campaign_endpoint')
 
     # Notification routes
     api.add_resource(NotificationResource, '/api/v1/notification', '/api/v1/notification/', endpoint='single_notification')
+    api.add_resource(NotificationHistoryResource, '/api/v1/notification_history', '/api/v1/notification_history/', endpoint='notification_history')
+    api.add_resource(NotificationBroadcastResource, '/api/v1/notification_broadcast', '/api/v1/notification_broadcast/', endpoint='notification_broadcast')
 
     # Forgot Password routes
     api.add_resource(ForgotPasswordResource, '/api/v1/forgot_password', '/api/v1/forgot_password/', endpoint='forgot_password')
@@ -122,6 +163,9 @@ def create_flask_app(environment):
     # School routes
     api.add_resource(SchoolResource, '/api/v1/all_schools', '/api/v1/all_schools/', endpoint='all_schools')
 
+    # Rating routes
+    api.add_resource(RatingResource, '/api/v1/rating', '/api/v1/rating/', endpoint='rating_endpoint')
+
 
     # handle default 404 exceptions with a custom response
     @app.errorhandler(404)
@@ -161,5 +205,5 @@ def create_flask_app(environment):
 
     return app
 
-# enable flask commands
+# the one app of the process, served by gunicorn and used by manage.py
 app = create_flask_app(os.getenv("FLASK_CONFIG"))
@@ -1,31 +1,44 @@
 import os
 import logging
 
+from datetime import datetime
+
 from flask_script import Manager, Server, prompt_bool, Shell
 from flask_migrate import MigrateCommand
 from logging.handlers import RotatingFileHandler
 from sqlalchemy.exc import SQLAlchemyError
 
-from main import create_flask_app
+from main import app
 
 try:
     from api.helper.default_data import (
         create_user, create_default_user_types, create_percentage_price,
         create_wallet, create_admission_type, create_icon, create_school
     )
-    from api.models import db, UserType, User, Wallet
+    from api.helper.forgot_password_helper import purge_forgot_passwords
+    from api.helper.notification_helper import archive_notifications, compact_notifications
+    from api.helper.payout_helper import run_payout
+    from api.helper.free_ride_helper import (
+        rebuild_ride_counters, get_campaign_recipients, issue_campaign_free_rides
+    )
+    from api.helper.school_helper import get_school
+    from api.models import db, UserType, User, Wallet, Icon
 except ImportError:
     from moov_backend.api.helper.default_data import (
         create_user, create_default_user_types, create_percentage_price,
         create_wallet, create_admission_type, create_icon, create_school
     )
-    from moov_backend.api.models import db, UserType, User, Wallet
+    from moov_backend.api.helper.forgot_password_helper import purge_forgot_passwords
+    from moov_backend.api.helper.notification_helper import archive_notifications, compact_notifications
+    from moov_backend.api.helper.payout_helper import run_payout
+    from moov_backend.api.helper.free_ride_helper import (
+        rebuild_ride_counters, get_campaign_recipients, issue_campaign_free_rides
+    )
+    from moov_backend.api.helper.school_helper import get_school
+    from moov_backend.api.models import db, UserType, User, Wallet, Icon
 
 
 environment = os.getenv("FLASK_CONFIG")
-app = create_flask_app(environment)
-
-app.secret_key = os.getenv("APP_SECRET")
 
 port = int(os.environ.get('PORT', 5000))
 server = Server(host="0.0.0.0", port=port)
@@ -121,6 +134,132 @@ def seed_default_data(prompt=True):
         print("\n\n\tAborting... Invalid environment '{}'.\n\n"
               .format(environment))
 
+@manager.command
+def driver_payout(threshold=None, output_file=None):
+    """Writes the bank-upload payout file and debits the paid wallets"""
+    threshold = float(threshold or app.config['PAYOUT_THRESHOLD'])
+    output_file = output_file or "payout_{0}.csv".format(datetime.utcnow().strftime("%Y%m%d%H%M%S"))
+
+    if not prompt_bool("\n\nPay out every driver, school and car owner wallet holding N{0} or more?".format(threshold)):
+        print("\n\n\tAborting...\n\n\tAborted\n\n")
+        return
+
+    try:
+        payout = run_payout(
+                    output_file=output_file,
+                    threshold=threshold,
+                    batch_size=app.config['PAYOUT_BATCH_SIZE']
+                )
+    except (SQLAlchemyError, IOError) as error:
+        print("\n\n\tThe error below occured when running the payout, no wallet was debited\n\n\n" + str(error) + "\n\n")
+        return
+
+    print("\n\n\tPaid out N{0} to {1} wallet(s), {2} wallet(s) spent below the amount were left out"
+          "\n\n\tBank upload file: {3}\n\n".format(
+        payout["total_amount"], payout["payees"], payout["skipped"], payout["output_file"]))
+
+@manager.command
+def rebuild_ride_counter():
+    """Rebuilds the free ride counters from the ride transaction history"""
+    try:
+        ride_counters = rebuild_ride_counters()
+    except SQLAlchemyError as error:
+        print("\n\n\tThe error below occured when rebuilding the ride counters\n\n\n" + str(error) + "\n\n")
+        return
+
+    print("\n\n\tRebuilt {0} ride counter(s)\n\n".format(ride_counters))
+
+@manager.option('-c', '--campaign', dest='campaign', default=None, help='Name of the campaign, a user gets one token per campaign')
+@manager.option('-s', '--school', dest='school', default=None, help='Name of the school whose students get a token')
+@manager.option('-e', '--emails', dest='emails', default=None, help='Comma separated emails of the users that get a token')
+@manager.option('-d', '--description', dest='description', default="Free ride campaign", help='Description saved on every token')
+def free_ride_campaign(campaign, school, emails, description):
+    """Issues a free ride token to every student of a school or to a list of users"""
+    if not campaign:
+        print("\n\n\tProvide the --campaign name. Aborting...\n\n\tAborted\n\n")
+        return
+    if bool(school) == bool(emails):
+        print("\n\n\tProvide either --school or --emails. Aborting...\n\n\tAborted\n\n")
+        return
+
+    if school:
+        _school = get_school(school.lower())
+        if not _school:
+            print("\n\n\t{0} (school) does not exist. Aborting...\n\n\tAborted\n\n".format(school))
+            return
+        user_ids = get_campaign_recipients(school_id=_school.id)
+    else:
+        user_ids = get_campaign_recipients(emails=[email.strip() for email in emails.split(",")])
+
+    moov_user = User.get_by_email(os.environ.get("MOOV_EMAIL"))
+    if not moov_user:
+        print("\n\n\tMoov user does not exist. Aborting...\n\n\tAborted\n\n")
+        return
+    transaction_icon = Icon.query.filter(Icon.operation_type=="free_ride_operation").first()
+
+    if not prompt_bool("\n\nIssue a free ride token to {0} user(s)?".format(len(user_ids))):
+        print("\n\n\tAborting...\n\n\tAborted\n\n")
+        return
+
+    def progress(issued, done):
+        print("\t{0}/{1} users done, {2} free ride token(s) issued".format(done, len(user_ids), issued))
+
+    try:
+        issued = issue_campaign_free_rides(
+                    user_ids=user_ids,
+                    campaign=campaign,
+                    description=description,
+                    sender_id=moov_user.id,
+                    transaction_icon_id=transaction_icon.id if transaction_icon else None,
+                    chunk_size=app.config['CAMPAIGN_CHUNK_SIZE'],
+                    progress=progress
+                )
+    except SQLAlchemyError as error:
+        print("\n\n\tThe error below occured when issuing the free ride tokens, the tokens issued before it"
+              " are kept and running the campaign again issues the rest\n\n\n" + str(error) + "\n\n")
+        return
+
+    print("\n\n\tIssued {0} free ride token(s), users who already had a {1} token were skipped\n\n".format(issued, campaign))
+
+@manager.command
+def archive_notification(retention_days=None):
+    """Moves notifications older than the retention period into the archive"""
+    retention_days = int(retention_days or app.config['NOTIFICATION_RETENTION_DAYS'])
+
+    def progress(archived):
+        print("\t{0} notification(s) archived".format(archived))
+
+    try:
+        archived = archive_notifications(
+                        retention_days=retention_days,
+                        chunk_size=app.config['NOTIFICATION_ARCHIVE_CHUNK_SIZE'],
+                        progress=progress
+                    )
+        if archived:
+            compact_notifications()
+    except SQLAlchemyError as error:
+        print("\n\n\tThe error below occured when archiving the notifications\n\n\n" + str(error) + "\n\n")
+        return
+
+    print("\n\n\tArchived {0} notification(s) older than {1} day(s)\n\n".format(archived, retention_days))
+
+@manager.command
+def purge_forgot_password():
+    """Deletes used and expired temporary passwords and their unsent mail, meant to run on a schedule"""
+    def progress(purged):
+        print("\t{0} temporary password(s) and mail deleted".format(purged))
+
+    try:
+        purged = purge_forgot_passwords(
+                    chunk_size=app.config['FORGOT_PASSWORD_PURGE_CHUNK_SIZE'],
+                    progress=progress
+                )
+    except SQLAlchemyError as error:
+        print("\n\n\tThe error below occured when purging the temporary passwords\n\n\n" + str(error) + "\n\n")
+        return
+
+    print("\n\n\tDeleted {0} used or expired temporary password(s) and unsent mail\n\n".format(purged))
+
 # initialize the log handler
 handler = RotatingFileHandler('errors.log', maxBytes=10000000, backupCount=5)
 formatter = logging.Formatter( "%(asctime)s | %(pathname)s:%(lineno)d | %(funcName)s | %(levelname)s | %(message)s ")
@@ -0,0 +1,27 @@
+"""empty message
+
+Revision ID: 3f6b2a91c4d7
+Revises: b89f1e4909eb
+Create Date: 2018-05-21 10:14:52.416230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b2a91c4d7'
+down_revision = 'b89f1e4909eb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ALTER TYPE ... ADD VALUE cannot run inside a transaction block
+    op.execute('COMMIT')
+    op.execute("ALTER TYPE operationtype ADD VALUE IF NOT EXISTS 'payout_type'")
+
+
+def downgrade():
+    # postgres does not support removing a value from an enum type
+    pass
@@ -0,0 +1,161 @@
+"""empty message
+
+Revision ID: 4b8d2e6f1a90
+Revises: 7e3a9c51d06f
+Create Date: 2018-06-16 11:04:52.117384
+
+"""
+import re
+
+from string import Formatter
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8d2e6f1a90'
+down_revision = '7e3a9c51d06f'
+branch_labels = None
+depends_on = None
+
+
+# a copy of the templates at the time of this migration, so later changes
+# to the registry do not change what it converts
+TEMPLATES = [
+    ("transfer_sent", u"Your wallet has been debited with N{amount}, with a transaction charge of N{charge} by {name}"),
+    ("ride_requested", u"{name} ({email}) has requested to ride with you from {location} to {destination}"),
+    ("wallet_credited", u"Your wallet has been credited with N{amount} by {name}"),
+    ("ride_fare_paid", u"Your wallet has been debited with N{amount} for your ride fare with {name}"),
+    ("wallet_loaded", u"Your wallet has been credited with N{amount}"),
+    ("free_token_used", u"Your transaction costs N0, your free token {token} was used"),
+    ("free_ride_given", u"Your transaction with {name} was a free ride"),
+    ("free_ride_earned", u"You have earned a free ride token '{token}'"),
+    ("free_ride_shared", u"Congrats, you got a free ride token {token} for sharing our app"),
+    ("free_ride_campaign", u"Congrats, you got a free ride token {token}"),
+    ("ride_rejected", u"{name} has rejected your request for a ride"),
+    ("ride_accepted", u"{name} has accepted your request for a ride"),
+    ("welcome", u"Welcome to MOOV app."),
+    ("driver_registered", u"Thank you for registering to be a MOOV driver. Your request is waiting approval, we will get back to you soon"),
+    ("password_reset", u"You reset your password")
+]
+AMOUNT_PARAMS = ["amount", "charge"]
+CHUNK_SIZE = 1000
+
+notification_tables = [
+    sa.table(table_name,
+        sa.column('id', sa.String),
+        sa.column('message', sa.String),
+        sa.column('template', sa.String),
+        sa.column('params', sa.JSON)
+    ) for table_name in ['Notification', 'NotificationArchive']
+]
+
+
+def compile_template(template):
+    pattern = ""
+    for literal, field, _, _ in Formatter().parse(template):
+        # older messages were split over lines in the source, so any run
+        # of whitespace matches a space
+        pattern += r"\s+".join(re.escape(word) for word in literal.split(" "))
+        if field:
+            if field in AMOUNT_PARAMS:
+                pattern += r"(?P<{0}>-?[0-9]+(?:\.[0-9]+)?(?:e[-+]?[0-9]+)?)".format(field)
+            else:
+                pattern += r"(?P<{0}>.*?)".format(field)
+    return re.compile("^" + pattern + "$", re.DOTALL)
+
+def parse_message(compiled_templates, message):
+    for template, pattern in compiled_templates:
+        match = pattern.match(message.strip())
+        if match:
+            params = match.groupdict()
+            for field in AMOUNT_PARAMS:
+                if field in params:
+                    value = params[field]
+                    params[field] = float(value) if "." in value or "e" in value else int(value)
+            return template, params or None
+    return None, None
+
+def convert_messages(table):
+    connection = op.get_bind()
+    compiled_templates = [(template, compile_template(text)) for template, text in TEMPLATES]
+    last_id = ""
+    while True:
+        rows = connection.execute(
+                    sa.select([table.c.id, table.c.message]).
+                        where(sa.and_(
+                            table.c.template==None,
+                            table.c.message!=None,
+                            table.c.id>last_id
+                        )).
+                        order_by(table.c.id).limit(CHUNK_SIZE)
+                ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        converted = []
+        for row in rows:
+            template, params = parse_message(compiled_templates, row.message)
+            if template:
+                converted.append({"notification_id": row.id, "template": template, "params": params})
+        if converted:
+            # messages that match no template are kept as they are
+            connection.execute(
+                table.update().
+                    where(table.c.id==sa.bindparam("notification_id")).
+                    values(
+                        template=sa.bindparam("template"),
+                        params=sa.bindparam("params"),
+                        message=None
+                    ),
+                converted
+            )
+
+def render_messages(table):
+    connection = op.get_bind()
+    templates = dict(TEMPLATES)
+    last_id = ""
+    while True:
+        rows = connection.execute(
+                    sa.select([table.c.id, table.c.template, table.c.params]).
+                        where(sa.and_(table.c.template!=None, table.c.id>last_id)).
+                        order_by(table.c.id).limit(CHUNK_SIZE)
+                ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        connection.execute(
+            table.update().
+                where(table.c.id==sa.bindparam("notification_id")).
+                values(message=sa.bindparam("message")),
+            [{
+                "notification_id": row.id,
+                "message": templates.get(row.template, row.template).format(**(row.params or {}))
+            } for row in rows]
+        )
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column('Notification', sa.Column('params', sa.JSON(), nullable=True))
+    op.add_column('Notification', sa.Column('template', sa.String(length=32), nullable=True))
+    op.add_column('NotificationArchive', sa.Column('params', sa.JSON(), nullable=True))
+    op.add_column('NotificationArchive', sa.Column('template', sa.String(length=32), nullable=True))
+    # ### end Alembic commands ###
+
+    for table in notification_tables:
+        convert_messages(table)
+
+
+def downgrade():
+    for table in notification_tables:
+        render_messages(table)
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_column('NotificationArchive', 'template')
+    op.drop_column('NotificationArchive', 'params')
+    op.drop_column('Notification', 'template')
+    op.drop_column('Notification', 'params')
+    # ### end Alembic commands ###
@@ -0,0 +1,28 @@
+"""empty message
+
+Revision ID: 5d0e8c3b7a14
+Revises: a71c5e0d92b3
+Create Date: 2018-05-28 09:41:36.205118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d0e8c3b7a14'
+down_revision = 'a71c5e0d92b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ALTER TYPE ... ADD VALUE cannot run inside a transaction block
+    op.execute('COMMIT')
+    op.execute("ALTER TYPE freeridetype ADD VALUE IF NOT EXISTS 'ride_type'")
+    op.execute("ALTER TYPE freeridetype ADD VALUE IF NOT EXISTS 'campaign_type'")
+
+
+def downgrade():
+    # postgres does not support removing a value from an enum type
+    pass
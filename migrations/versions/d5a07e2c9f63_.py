@@ -0,0 +1,44 @@
+"""empty message
+
+Revision ID: d5a07e2c9f63
+Revises: 4b8d2e6f1a90
+Create Date: 2018-06-23 10:41:18.502947
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a07e2c9f63'
+down_revision = '4b8d2e6f1a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # emails are stored stripped and lower cased so lookups can use the
+    # unique email index. An email whose normalized form is already taken
+    # by another row is left as it is and reported
+    for table_name in ['User', 'SchoolInfo']:
+        connection = op.get_bind()
+        duplicates = connection.execute(sa.text(
+            'SELECT email FROM "{0}" AS t WHERE email <> lower(trim(email)) AND EXISTS ('
+            'SELECT 1 FROM "{0}" AS other WHERE other.id <> t.id '
+            'AND lower(trim(other.email)) = lower(trim(t.email)))'.format(table_name)
+        )).fetchall()
+        for duplicate in duplicates:
+            print("\n\t{0} email {1} was not normalized, it is a duplicate\n".format(
+                table_name, duplicate.email))
+
+        op.execute(
+            'UPDATE "{0}" SET email = lower(trim(email)) '
+            'WHERE email <> lower(trim(email)) AND NOT EXISTS ('
+            'SELECT 1 FROM "{0}" AS other WHERE other.id <> "{0}".id '
+            'AND lower(trim(other.email)) = lower(trim("{0}".email)))'.format(table_name)
+        )
+
+
+def downgrade():
+    # the original casing of emails is not kept, normalized emails stay
+    pass
@@ -0,0 +1,55 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import sqlite3
+import tempfile
+
+try:
+    from test.base import BaseTestCase
+    from api.auth.rate_limit import RateLimiter, SQLiteBucketStore
+except ImportError:
+    from moov_backend.test.base import BaseTestCase
+    from moov_backend.api.auth.rate_limit import RateLimiter, SQLiteBucketStore
+
+
+class SQLiteRateLimitTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(SQLiteRateLimitTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "rate_limit.sqlite")
+        self.app.config["RATE_LIMIT_STORAGE"] = self.path
+
+    def tearDown(self):
+        self.app.config.pop("RATE_LIMIT_STORAGE")
+        shutil.rmtree(self.directory)
+        super(SQLiteRateLimitTestCase, self).tearDown()
+
+    def rate_limiter(self):
+        rate_limiter = RateLimiter(self.app)
+        rate_limiter.limits = {"login": {"ip": (1, 3600)}}
+        return rate_limiter
+
+    def test_buckets_are_kept_when_the_app_is_initialized_again(self):
+        self.assertIsNone(self.rate_limiter().hit("login", [("ip", "10.0.0.1")]))
+
+        # e.g. a manage.py command starting while the server runs
+        self.assertIsNotNone(self.rate_limiter().hit("login", [("ip", "10.0.0.1")]))
+
+    def test_a_locked_store_lets_the_request_through(self):
+        rate_limiter = self.rate_limiter()
+        rate_limiter.store = SQLiteBucketStore(self.path, timeout=0.1)
+        self.assertIsNone(rate_limiter.hit("login", [("ip", "10.0.0.1")]))
+
+        # another process holds the write lock past the timeout
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.assertIsNone(rate_limiter.hit("login", [("ip", "10.0.0.1")]))
+        finally:
+            connection.execute("ROLLBACK")
+            connection.close()
+
+        # the store works again once the lock is released
+        self.assertIsNotNone(rate_limiter.hit("login", [("ip", "10.0.0.1")]))
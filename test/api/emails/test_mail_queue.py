@@ -0,0 +1,198 @@
+from __future__ import absolute_import
+
+import copy
+import smtpd
+import socket
+import asyncore
+import threading
+
+from datetime import datetime, timedelta
+
+try:
+    from test.base import BaseTestCase
+    from api.emails.mail_queue import mail_queue
+    from api.helper.forgot_password_helper import purge_forgot_passwords
+    from api.models import OutboundMail, save_all
+except ImportError:
+    from moov_backend.test.base import BaseTestCase
+    from moov_backend.api.emails.mail_queue import mail_queue
+    from moov_backend.api.helper.forgot_password_helper import purge_forgot_passwords
+    from moov_backend.api.models import OutboundMail, save_all
+
+
+class SMTPSink(smtpd.SMTPServer):
+    '''
+    Collects the mail sent to it, served from a thread
+    '''
+
+    def __init__(self):
+        smtpd.SMTPServer.__init__(self, ("127.0.0.1", 0), None)
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        self.messages = []
+        self.thread = threading.Thread(target=asyncore.loop, kwargs={"timeout": 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+
+    def handle_accept(self):
+        self.connections += 1
+        smtpd.SMTPServer.handle_accept(self)
+
+    def process_message(self, peer, mailfrom, rcpttos, data):
+        self.messages.append((rcpttos, data))
+
+    def stop(self):
+        asyncore.close_all()
+        self.thread.join(5)
+
+
+def closed_port():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class MailQueueTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(MailQueueTestCase, self).setUp()
+        self.sink = SMTPSink()
+        self.mail_state = self.app.extensions["mail"]
+        self.max_attempts = mail_queue.max_attempts
+        self.use_smtp_server(self.sink.port)
+
+    def tearDown(self):
+        mail_queue.close_connection()
+        mail_queue.max_attempts = self.max_attempts
+        mail_queue._secrets.clear()
+        self.app.extensions["mail"] = self.mail_state
+        self.sink.stop()
+        super(MailQueueTestCase, self).tearDown()
+
+    def use_smtp_server(self, port):
+        mail_queue.close_connection()
+        state = copy.copy(self.mail_state)
+        state.server = "127.0.0.1"
+        state.port = port
+        state.use_ssl = state.use_tls = False
+        state.username = state.password = None
+        state.suppress = False
+        self.app.extensions["mail"] = state
+
+    def queue_undeliverable_mail(self):
+        self.use_smtp_server(closed_port())
+        mail_queue.put("student@test.com", "forgot_password", {
+            "firstname": "student",
+            "password": "temp_password"
+        })
+        return OutboundMail.query.one()
+
+    def test_mail_is_sent_over_one_connection(self):
+        for index in range(3):
+            mail_queue.put("student{0}@test.com".format(index), "forgot_password", {
+                "firstname": "student",
+                "password": "temp_password{0}".format(index)
+            })
+
+        self.assertEqual(self.sink.connections, 1)
+        self.assertEqual([recipients for recipients, _ in self.sink.messages],
+                         [["student0@test.com"], ["student1@test.com"], ["student2@test.com"]])
+        self.assertIn("temp_password2", self.sink.messages[2][1])
+        self.assertEqual(OutboundMail.query.count(), 0)
+
+    def test_mail_that_fails_to_render_does_not_hold_back_the_queue(self):
+        outbound_mail = self.queue_undeliverable_mail()
+        outbound_mail.send_after = datetime.utcnow()
+        save_all([outbound_mail, OutboundMail(
+            recipient="broken@test.com",
+            subject="Forgot Password",
+            template="unknown_template",
+            send_after=datetime.utcnow() - timedelta(minutes=1)
+        )])
+
+        self.use_smtp_server(self.sink.port)
+        self.assertEqual(mail_queue.send_pending(), 1)
+        self.assertEqual([recipients for recipients, _ in self.sink.messages], [["student@test.com"]])
+        broken_mail = OutboundMail.query.one()
+        self.assertEqual(broken_mail.recipient, "broken@test.com")
+        self.assertEqual(broken_mail.attempts, 1)
+        self.assertIn("KeyError", broken_mail.last_error)
+        self.assertGreater(broken_mail.send_after, datetime.utcnow())
+
+    def test_put_only_sends_the_mail_it_queued(self):
+        waiting_mail = self.queue_undeliverable_mail()
+        waiting_mail.send_after = datetime.utcnow()
+        save_all([waiting_mail])
+
+        self.use_smtp_server(self.sink.port)
+        mail_queue.put("other@test.com", "forgot_password", {
+            "firstname": "other",
+            "password": "temp_password"
+        })
+
+        self.assertEqual([recipients for recipients, _ in self.sink.messages], [["other@test.com"]])
+        waiting_mail = OutboundMail.query.one()
+        self.assertEqual((waiting_mail.recipient, waiting_mail.attempts), ("student@test.com", 1))
+
+    def test_mail_is_retried_when_the_server_is_down(self):
+        outbound_mail = self.queue_undeliverable_mail()
+
+        self.assertEqual(outbound_mail.attempts, 1)
+        self.assertIsNotNone(outbound_mail.last_error)
+        self.assertGreater(outbound_mail.send_after, datetime.utcnow())
+
+        outbound_mail.send_after = datetime.utcnow()
+        save_all([outbound_mail])
+        self.use_smtp_server(self.sink.port)
+        self.assertEqual(mail_queue.send_pending(), 1)
+        self.assertIn("temp_password", self.sink.messages[0][1])
+        self.assertEqual(OutboundMail.query.count(), 0)
+
+    def test_temporary_password_is_not_saved(self):
+        outbound_mail = self.queue_undeliverable_mail()
+
+        self.assertEqual(outbound_mail.params, {"firstname": "student"})
+
+    def test_mail_with_secret_params_of_another_process_is_not_sent(self):
+        save_all([OutboundMail(
+            recipient="student@test.com",
+            subject="Forgot Password",
+            template="forgot_password",
+            params={"firstname": "student"}
+        )])
+
+        self.assertEqual(mail_queue.send_pending(), 0)
+        self.assertEqual(self.sink.messages, [])
+        self.assertEqual(OutboundMail.query.one().attempts, 0)
+
+    def test_mail_out_of_attempts_drops_its_params(self):
+        mail_queue.max_attempts = 1
+        outbound_mail = self.queue_undeliverable_mail()
+
+        self.assertEqual(outbound_mail.attempts, 1)
+        self.assertIsNone(outbound_mail.params)
+        self.assertEqual(mail_queue._secrets, {})
+
+    def test_purge_deletes_forgot_password_mail_left_unsent(self):
+        save_all([
+            OutboundMail(
+                recipient="old@test.com",
+                subject="Forgot Password",
+                template="forgot_password",
+                params={"firstname": "old"},
+                created_at=datetime.utcnow() - timedelta(days=2)
+            ),
+            OutboundMail(
+                recipient="new@test.com",
+                subject="Forgot Password",
+                template="forgot_password",
+                params={"firstname": "new"},
+                send_after=datetime.utcnow() + timedelta(minutes=2)
+            )
+        ])
+
+        self.assertEqual(purge_forgot_passwords(), 1)
+        self.assertEqual([outbound_mail.recipient for outbound_mail in OutboundMail.query],
+                         ["new@test.com"])
@@ -0,0 +1,32 @@
+from __future__ import absolute_import
+
+import json
+import unittest
+
+try:
+    from api.helper.json_codec import CODECS
+except ImportError:
+    from moov_backend.api.helper.json_codec import CODECS
+
+
+@unittest.skipUnless("ujson" in CODECS, "ujson is not installed")
+class UJSONCodecTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dumps, self.loads = CODECS["ujson"]
+
+    def test_floats_keep_their_precision(self):
+        for value in [0.1 + 0.2, 123.45678901234568, 1e-20, 1234.5 + 1 / 7.0]:
+            self.assertEqual(self.loads(self.dumps({"amount": value})), {"amount": value})
+
+    def test_json_reads_what_ujson_rejects(self):
+        self.assertEqual(self.loads("18446744073709551616"), 18446744073709551616)
+        self.assertNotEqual(self.loads("NaN"), self.loads("NaN"))
+
+    def test_invalid_json_still_raises(self):
+        self.assertRaises(ValueError, self.loads, '{"amount": ')
+
+    def test_text_matches_json(self):
+        document = u'{"name": "caf\\u00e9/", "rides": [true, false, null]}'
+        self.assertEqual(self.loads(document), json.loads(document))
+        self.assertEqual(json.loads(self.dumps(json.loads(document))), json.loads(document))
@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+
+import os
+import csv
+import shutil
+import tempfile
+
+try:
+    from test.base import BaseTestCase
+    from api.helper import payout_helper
+    from api.models import db, Wallet, Transaction, DriverInfo, OperationType, save_all
+except ImportError:
+    from moov_backend.test.base import BaseTestCase
+    from moov_backend.api.helper import payout_helper
+    from moov_backend.api.models import db, Wallet, Transaction, DriverInfo, OperationType, save_all
+
+
+class PayoutTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(PayoutTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.directory, "payout.csv")
+        self.get_payable_wallets = payout_helper.get_payable_wallets
+
+    def tearDown(self):
+        payout_helper.get_payable_wallets = self.get_payable_wallets
+        shutil.rmtree(self.directory)
+        super(PayoutTestCase, self).tearDown()
+
+    def create_driver(self, email, wallet_amount):
+        driver = self.create_user("driver", email, wallet_amount=wallet_amount)
+        save_all([DriverInfo(driver_id=driver.id, bank_name="bank", account_number="0123456789")])
+        return driver
+
+    def wallet_amount(self, user):
+        db.session.expire_all()
+        return Wallet.query.filter(Wallet.user_id==user.id).one().wallet_amount
+
+    def paid_emails(self):
+        with open(self.output_file) as upload_file:
+            return [row["email"] for row in csv.DictReader(upload_file)]
+
+    def test_wallets_at_the_threshold_are_paid_their_balance(self):
+        paid = self.create_driver("paid@test.com", 1500.257)
+        unpaid = self.create_driver("unpaid@test.com", 999.99)
+
+        payout = payout_helper.run_payout(self.output_file, threshold=1000.0)
+
+        self.assertEqual((payout["payees"], payout["skipped"], payout["total_amount"]), (1, 0, 1500.25))
+        self.assertEqual(self.paid_emails(), ["paid@test.com"])
+        self.assertAlmostEqual(self.wallet_amount(paid), 0.007)
+        self.assertEqual(self.wallet_amount(unpaid), 999.99)
+        transaction = Transaction.query.filter(Transaction.type_of_operation==OperationType.payout_type).one()
+        self.assertEqual(transaction.sender_amount_before_transaction, 1500.257)
+
+    def test_wallet_spent_after_it_was_selected_is_left_out(self):
+        spender = self.create_driver("spender@test.com", 2000.0)
+        saver = self.create_driver("saver@test.com", 2000.0)
+
+        def spend_after_select(threshold, batch_size):
+            payees = list(self.get_payable_wallets(threshold, batch_size))
+            # the spend lands between the balance read and the debit
+            db.session.execute(Wallet.__table__.update().
+                               where(Wallet.__table__.c.user_id==spender.id).
+                               values(wallet_amount=500.0))
+            return payees
+
+        payout_helper.get_payable_wallets = spend_after_select
+        payout = payout_helper.run_payout(self.output_file, threshold=1000.0)
+
+        self.assertEqual((payout["payees"], payout["skipped"]), (1, 1))
+        self.assertEqual(self.paid_emails(), ["saver@test.com"])
+        self.assertEqual(self.wallet_amount(spender), 500.0)
+        self.assertEqual(self.wallet_amount(saver), 0.0)
+
@@ -0,0 +1,32 @@
+from __future__ import absolute_import
+
+try:
+    from test.base import BaseTestCase
+    from api.helper.notification_helper import save_notifications
+except ImportError:
+    from moov_backend.test.base import BaseTestCase
+    from moov_backend.api.helper.notification_helper import save_notifications
+
+
+class BasicInfoQueryCountTestCase(BaseTestCase):
+
+    def test_user_and_notifications_are_loaded_in_two_queries(self):
+        student = self.create_user("student", "student@test.com", wallet_amount=50.0)
+        save_notifications([{
+            "recipient_id": student.id,
+            "sender_id": self.moov.id,
+            "template": "wallet_loaded",
+            "params": {"amount": amount}
+        } for amount in range(5)])
+        headers = self.auth_headers(student)
+
+        # the icon urls come from the icon cache once it is loaded
+        self.client.get("/api/v1/basic_info", headers=headers)
+        response, statements = self.count_request_queries(
+                                    lambda: self.client.get("/api/v1/basic_info", headers=headers))
+        self.assert200(response)
+        data = response.json["data"]
+        self.assertEqual(data["user"]["wallet_amount"], 50.0)
+        self.assertEqual(len(data["notifications"]), 5)
+        self.assertTrue(all(notification["icon"] for notification in data["notifications"]))
+        self.assertEqual(len(statements), 2)
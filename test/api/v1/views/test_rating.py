@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+try:
+    from test.base import BaseTestCase
+    from api.models import db, User, RateMe, RatingsType
+except ImportError:
+    from moov_backend.test.base import BaseTestCase
+    from moov_backend.api.models import db, User, RateMe, RatingsType
+
+
+class RatingTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(RatingTestCase, self).setUp()
+        self.driver = self.create_user("driver", "driver@test.com")
+        self.student = self.create_user("student", "student@test.com")
+        self.other_student = self.create_user("student", "other_student@test.com")
+
+    def rate(self, rater, email, rating):
+        return self.post_json("/api/v1/rating", {"user_email": email, "rating": rating}, rater)
+
+    def ratings_of(self, user):
+        db.session.expire_all()
+        user = User.query.get(user.id)
+        return user.ratings, user.ratings_sum, user.ratings_count
+
+    def test_first_rating_is_saved(self):
+        response = self.rate(self.student, "driver@test.com", 4)
+
+        self.assertStatus(response, 201)
+        self.assertEqual(response.json["data"]["ratings"], 4)
+        self.assertEqual(response.json["data"]["ratings_count"], 1)
+        rate_me = RateMe.query.one()
+        self.assertEqual((rate_me.ratee_id, rate_me.rater_id, rate_me.rating_type),
+                         (self.driver.id, self.student.id, RatingsType.four))
+        self.assertEqual(self.ratings_of(self.driver), (4, 4, 1))
+
+    def test_rating_again_updates_the_rating(self):
+        self.rate(self.student, "driver@test.com", 2)
+        response = self.rate(self.student, "driver@test.com", 5)
+
+        self.assertStatus(response, 201)
+        self.assertEqual(RateMe.query.count(), 1)
+        self.assertEqual(RateMe.query.one().rating_type, RatingsType.five)
+        self.assertEqual(self.ratings_of(self.driver), (5, 5, 1))
+
+    def test_ratings_of_several_raters_are_averaged(self):
+        self.rate(self.student, "driver@test.com", 5)
+        self.rate(self.other_student, "driver@test.com", 2)
+
+        # 3.5 rounds to 4
+        self.assertEqual(self.ratings_of(self.driver), (4, 7, 2))
+
+    def test_user_cannot_rate_themselves(self):
+        response = self.rate(self.driver, "driver@test.com", 5)
+
+        self.assert400(response)
+        self.assertEqual(response.json["data"]["message"], "You cannot rate yourself")
+        self.assertEqual(RateMe.query.count(), 0)
+        self.assertEqual(self.ratings_of(self.driver), (None, 0, 0))
+
+    def test_unknown_user_cannot_be_rated(self):
+        response = self.rate(self.student, "nobody@test.com", 5)
+
+        self.assert400(response)
+        self.assertEqual(response.json["data"]["message"], "User email is not valid")
+        self.assertEqual(RateMe.query.count(), 0)
+
+    def test_rating_must_be_from_one_to_five(self):
+        for rating in [0, 6, 2.5, "5", True]:
+            response = self.rate(self.student, "driver@test.com", rating)
+            self.assert400(response)
+        self.assertEqual(RateMe.query.count(), 0)
@@ -0,0 +1,149 @@
+from __future__ import absolute_import
+
+import json
+import threading
+
+try:
+    from test.base import BaseTestCase
+    from api.generator.free_ride_token_generator import generate_free_ride_token
+    from api.helper.free_ride_helper import save_free_ride_token
+    from api.models import FreeRide, FreeRideType, Transaction, OperationType
+except ImportError:
+    from moov_backend.test.base import BaseTestCase
+    from moov_backend.api.generator.free_ride_token_generator import generate_free_ride_token
+    from moov_backend.api.helper.free_ride_helper import save_free_ride_token
+    from moov_backend.api.models import FreeRide, FreeRideType, Transaction, OperationType
+
+
+# parallel requests redeeming one token
+CONCURRENT_RIDES = 10
+
+
+class FreeRideTokenRedemptionTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(FreeRideTokenRedemptionTestCase, self).setUp()
+        self.student = self.create_user("student", "student@test.com", wallet_amount=500.0)
+        self.other_student = self.create_user("student", "other_student@test.com", wallet_amount=500.0)
+        self.driver = self.create_user("driver", "driver@test.com")
+
+        self.token = generate_free_ride_token()
+        save_free_ride_token(
+            free_ride_type=FreeRideType.social_share_type,
+            token=self.token,
+            description="test token",
+            user_id=self.student.id
+        )
+
+    def ride_with_token(self, user, client=None):
+        return self.post_json("/api/v1/transaction", {
+            "type_of_operation": "ride_fare",
+            "cost_of_transaction": 100,
+            "receiver_email": "driver@test.com",
+            "school_name": "default_school",
+            "free_token": self.token
+        }, user=user, client=client)
+
+    def free_rides(self):
+        return Transaction.query.filter(
+                    Transaction.type_of_operation==OperationType.ride_type,
+                    Transaction.cost_of_transaction==0
+                ).count()
+
+    def test_token_is_redeemed_once(self):
+        response = self.ride_with_token(self.student)
+        self.assertStatus(response, 201)
+
+        response = self.ride_with_token(self.student)
+        self.assert400(response)
+        self.assertEqual(response.json["data"]["message"], "{0} has been used".format(self.token))
+        self.assertEqual(self.free_rides(), 1)
+
+    def test_concurrent_redemptions_redeem_the_token_once(self):
+        start = threading.Event()
+        status_codes = []
+        # the requests only share the database, not the test's session
+        body = json.dumps({
+            "type_of_operation": "ride_fare",
+            "cost_of_transaction": 100,
+            "receiver_email": "driver@test.com",
+            "school_name": "default_school",
+            "free_token": self.token
+        })
+        headers = self.auth_headers(self.student)
+
+        def ride():
+            client = self.app.test_client()
+            start.wait()
+            response = client.post("/api/v1/transaction", data=body, headers=headers)
+            status_codes.append(response.status_code)
+
+        threads = [threading.Thread(target=ride) for _ in range(CONCURRENT_RIDES)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(status_codes), [201] + [400] * (CONCURRENT_RIDES - 1))
+        self.assertEqual(self.free_rides(), 1)
+        self.assertFalse(FreeRide.query.filter(FreeRide.token==self.token).one().token_status)
+
+    def test_token_of_another_user_is_not_redeemed(self):
+        response = self.ride_with_token(self.other_student)
+        self.assert404(response)
+        self.assertEqual(response.json["data"]["message"], "{0} is not a valid token".format(self.token))
+        self.assertEqual(self.free_rides(), 0)
+        self.assertTrue(FreeRide.query.filter(FreeRide.token==self.token).one().token_status)
+
+
+class TransactionQueryCountTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(TransactionQueryCountTestCase, self).setUp()
+        self.student = self.create_user("student", "student@test.com", wallet_amount=500.0)
+        self.driver = self.create_user("driver", "driver@test.com")
+        self.headers = self.auth_headers(self.student)
+
+    def post_transaction(self, data):
+        body = json.dumps(data)
+        return self.client.post("/api/v1/transaction", data=body, headers=self.headers)
+
+    def test_ride_fare_queries(self):
+        ride = {
+            "type_of_operation": "ride_fare",
+            "cost_of_transaction": 100,
+            "receiver_email": "driver@test.com",
+            "school_name": "default_school"
+        }
+        # the first ride loads the icon cache and starts the ride counter
+        self.assertStatus(self.post_transaction(ride), 201)
+
+        response, statements = self.count_request_queries(lambda: self.post_transaction(ride))
+        self.assertStatus(response, 201)
+        self.assertEqual(response.json["data"]["transaction"]["cost_of_transaction"], 100)
+        # 7 reads: the sender, moov and the driver, the school, its user and
+        # the car owner, the percentage prices, the ride count and the row
+        # lock on the sender, then the wallets, ride counter, notifications,
+        # their counters and the transaction are written
+        self.assertEqual(len([statement for statement in statements
+                              if statement.startswith("SELECT")]), 7)
+        self.assertEqual(len(statements), 13)
+
+    def test_transfer_queries(self):
+        transfer = {
+            "type_of_operation": "transfer",
+            "cost_of_transaction": 10,
+            "receiver_email": "driver@test.com"
+        }
+        # the first transfer loads the icon cache
+        self.assertStatus(self.post_transaction(transfer), 201)
+
+        response, statements = self.count_request_queries(lambda: self.post_transaction(transfer))
+        self.assertStatus(response, 201)
+        # the sender, moov and the driver and the transfer percentage price
+        # are read, then the wallets, notifications, their counters and the
+        # transaction are written
+        self.assertEqual(len([statement for statement in statements
+                              if statement.startswith("SELECT")]), 3)
+        self.assertEqual(len(statements), 7)
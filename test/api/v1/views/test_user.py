@@ -0,0 +1,83 @@
+from __future__ import absolute_import
+
+from werkzeug.security import generate_password_hash
+
+try:
+    from test.base import BaseTestCase
+    from api.helper.icon_helper import get_icon_id
+    from api.models import User, DriverInfo, Notification, save_all
+except ImportError:
+    from moov_backend.test.base import BaseTestCase
+    from moov_backend.api.helper.icon_helper import get_icon_id
+    from moov_backend.api.models import User, DriverInfo, Notification, save_all
+
+
+class UserQueryCountTestCase(BaseTestCase):
+
+    def test_student_is_loaded_in_one_query(self):
+        headers = self.auth_headers(self.create_user("student", "student@test.com"))
+
+        response, statements = self.count_request_queries(
+                                    lambda: self.client.get("/api/v1/user", headers=headers))
+        self.assert200(response)
+        self.assertEqual(response.json["data"]["user"]["school"], "default_school")
+        self.assertEqual(len(statements), 1)
+
+    def test_driver_is_loaded_in_one_query(self):
+        driver = self.create_user("driver", "driver@test.com")
+        save_all([DriverInfo(driver_id=driver.id, car_slots=4, available_car_slots=4)])
+        headers = self.auth_headers(driver)
+
+        response, statements = self.count_request_queries(
+                                    lambda: self.client.get("/api/v1/user", headers=headers))
+        self.assert200(response)
+        self.assertEqual(response.json["data"]["user"]["driver_info"]["car_slots"], 4)
+        self.assertEqual(len(statements), 1)
+
+
+class UserLoginTestCase(BaseTestCase):
+
+    def test_password_hashed_with_an_older_method_is_rehashed(self):
+        student = self.create_user("student", "student@test.com")
+        student._password = generate_password_hash("password", "pbkdf2:sha256:500")
+        save_all([student])
+
+        response = self.post_json("/api/v1/login", {"email": "student@test.com", "password": "password"})
+        self.assert200(response)
+        student = User.query.filter(User.email=="student@test.com").one()
+        self.assertTrue(student.password.startswith(self.app.config["PASSWORD_HASH_METHOD"] + "$"))
+        self.assertTrue(student.check_password("password"))
+
+
+class UserAuthorizationTestCase(BaseTestCase):
+
+    def test_authorization_code_is_returned_without_the_user_id(self):
+        student = self.create_user("student", "student@test.com")
+
+        response = self.get_json("/api/v1/user_authorization", student)
+        self.assert200(response)
+        self.assertEqual(response.json["data"]["data"], {
+            "authorization_code": None,
+            "authorization_code_status": False
+        })
+
+
+class UserSignupTestCase(BaseTestCase):
+
+    def test_welcome_notification_icon_comes_from_the_icon_cache(self):
+        icon_id = get_icon_id("moov_operation")
+
+        response, statements = self.count_request_queries(lambda: self.post_json("/api/v1/signup", {
+            "user_type": "student",
+            "firstname": "student",
+            "lastname": "student",
+            "email": "student@test.com",
+            "password": "password",
+            "mobile_number": "08000000000",
+            "school": "default_school"
+        }))
+        self.assertStatus(response, 201)
+        self.assertFalse([statement for statement in statements if 'FROM "Icon"' in statement])
+        notification = Notification.query.filter(
+                            Notification.recipient_id==response.json["data"]["user"]["id"]).one()
+        self.assertEqual(notification.transaction_icon_id, icon_id)
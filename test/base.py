@@ -0,0 +1,155 @@
+from __future__ import absolute_import
+
+import os
+import json
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask_jwt import jwt
+from flask_testing import TestCase
+from sqlalchemy import event
+
+try:
+    from main import app
+    from api.helper.icon_helper import clear_icon_cache
+    from api.models import (
+        db, User, UserType, Wallet, SchoolInfo, PercentagePrice, AdmissionType,
+        Icon, AuthenticationType, save_all
+    )
+except ImportError:
+    from moov_backend.main import app
+    from moov_backend.api.helper.icon_helper import clear_icon_cache
+    from moov_backend.api.models import (
+        db, User, UserType, Wallet, SchoolInfo, PercentagePrice, AdmissionType,
+        Icon, AuthenticationType, save_all
+    )
+
+
+USER_TYPES = ['admin', 'driver', 'student', 'moov', 'school', 'car_owner']
+PERCENTAGE_PRICES = [
+    ("default_car_owner", 0.1),
+    ("default_school", 0.1),
+    ("default_driver", 0.4),
+    ("default_moov", 0.4),
+    ("default_transfer", 0.0)
+]
+OPERATION_TYPES = [
+    "transfer_operation", "borrow_operation", "cancel_operation",
+    "load_wallet_operation", "ride_operation", "free_ride_operation",
+    "moov_operation"
+]
+
+
+class BaseTestCase(TestCase):
+    '''
+    Every test runs on new tables holding the default data seed_default_data
+    creates: the user types, the moov, school and car owner accounts with
+    their wallets, the default school, percentage prices, admission type
+    and icons.
+    '''
+
+    def create_app(self):
+        return app
+
+    def setUp(self):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+
+        user_types = [UserType(title=title, description="{0} privilege".format(title))
+                      for title in USER_TYPES]
+        save_all(user_types)
+        self.user_types = dict((user_type.title, user_type) for user_type in user_types)
+
+        self.school = SchoolInfo(
+            name="default_school",
+            alias="school",
+            password="school_password",
+            admin_status=True,
+            email=os.environ["SCHOOL_EMAIL"],
+            user_type_id=self.user_types["school"].id,
+            account_number="0000000000",
+            bank_name="bank"
+        )
+        save_all([self.school])
+
+        self.moov = self.create_user("moov", os.environ["MOOV_EMAIL"])
+        self.school_user = self.create_user("school", os.environ["SCHOOL_EMAIL"])
+        self.car_owner = self.create_user("car_owner", os.environ["CAR_OWNER_EMAIL"])
+
+        save_all(
+            [PercentagePrice(title=title, price=price, description="{0}'s percentage price".format(title))
+             for title, price in PERCENTAGE_PRICES] +
+            [AdmissionType(admission_type="freelance", description="default admission type")] +
+            [Icon(icon="https://icons.test/{0}.png".format(operation_type), operation_type=operation_type)
+             for operation_type in OPERATION_TYPES]
+        )
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        # the icons are seeded again with new ids for every test
+        clear_icon_cache()
+
+    def create_user(self, user_type, email, wallet_amount=0.0, password="password"):
+        name = email.split("@")[0]
+        user = User(
+            authentication_type=AuthenticationType.email,
+            user_type_id=self.user_types[user_type].id,
+            school_id=self.school.id,
+            firstname=name,
+            lastname=name,
+            email=email,
+            password=password,
+            mobile_number="08000000000"
+        )
+        wallet = Wallet(
+            user_wallet=user,
+            wallet_amount=wallet_amount,
+            description="{0}'s wallet".format(name)
+        )
+        save_all([user, wallet])
+        return user
+
+    def auth_headers(self, user):
+        token = jwt.encode({
+            "id": user.id,
+            "stamp": str(datetime.utcnow())
+        }, os.getenv("TOKEN_KEY"), algorithm="HS256")
+        if not isinstance(token, str):
+            token = token.decode("utf-8")
+        return {
+            "Content-Type": "application/json",
+            "Authorization": "Bearer {0}".format(token)
+        }
+
+    def get_json(self, url, user, client=None):
+        return (client or self.client).get(url, headers=self.auth_headers(user))
+
+    def post_json(self, url, data, user=None, client=None):
+        headers = self.auth_headers(user) if user else {"Content-Type": "application/json"}
+        return (client or self.client).post(url, data=json.dumps(data), headers=headers)
+
+    def count_request_queries(self, send):
+        """Sends a request on an empty session, as a new request gets, and
+        returns the response and the statements it sent"""
+        db.session.remove()
+        with self.count_queries() as statements:
+            response = send()
+        return response, statements
+
+    @contextmanager
+    def count_queries(self):
+        """Collects the statements sent to the database in the block"""
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db.get_engine(self.app)
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
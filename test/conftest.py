@@ -0,0 +1,10 @@
+import os
+
+# the tests always run on the testing configuration and its sqlite
+# database, the tables are dropped after every test
+os.environ["FLASK_CONFIG"] = "testing"
+os.environ["DB_TYPE"] = "sqlite"
+os.environ.setdefault("TOKEN_KEY", "test_token_key")
+os.environ.setdefault("MOOV_EMAIL", "moov@test.com")
+os.environ.setdefault("SCHOOL_EMAIL", "school@test.com")
+os.environ.setdefault("CAR_OWNER_EMAIL", "car_owner@test.com")